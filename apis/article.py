@@ -3,13 +3,25 @@ from core.auth import get_current_user
 from core.db import DB
 from core.models.base import DATA_STATUS
 from core.models.article import Article,ArticleBase
-from sqlalchemy import and_, or_, desc
+from sqlalchemy import and_, or_, desc, select
+from sqlalchemy.orm import selectinload
+from core.database import get_async_db
 from .base import success_response, error_response
 from core.config import cfg
 from apis.base import format_search_kw
+from core.pagination import apply_cursor, cursor_page
+from core.count_cache import COUNTS
+from core.fts import FTS
 from core.print import print_warning, print_info, print_error, print_success
 router = APIRouter(prefix=f"/articles", tags=["文章管理"])
 
+def article_to_dict(article, with_content:bool=True) -> dict:
+    """文章转为响应数据, 正文从article_contents按需读取"""
+    data = {k: v for k, v in article.__dict__.items() if not k.startswith('_') and k != 'body'}
+    if with_content and isinstance(article, Article):
+        data["content"] = article.content
+    return data
+
 
     
 @router.delete("/clean", summary="清理无效文章(MP_ID不存在于Feeds表中的文章)")
@@ -26,6 +38,18 @@ async def clean_orphan_articles(
         deleted_count = session.query(Article)\
             .filter(~Article.mp_id.in_(subquery))\
             .delete(synchronize_session=False)
+        # 同时清理已无对应文章的正文
+        from core.models.article import ArticleContent
+        session.query(ArticleContent)\
+            .filter(~ArticleContent.id.in_(session.query(Article.id).subquery()))\
+            .delete(synchronize_session=False)
+        from core.fts import FTS
+        FTS.remove_orphans(session.connection())
+        from core.count_cache import COUNTS
+        COUNTS.invalidate(Article.__tablename__)
+        # 批量删除不经过ORM事件，重算文章统计
+        from core.article_lax import STATS
+        STATS.recompute()
         
         session.commit()
         
@@ -74,56 +98,69 @@ async def get_articles(
     search: str = Query(None),
     mp_id: str = Query(None),
     has_content:bool=Query(False),
-    current_user: dict = Depends(get_current_user)
+    cursor: str = Query(None, description="游标分页, 传入上次返回的next/prev"),
+    current_user: dict = Depends(get_current_user),
+    session = Depends(get_async_db)
 ):
-    session = DB.get_session()
     try:
       
         
         # 构建查询条件
-        query = session.query(ArticleBase)
+        query = select(ArticleBase)
         if has_content:
-            query=session.query(Article)
+            query=select(Article).options(selectinload(Article.body))
         if status:
-            query = query.filter(Article.status == status)
+            query = query.where(Article.status == status)
         else:
-            query = query.filter(Article.status != DATA_STATUS.DELETED)
+            query = query.where(Article.status != DATA_STATUS.DELETED)
         if mp_id:
-            query = query.filter(Article.mp_id == mp_id)
+            query = query.where(Article.mp_id == mp_id)
         if search:
-            query = query.filter(
+            query = query.where(
                format_search_kw(search)
             )
         
-        # 获取总数
-        total = query.count()
-        query= query.order_by(Article.publish_time.desc()).offset(offset).limit(limit)
-        # query= query.order_by(Article.id.desc()).offset(offset).limit(limit)
-        # 分页查询（按发布时间降序）
-        articles = query.all()
-        
-        # 打印生成的 SQL 语句（包含分页参数）
-        print_warning(query.statement.compile(compile_kwargs={"literal_binds": True}))
+        # 获取总数(按筛选条件缓存)
+        total = await COUNTS.count(session, Article.__tablename__, query, {"status": status, "search": search, "mp_id": mp_id})
+        # 分页查询（按发布时间降序），传入cursor时使用游标分页，否则兼容OFFSET分页
+        # 关键词搜索按相关度排序，只支持OFFSET分页
+        ranked = FTS.order_by_rank(query, search) if search and not cursor else None
+        if ranked is not None:
+            query, direction = ranked, "next"
+        else:
+            try:
+                query, direction = apply_cursor(query, cursor)
+            except ValueError as e:
+                raise HTTPException(
+                    status_code=fast_status.HTTP_406_NOT_ACCEPTABLE,
+                    detail=error_response(code=40001, message=str(e))
+                )
+        if not cursor:
+            query = query.offset(offset)
+        query = query.limit(limit + 1)
+        rows = (await session.execute(query)).scalars().all()
+        articles, next_cursor, prev_cursor = cursor_page(rows, limit, direction, has_before=bool(cursor) or offset > 0)
+        if ranked is not None:
+            next_cursor = prev_cursor = None
                        
-        # 查询公众号名称
-        from core.models.feed import Feed
-        mp_names = {}
-        for article in articles:
-            if article.mp_id and article.mp_id not in mp_names:
-                feed = session.query(Feed).filter(Feed.id == article.mp_id).first()
-                mp_names[article.mp_id] = feed.mp_name if feed else "未知公众号"
+        # 查询公众号名称(读穿缓存, 缺失的合并为一次IN查询)
+        from core.feed_meta import FEED_META
+        feeds = await FEED_META.aget_many(session, [article.mp_id for article in articles])
+        mp_names = {id: feed.mp_name for id, feed in feeds.items()}
         
         # 合并公众号名称到文章列表
         article_list = []
         for article in articles:
-            article_dict = article.__dict__
+            article_dict = article_to_dict(article, with_content=has_content)
             article_dict["mp_name"] = mp_names.get(article.mp_id, "未知公众号")
             article_list.append(article_dict)
         
         from .base import success_response
         return success_response({
             "list": article_list,
-            "total": total
+            "total": total,
+            "next": next_cursor,
+            "prev": prev_cursor
         })
     except HTTPException as e:
         raise e
@@ -141,10 +178,11 @@ async def get_article_detail(
     article_id: str,
     content: bool = False,
     # current_user: dict = Depends(get_current_user)
+    session = Depends(get_async_db)
 ):
-    session = DB.get_session()
     try:
-        article = session.query(Article).filter(Article.id==article_id).filter(Article.status != DATA_STATUS.DELETED).first()
+        article = (await session.execute(select(Article).options(selectinload(Article.body))
+                                         .where(Article.id==article_id).where(Article.status != DATA_STATUS.DELETED))).scalars().first()
         if not article:
             from .base import error_response
             raise HTTPException(
@@ -154,7 +192,7 @@ async def get_article_detail(
                     message="文章不存在"
                 )
             )
-        return success_response(article)
+        return success_response(article_to_dict(article))
     except HTTPException as e:
         raise e
     except Exception as e:
@@ -205,12 +243,12 @@ async def delete_article(
 @router.get("/{article_id}/next", summary="获取下一篇文章")
 async def get_next_article(
     article_id: str,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    session = Depends(get_async_db)
 ):
-    session = DB.get_session()
     try:
         # 获取当前文章的发布时间
-        current_article = session.query(Article).filter(Article.id == article_id).first()
+        current_article = (await session.execute(select(Article).where(Article.id == article_id))).scalars().first()
         if not current_article:
             raise HTTPException(
                 status_code=fast_status.HTTP_404_NOT_FOUND,
@@ -221,12 +259,12 @@ async def get_next_article(
             )
         
         # 查询发布时间更晚的第一篇文章
-        next_article = session.query(Article)\
-            .filter(Article.publish_time > current_article.publish_time)\
-            .filter(Article.status != DATA_STATUS.DELETED)\
-            .filter(Article.mp_id == current_article.mp_id)\
+        next_article = (await session.execute(select(Article).options(selectinload(Article.body))\
+            .where(Article.publish_time > current_article.publish_time)\
+            .where(Article.status != DATA_STATUS.DELETED)\
+            .where(Article.mp_id == current_article.mp_id)\
             .order_by(Article.publish_time.asc())\
-            .first()
+            .limit(1))).scalars().first()
         
         if not next_article:
             raise HTTPException(
@@ -237,7 +275,7 @@ async def get_next_article(
                 )
             )
         
-        return success_response(next_article)
+        return success_response(article_to_dict(next_article))
     except HTTPException as e:
         raise e
     except Exception as e:
@@ -252,12 +290,12 @@ async def get_next_article(
 @router.get("/{article_id}/prev", summary="获取上一篇文章")
 async def get_prev_article(
     article_id: str,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    session = Depends(get_async_db)
 ):
-    session = DB.get_session()
     try:
         # 获取当前文章的发布时间
-        current_article = session.query(Article).filter(Article.id == article_id).first()
+        current_article = (await session.execute(select(Article).where(Article.id == article_id))).scalars().first()
         if not current_article:
             raise HTTPException(
                 status_code=fast_status.HTTP_404_NOT_FOUND,
@@ -268,12 +306,12 @@ async def get_prev_article(
             )
         
         # 查询发布时间更早的第一篇文章
-        prev_article = session.query(Article)\
-            .filter(Article.publish_time < current_article.publish_time)\
-            .filter(Article.status != DATA_STATUS.DELETED)\
-            .filter(Article.mp_id == current_article.mp_id)\
+        prev_article = (await session.execute(select(Article).options(selectinload(Article.body))\
+            .where(Article.publish_time < current_article.publish_time)\
+            .where(Article.status != DATA_STATUS.DELETED)\
+            .where(Article.mp_id == current_article.mp_id)\
             .order_by(Article.publish_time.desc())\
-            .first()
+            .limit(1))).scalars().first()
         
         if not prev_article:
             raise HTTPException(
@@ -284,7 +322,7 @@ async def get_prev_article(
                 )
             )
         
-        return success_response(prev_article)
+        return success_response(article_to_dict(prev_article))
     except HTTPException as e:
         raise e
     except Exception as e:
@@ -25,6 +25,11 @@ def error_response(code: int, message: str, data=None):
 from sqlalchemy import and_,or_
 from core.models import Article
 def format_search_kw(keyword: str):
+    # 优先使用全文索引(标题、摘要、正文)，未建立索引时按标题模糊匹配
+    from core.fts import FTS
+    rule = FTS.match(keyword)
+    if rule is not None:
+        return rule
     words = keyword.replace("-"," ").replace("|"," ").split(" ")
     rule = or_(*[Article.title.like(f"%{w}%") for w in words])
     return rule
\ No newline at end of file
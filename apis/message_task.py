@@ -148,10 +148,10 @@ async def run_message_task(
         if not tasks:
             raise HTTPException(status_code=404, detail="Message task not found")
         else:
-            import json
+            from core.memberships import task_mp_ids
             for task in tasks:
                 try:
-                    ids=json.loads(task.mps_id)
+                    ids=task_mp_ids(task)
                     count+=len(ids)
                     mps['count']=count
                     mps['list'].append(ids)
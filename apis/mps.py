@@ -3,6 +3,9 @@ from fastapi.responses import FileResponse
 from fastapi.background import BackgroundTasks
 from core.auth import get_current_user
 from core.db import DB
+from core.database import get_async_db
+from sqlalchemy import select
+from core.count_cache import COUNTS
 from core.wx import search_Biz
 from .base import success_response, error_response
 from datetime import datetime
@@ -52,16 +55,16 @@ async def get_mps(
     limit: int = Query(10, ge=1, le=100),
     offset: int = Query(0, ge=0),
     kw: str = Query(""),
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    session = Depends(get_async_db)
 ):
-    session = DB.get_session()
     try:
         from core.models.feed import Feed
-        query = session.query(Feed)
+        query = select(Feed)
         if kw:
-            query = query.filter(Feed.mp_name.ilike(f"%{kw}%"))
-        total = query.count()
-        mps = query.order_by(Feed.created_at.desc()).limit(limit).offset(offset).all()
+            query = query.where(Feed.mp_name.ilike(f"%{kw}%"))
+        total = await COUNTS.count(session, Feed.__tablename__, query, {"kw": kw})
+        mps = (await session.execute(query.order_by(Feed.created_at.desc()).limit(limit).offset(offset))).scalars().all()
         return success_response({
             "list": [{
                 "id": mp.id,
@@ -143,11 +146,11 @@ async def update_mps(
 async def get_mp(
     mp_id: str,
     # current_user: dict = Depends(get_current_user)
+    session = Depends(get_async_db)
 ):
-    session = DB.get_session()
     try:
         from core.models.feed import Feed
-        mp = session.query(Feed).filter(Feed.id == mp_id).first()
+        mp = (await session.execute(select(Feed).where(Feed.id == mp_id))).scalars().first()
         if not mp:
             raise HTTPException(
                 status_code=status.HTTP_201_CREATED,
@@ -1,15 +1,50 @@
 from fastapi import APIRouter, Depends, Query, HTTPException, Request,Response
 from fastapi import status
-from fastapi.responses import Response
+from fastapi.responses import Response,StreamingResponse
 from core.db import DB
+from core.async_db import ADB
+from core.rss_cache import FEED_CACHE
+from core.content_store import CONTENT_STORE,add_logo_prefix
+from core.common.compress import negotiate_encoding
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import select,func
 from core.rss import RSS
 from core.models.feed import Feed
+from core.models.article import Article
 import json
 from .base import success_response, error_response
 from core.auth import get_current_user
 from core.config import cfg
 from apis.base import format_search_kw
+from core.fts import FTS
 from core.print import print_error,print_success
+from core.rss_render import scope_stmt,feed_scope,feed_query,version_stmt,make_validators,feed_items,hub_links
+from email.utils import parsedate_to_datetime
+def feed_response(content,media_type:str,headers:dict,encoding:str=None)->Response:
+    """返回RSS内容, encoding不为空时content是已经压缩好的内容"""
+    if encoding:
+        headers={**headers,"Content-Encoding":encoding}
+    return Response(
+        content=content,
+        media_type=media_type,
+        headers=headers
+    )
+
+def not_modified(request:Request,headers:dict)->bool:
+    """按 If-None-Match / If-Modified-Since 判断客户端缓存是否仍然有效"""
+    weak=lambda tag:tag[2:] if tag.startswith("W/") else tag
+    if_none_match=request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags=[tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or weak(headers["ETag"]) in [weak(tag) for tag in tags]
+    if_modified_since=request.headers.get("if-modified-since")
+    if if_modified_since and "Last-Modified" in headers:
+        try:
+            return parsedate_to_datetime(if_modified_since).timestamp()>=parsedate_to_datetime(headers["Last-Modified"]).timestamp()
+        except (TypeError,ValueError):
+            return False
+    return False
+
 def verify_rss_access(current_user: dict = Depends(get_current_user)):
     """
     RSS访问认证方法
@@ -61,17 +96,22 @@ async def get_rss_feeds(
     # current_user: dict = Depends(get_current_user)
 ):
     rss=RSS(name=f'all_{limit}_{offset}')
-    rss_xml=rss.get_cache()
-    if rss_xml is not None  and is_update==False:
-         return Response(
-            content=rss_xml,
-            media_type="application/xml"
-        )
-    session = DB.get_session()
+    rss_domain=cfg.get("rss.base_url",str(request.base_url))
     try:
-        total = session.query(Feed).count()
-        feeds = session.query(Feed).order_by(Feed.created_at.desc()).limit(limit).offset(offset).all()
-        rss_domain=cfg.get("rss.base_url",request.base_url)
+        async with ADB.session() as session:
+            headers=make_validators(("feeds",limit,offset,rss_domain),(await session.execute(version_stmt(Feed,[]))).one(),[])
+            headers["Vary"]="Accept-Encoding"
+            if is_update==False:
+                if not_modified(request,headers):
+                    return Response(status_code=status.HTTP_304_NOT_MODIFIED,headers=headers)
+                rss_xml=rss.get_cache()
+                if rss_xml is not None:
+                    return Response(
+                        content=rss_xml,
+                        media_type="application/xml",
+                        headers=headers
+                    )
+            feeds = (await session.execute(select(Feed).order_by(Feed.created_at.desc()).limit(limit).offset(offset))).scalars().all()
         # 转换为RSS格式数据
         from datetime import datetime, timezone, timedelta
         # assume CST (UTC+8) for naive timestamps
@@ -90,7 +130,8 @@ async def get_rss_feeds(
         
         return Response(
             content=rss_xml,
-            media_type="application/xml"
+            media_type="application/xml",
+            headers=headers
         )
     except Exception as e:
         print(f"获取RSS订阅列表错误: {str(e)}")
@@ -102,10 +143,35 @@ async def get_rss_feeds(
             )
         )
 
+async def load_content(content_id:str)->dict:
+    """读取文章信息和正文, 正文优先从正文缓存读取, 未缓存时从数据库读取并写入缓存"""
+    from core.models.article import ArticleContent
+    from core.common.compress import decompress_text
+    async with ADB.session() as session:
+        row=(await session.execute(select(Article.title,Article.publish_time,Article.mp_id,Article.pic_url,Article.content_hash,Feed.mp_name)
+                                   .outerjoin(Feed,Feed.id==Article.mp_id).where(Article.id==content_id))).first()
+        if row is None or row.content_hash is None:
+            return None
+        text=CONTENT_STORE.get(row.content_hash)
+        if text is None:
+            body=(await session.execute(select(ArticleContent.codec,ArticleContent.data).where(ArticleContent.id==content_id))).first()
+            if body is None:
+                return None
+            raw=await run_in_threadpool(decompress_text,body.codec,body.data)
+            await run_in_threadpool(CONTENT_STORE.put,raw,row.content_hash)
+            text=add_logo_prefix(raw)
+    return {"id":content_id,"title":row.title,"content":text,"publish_time":row.publish_time,
+            "mp_id":row.mp_id,"pic_url":row.pic_url,"mp_name":row.mp_name}
+
 @router.get("/content/{content_id}", summary="获取缓存的文章内容")
 async def get_rss_feed(content_id: str):
     rss = RSS()
-    content = rss.get_cached_content(content_id)
+    content = await load_content(content_id)
+    if content is None:
+        # 旧版本按文章ID保存的缓存文件
+        content = rss.get_cached_content(content_id)
+        if content is not None:
+            content['content']=rss.add_logo_prefix_to_urls(content['content'])
       
     if content is None:
         raise HTTPException(
@@ -140,7 +206,7 @@ async def get_rss_feed(content_id: str):
     </body>
     </html>
     '''
-    text=rss.add_logo_prefix_to_urls(content['content'])
+    text=content['content']
     html=html.format(title=title,text=text,source=content['mp_name'],publish_time=content['publish_time'])
     return Response(
             content=html,
@@ -180,104 +246,117 @@ async def get_mp_articles_source(
     limit: int = Query(10, ge=1, le=100),
     offset: int = Query(0, ge=0),
     kw:str="",
-    is_update:bool=True,
+    is_update:bool=False,
     content_type:str=Query(None,alias="ctype"),
-    template:str=None
+    template:str=None,
+    cursor:str=None
     # current_user: dict = Depends(get_current_user)
 ):
+    if cursor:
+        # 非法游标直接返回错误, 不能被下面的异常处理当作旧缓存返回
+        from core.pagination import decode_cursor
+        try:
+            decode_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_406_NOT_ACCEPTABLE,
+                detail=error_response(code=40001, message=str(e))
+            )
     rss=RSS(name=f'{tag_id}_{feed_id}_{limit}_{offset}',ext=ext)
     rss.set_content_type(content_type)
-    rss_xml = rss.get_cache()
-    if rss_xml is not None and is_update==False:
-         return Response(
-            content=rss_xml,
-            media_type=rss.get_type()
-        )
-    session = DB.get_session()
+    if cursor:
+        # 游标分页的结果不写文件缓存
+        rss.rss_file=None
+    rss_domain=cfg.get("rss.base_url",str(request.base_url))
+    # 内存缓存，文章写入时按公众号清除，返回前与当前ETag比对
+    cache_key=FEED_CACHE.make_key(feed_id,tag_id,ext,content_type,kw,limit,offset,template,cursor,rss_domain)
+    # 客户端支持时返回预先压缩好的内容
+    encoding=negotiate_encoding(request.headers.get("accept-encoding"))
+    cache_version=FEED_CACHE.version
+    cache_feeds=None
     try:
-        from core.models.article import Article
-        from core.models.tags import Tags
-        # 查询公众号信息
-        feed = session.query(Feed)
-        query=session.query(Feed, Article).join(Article, Feed.id == Article.mp_id)
-        rss_domain=cfg.get("rss.base_url",str(request.base_url))
-        if feed_id not in ["all",None]:
-            feed=feed.filter(Feed.id == feed_id).first()
-            query=query.filter(Article.mp_id==feed_id)
-        else:
-            feed=Feed()
-            feed.mp_name=cfg.get("rss.title","WeRss") or "WeRss"
-            feed.mp_intro=cfg.get("rss.description") or "WeRss高效订阅我的公众号"
-            feed.mp_cover=cfg.get("rss.cover") or f"{rss_domain}static/logo.svg"
-            #如果传入了tag_id就加载tag对应的订阅信息
-            if tag_id is not None:
-                tags=session.query(Tags).filter(Tags.id == tag_id).first()
-                if tags:
-                    mps_ids = [str(mp['id']) for mp in json.loads(tags.mps_id)] if tags.mps_id else []
-                    query=query.filter(Feed.id.in_(mps_ids))
-                    feed.mp_name = tags.name
-                    feed.mp_intro = tags.intro
-                    feed.mp_cover = f'{rss_domain}{tags.cover}'
-
-        
-        if not feed:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=error_response(
-                    code=40401,
-                    message="公众号不存在"
+        from core.pagination import apply_cursor,cursor_page
+        async with ADB.session() as session:
+            # 查询公众号/标签信息, 确定源的范围
+            stmt=scope_stmt(feed_id,tag_id)
+            row=(await session.execute(stmt)).scalars().first() if stmt is not None else None
+            # 标签源的公众号列表可能要同步读取关联表, 放到线程池执行
+            scope=await run_in_threadpool(feed_scope,feed_id,tag_id,row,rss_domain) if tag_id is not None else feed_scope(feed_id,tag_id,row,rss_domain)
+            if scope is None:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail=error_response(
+                        code=40401,
+                        message="公众号不存在"
+                    )
                 )
-            )
-      
-        # 查询文章列表
-        total = query.count()
-        # articles = query.order_by(Article.publish_time.desc()).limit(limit).offset(offset).all()
-        if kw!="":
-            query=query.filter(format_search_kw(kw))
-        articles =query.order_by(Article.publish_time.desc()).limit(limit).offset(offset).all()
+            feed,conditions,updated,cache_feeds=scope
+            # WebSub 订阅地址(内容和Link头里都声明, 只用配置的rss.base_url), 搜索结果不推送
+            self_link,hub_link=hub_links(feed_id,tag_id,ext) if kw=="" else (None,None)
+            # 内容未变化时直接返回304, 不再查询文章
+            headers=make_validators((cache_key,hub_link),(await session.execute(version_stmt(Article,conditions))).one(),updated)
+            headers["Vary"]="Accept-Encoding"
+            if hub_link:
+                headers["Link"]=f'<{hub_link}>; rel="hub", <{self_link}>; rel="self"'
+            if is_update==False:
+                if not_modified(request,headers):
+                    return Response(status_code=status.HTTP_304_NOT_MODIFIED,headers=headers)
+                # 内存缓存也要与当前ETag一致才返回: 采集任务在其它进程写入时本进程的缓存不会被清除
+                cached=FEED_CACHE.get(cache_key,encoding=encoding)
+                if cached is not None and cached[2].get("ETag")==headers["ETag"]:
+                    content,media_type,_,content_encoding=cached
+                    return feed_response(content,media_type,headers,content_encoding)
+                # 后台预生成(或之前生成)的文件缓存与当前版本一致时直接返回
+                stored=rss.get_cache(etag=headers["ETag"])
+                if stored is not None:
+                    variant=rss.get_cache(etag=headers["ETag"],encoding=encoding) if encoding else None
+                    FEED_CACHE.put(cache_key,stored,rss.get_type(),feeds=cache_feeds,version=cache_version,headers=headers,
+                                   variants={encoding:variant} if variant else None)
+                    return feed_response(variant or stored,rss.get_type(),headers,encoding if variant else None)
+          
+            # 查询文章列表
+            query=feed_query(conditions)
+            if kw!="":
+                query=query.where(format_search_kw(kw))
+            # 关键词搜索按相关度排序
+            ranked=FTS.order_by_rank(query,kw) if kw!="" and not cursor else None
+            if ranked is not None:
+                query,direction=ranked,"next"
+            else:
+                query,direction=apply_cursor(query,cursor)
+            if not cursor:
+                query=query.offset(offset)
+            rows=(await session.execute(query.limit(limit+1))).all()
+        articles,next_cursor,prev_cursor=cursor_page(rows,limit,direction,has_before=bool(cursor) or offset>0,key=lambda row:row[1])
+        # RFC 5005 分页链接, 按相关度排序的结果用OFFSET翻页
+        page_url=request.url.remove_query_params(["offset","cursor"])
+        if ranked is not None:
+            next_link=str(page_url.include_query_params(offset=offset+limit)) if next_cursor else None
+            prev_link=str(page_url.include_query_params(offset=max(offset-limit,0))) if offset>0 else None
+        else:
+            next_link=str(page_url.include_query_params(cursor=next_cursor)) if next_cursor else None
+            prev_link=str(page_url.include_query_params(cursor=prev_cursor)) if prev_cursor else None
         # 转换为RSS格式数据
-        from datetime import datetime, timezone, timedelta
-        cst = timezone(timedelta(hours=8))
-        rss_list = [{
-            "id": str(article.id),
-            "title": article.title or "",
-            "link":  f"{rss_domain}rss/feed/{article.id}" if cfg.get("rss.local",False) else article.url,
-            "description": article.description if article.description != "" else article.title or "",
-            "content": article.content or "",
-            "image": article.pic_url or "",
-            "mp_name":_feed.mp_name or "",
-            "updated": datetime.fromtimestamp(article.publish_time, tz=cst),
-            "feed": {
-                    "id":_feed.id,
-                    "name":_feed.mp_name,
-                    "cover":_feed.mp_cover,
-                    "intro":_feed.mp_intro
-            }
-        } for _feed,article in articles]
+        rss_list = feed_items(articles,rss_domain)
         
 
-        # 缓存文章内容
-        for _feed,article in articles:
-            content_data = {
-                "id": article.id,
-                "title": article.title,
-                "content": article.content,
-                "publish_time": article.publish_time,
-                "mp_id": article.mp_id,
-                "pic_url": article.pic_url,
-                "mp_name": _feed.mp_name
-            }
-            rss.cache_content(article.id, content_data)
         # 生成RSS XML
-        rss_xml = rss.generate(rss_list,ext=ext, title=f"{feed.mp_name}",link=rss_domain,description=feed.mp_intro,image_url=feed.mp_cover,template=template)
+        # 逐段生成并输出，同步迭代器由StreamingResponse放到线程池执行，写文件缓存作为旁路
+        on_complete=None
+        if FEED_CACHE.enabled:
+            on_complete=lambda content:FEED_CACHE.put(cache_key,content,rss.get_type(),feeds=cache_feeds,version=cache_version,headers=headers)
+        body=rss.stream(rss_list,ext=ext, title=f"{feed.mp_name}",link=rss_domain,description=feed.mp_intro,image_url=feed.mp_cover,template=template,next_link=next_link,prev_link=prev_link,self_link=self_link,hub_link=hub_link,on_complete=on_complete,etag=headers["ETag"])
         
-        return Response(
-            content=rss_xml,
-            media_type=rss.get_type()
+        return StreamingResponse(
+            body,
+            media_type=rss.get_type(),
+            headers=headers
         )
     except Exception as e:
         print_error(f"获取RSS错误:{e}")
         # raise
+        # 出错时返回上次生成的文件缓存
+        rss_xml = rss.get_cache()
         return Response(
              content=rss_xml,
              media_type=rss.get_type()
@@ -294,9 +373,10 @@ async def rss(
     offset: int = Query(0, ge=0),
     kw:str="",
     content_type:str=Query(None,alias="ctype"),
-    is_update:bool=True
+    is_update:bool=False,
+    cursor:str=None
 ):
-    return await get_mp_articles_source(request=request,feed_id=feed_id, limit=limit,offset=offset, is_update=is_update,ext=ext,kw=kw,content_type=content_type)
+    return await get_mp_articles_source(request=request,feed_id=feed_id, limit=limit,offset=offset, is_update=is_update,ext=ext,kw=kw,content_type=content_type,cursor=cursor)
 
 
 @feed_router.get("/search/{kw}/{feed_id}.{ext}", summary="获取公众号文章源")
@@ -308,9 +388,10 @@ async def rss(
     offset: int = Query(0, ge=0),
     kw:str="",
     content_type:str=Query(None,alias="ctype"),
-    is_update:bool=True
+    is_update:bool=False,
+    cursor:str=None
 ):
-    return await get_mp_articles_source(request=request,feed_id=feed_id, limit=limit,offset=offset, is_update=is_update,ext=ext,kw=kw,content_type=content_type)
+    return await get_mp_articles_source(request=request,feed_id=feed_id, limit=limit,offset=offset, is_update=is_update,ext=ext,kw=kw,content_type=content_type,cursor=cursor)
 @feed_router.get("/tag/{tag_id}.{ext}", summary="获取公众号文章源")
 async def rss(
     request: Request,
@@ -321,8 +402,9 @@ async def rss(
     offset: int = Query(0, ge=0),
     kw:str="",
     content_type:str=Query(None,alias="ctype"),
-    is_update:bool=True
+    is_update:bool=False,
+    cursor:str=None
 ):
-    return await get_mp_articles_source(request=request,feed_id=feed_id, tag_id=tag_id,limit=limit,offset=offset, is_update=is_update,ext=ext,kw=kw,content_type=content_type)
+    return await get_mp_articles_source(request=request,feed_id=feed_id, tag_id=tag_id,limit=limit,offset=offset, is_update=is_update,ext=ext,kw=kw,content_type=content_type,cursor=cursor)
 
 
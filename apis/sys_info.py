@@ -10,6 +10,8 @@ from driver.token import wx_cfg
 from core.config import cfg
 from jobs.mps import TaskQueue
 from driver.success import getLoginInfo,getStatus
+from core.db import DB,ENGINES
+from core.rss_cache import FEED_CACHE
 router = APIRouter(prefix="/sys", tags=["系统信息"])
 
 # 记录服务器启动时间
@@ -57,7 +59,7 @@ async def system_resources(
             code=50002,
             message=f"获取系统资源失败: {str(e)}"
         )
-from core.article_lax import ARTICLE_INFO,laxArticle
+from core.article_lax import laxArticle
 from .ver import API_VERSION
 from core.ver import VERSION as CORE_VERSION,LATEST_VERSION
 @router.get("/info", summary="获取系统信息")
@@ -100,8 +102,11 @@ async def get_system_info(
                 "info":getLoginInfo(),
                 "login":getStatus(),
             },
-            "article":ARTICLE_INFO,
+            "article":laxArticle(),
             'queue':TaskQueue.get_queue_info(),
+            'db':DB.health_stats(),
+            'db_pool':ENGINES.stats(),
+            'rss_cache':FEED_CACHE.stats(),
         }
         return success_response(data=system_info)
     except Exception as e:
@@ -2,8 +2,10 @@ from fastapi import APIRouter, Depends, HTTPException,status
 from typing import List
 from datetime import datetime
 from core.models.tags import Tags as TagsModel
-from core.database import get_db
+from core.database import get_db,get_async_db
 from sqlalchemy.orm import Session
+from sqlalchemy import select
+from core.count_cache import COUNTS
 from schemas.tags import Tags, TagsCreate
 from .base import success_response, error_response
 from core.auth import get_current_user, requires_permission
@@ -16,7 +18,7 @@ router = APIRouter(prefix="/tags", tags=["标签管理"])
 @router.get("", 
     summary="获取标签列表",
     description="分页获取所有标签信息")
-async def get_tags(offset: int = 0, limit: int = 100, db: Session = Depends(get_db),cur_user: dict = Depends(get_current_user)):
+async def get_tags(offset: int = 0, limit: int = 100, db = Depends(get_async_db),cur_user: dict = Depends(get_current_user)):
     """
     获取标签列表
     
@@ -27,9 +29,9 @@ async def get_tags(offset: int = 0, limit: int = 100, db: Session = Depends(get_
     返回:
     - 包含标签列表和分页信息的成功响应
     """
-    query = db.query(TagsModel)
-    total = query.count()
-    tags = query.offset(offset).limit(limit).all()
+    query = select(TagsModel)
+    total = await COUNTS.count(db, TagsModel.__tablename__, query)
+    tags = (await db.execute(query.offset(offset).limit(limit))).scalars().all()
     return success_response(data={
         "list": tags,
         "page": {
@@ -91,7 +93,7 @@ async def create_tag(tag: TagsCreate, db: Session = Depends(get_db),cur_user: di
         )
 
 @router.get("/{tag_id}", summary="获取单个标签详情",  description="根据标签ID获取标签详细信息")
-async def get_tag(tag_id: str, db: Session = Depends(get_db),cur_user: dict = Depends(get_current_user)):
+async def get_tag(tag_id: str, db = Depends(get_async_db),cur_user: dict = Depends(get_current_user)):
     """
     获取单个标签详情
     
@@ -102,7 +104,7 @@ async def get_tag(tag_id: str, db: Session = Depends(get_db),cur_user: dict = De
     - 成功: 包含标签详情的响应
     - 失败: 201错误响应(标签不存在)
     """
-    tag = db.query(TagsModel).filter(TagsModel.id == tag_id).first()
+    tag = (await db.execute(select(TagsModel).where(TagsModel.id == tag_id))).scalars().first()
     if not tag:
         return error_response(code=status.HTTP_201_CREATED, message="Tag not found")
     return success_response(data=tag)
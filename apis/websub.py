@@ -0,0 +1,23 @@
+from fastapi import APIRouter, Form, Request
+from fastapi import status
+from fastapi.responses import Response
+from starlette.concurrency import run_in_threadpool
+from core.websub import HUB
+
+router = APIRouter(prefix="/websub", tags=["WebSub"])
+
+@router.post("/hub", summary="WebSub订阅/取消订阅")
+async def websub_hub(
+    request: Request,
+    mode: str = Form(..., alias="hub.mode"),
+    topic: str = Form(..., alias="hub.topic"),
+    callback: str = Form(..., alias="hub.callback"),
+    lease_seconds: int = Form(None, alias="hub.lease_seconds"),
+    secret: str = Form(None, alias="hub.secret")
+):
+    """订阅者按WebSub规范提交表单, 接受后返回202, 订阅意图在后台向hub.callback确认"""
+    # 校验回调地址需要解析域名, 放到线程池执行
+    error = await run_in_threadpool(HUB.request, mode, topic, callback, lease_seconds, secret)
+    if error:
+        return Response(content=error, status_code=status.HTTP_400_BAD_REQUEST, media_type="text/plain; charset=utf-8")
+    return Response(status_code=status.HTTP_202_ACCEPTED)
@@ -1,6 +1,11 @@
 from core.models import Article,Feed,DATA_STATUS
-from core.db import DB
-import json
+from core.models.article import ArticleBase
+from core.models.article_stats import ArticleStats
+from core.print import print_info,print_warning
+from sqlalchemy import event,select,func,case,or_,inspect
+from sqlalchemy.orm import Session
+from datetime import datetime
+import time
 class ArticleInfo():
     #没有内容的文章数量
     no_content_count:int=0
@@ -12,23 +17,196 @@ class ArticleInfo():
     wrong_count:int=0
     #公众号总数
     mp_all_count:int=0
+
+#全局统计行的mp_id
+GLOBAL_STATS="__all__"
+COUNTERS=("total","has_content","wrong","deleted","feeds")
+class ArticleStatsTracker():
+    """文章统计增量维护
+
+    写入文章时按公众号累加变化量到article_stats表, /sys/info直接读取统计行;
+    recompute()全量重算, 用于初始化和定时修复
+    """
+    def __init__(self):
+        self._ready=False
+        self._checked_at=0
+    @staticmethod
+    def new_deltas()->dict:
+        return {}
+    @staticmethod
+    def article_delta(deltas:dict,mp_id:str,status:int,has_content:bool,publish_time:int,sign:int):
+        """记录一篇文章的增减, sign为1表示增加, -1表示减少"""
+        for key in (mp_id or "",GLOBAL_STATS):
+            d=deltas.setdefault(key,{**{c:0 for c in COUNTERS},"last_publish_time":None})
+            d["total"]+=sign
+            if has_content:
+                d["has_content"]+=sign
+            if status!=DATA_STATUS.ACTIVE:
+                d["wrong"]+=sign
+            if status==DATA_STATUS.DELETED:
+                d["deleted"]+=sign
+            if sign>0 and publish_time:
+                d["last_publish_time"]=max(d["last_publish_time"] or 0,publish_time)
+    @staticmethod
+    def feed_delta(deltas:dict,sign:int):
+        d=deltas.setdefault(GLOBAL_STATS,{**{c:0 for c in COUNTERS},"last_publish_time":None})
+        d["feeds"]+=sign
+    def ready(self,conn)->bool:
+        """统计行已初始化(执行过recompute)才做增量, 未初始化时每60秒重新检查一次"""
+        if self._ready or time.time()-self._checked_at<60:
+            return self._ready
+        self._checked_at=time.time()
+        try:
+            table=ArticleStats.__table__
+            self._ready=inspect(conn).has_table(table.name) and \
+                conn.execute(select(table.c.mp_id).where(table.c.mp_id==GLOBAL_STATS)).first() is not None
+        except Exception as e:
+            print_warning(f"检查文章统计失败: {e}")
+        return self._ready
+    def apply(self,conn,deltas:dict)->None:
+        """把变化量累加到统计表"""
+        deltas={k:d for k,d in deltas.items() if any(d[c] for c in COUNTERS) or d["last_publish_time"]}
+        if not deltas or not self.ready(conn):
+            return
+        from core.db import DB
+        table=ArticleStats.__table__
+        now=datetime.now().replace(microsecond=0)
+        rows=[{"mp_id":k,**{c:0 for c in COUNTERS},"updated_at":now} for k in deltas]
+        stmt=DB._upsert_stmt(table,rows)
+        if stmt is None:
+            existing={r[0] for r in conn.execute(select(table.c.mp_id).where(table.c.mp_id.in_(list(deltas))))}
+            rows=[r for r in rows if r["mp_id"] not in existing]
+            stmt=table.insert().values(rows) if rows else None
+        if stmt is not None:
+            conn.execute(stmt)
+        for mp_id,d in deltas.items():
+            values={c:table.c[c]+d[c] for c in COUNTERS if d[c]}
+            if d["last_publish_time"]:
+                lp=d["last_publish_time"]
+                values["last_publish_time"]=case((or_(table.c.last_publish_time==None,table.c.last_publish_time<lp),lp),else_=table.c.last_publish_time)
+            values["updated_at"]=now
+            conn.execute(table.update().where(table.c.mp_id==mp_id).values(**values))
+    def recompute(self,engine=None)->dict:
+        """全量重算统计"""
+        if engine is None:
+            from core.db import DB
+            engine=DB.get_engine()
+        articles=Article.__table__
+        table=ArticleStats.__table__
+        now=datetime.now().replace(microsecond=0)
+        stmt=select(articles.c.mp_id,
+                    func.count(),
+                    func.sum(case((articles.c.content_hash!=None,1),else_=0)),
+                    func.sum(case((articles.c.status!=DATA_STATUS.ACTIVE,1),else_=0)),
+                    func.sum(case((articles.c.status==DATA_STATUS.DELETED,1),else_=0)),
+                    func.max(articles.c.publish_time)).group_by(articles.c.mp_id)
+        with engine.begin() as conn:
+            rows={}
+            total={"mp_id":GLOBAL_STATS,**{c:0 for c in COUNTERS},"last_publish_time":None,"updated_at":now}
+            for mp_id,count,has_content,wrong,deleted,last_publish_time in conn.execute(stmt):
+                row={"mp_id":mp_id or "","total":count,"has_content":int(has_content or 0),"wrong":int(wrong or 0),
+                     "deleted":int(deleted or 0),"feeds":0,"last_publish_time":last_publish_time,"updated_at":now}
+                rows[row["mp_id"]]=row
+                for c in ("total","has_content","wrong","deleted"):
+                    total[c]+=row[c]
+                if last_publish_time and (total["last_publish_time"] or 0)<last_publish_time:
+                    total["last_publish_time"]=last_publish_time
+            total["feeds"]=conn.execute(select(func.count()).select_from(Feed.__table__)).scalar() or 0
+            rows[GLOBAL_STATS]=total
+            conn.execute(table.delete())
+            conn.execute(table.insert(),list(rows.values()))
+        self._ready=True
+        print_info(f"文章统计重算完成: {total['total']}")
+        return total
+    def get(self,mp_id:str=GLOBAL_STATS)->dict:
+        """读取统计行, 不存在时返回None"""
+        from core.db import DB
+        with DB.get_engine().connect() as conn:
+            row=conn.execute(select(ArticleStats.__table__).where(ArticleStats.mp_id==mp_id)).mappings().first()
+            return dict(row) if row else None
+
+STATS=ArticleStatsTracker()
+
+# 记录状态、公众号、正文变化前的值, 增量统计需要旧值
+def _active_history(target,value,oldvalue,initiator):
+    pass
+for _attr in (ArticleBase.status,ArticleBase.mp_id,Article.content_hash):
+    event.listen(_attr,"set",_active_history,active_history=True,propagate=True)
+
+def _snapshot(obj,committed:bool)->tuple:
+    """取出文章统计相关字段, committed为True时取修改前的值"""
+    state=inspect(obj)
+    values=[]
+    for name in ("mp_id","status","content_hash","publish_time"):
+        if name not in state.attrs:
+            values.append(None)
+            continue
+        history=state.attrs[name].history
+        if committed and history.has_changes():
+            values.append(history.deleted[0] if history.deleted else None)
+        else:
+            values.append(getattr(obj,name))
+    return tuple(values)
+
+@event.listens_for(Session,"before_flush")
+def _collect_stats(session,flush_context,instances):
+    # 上次flush失败时留下的增量作废, 按本次flush重新计算
+    session.info.pop("article_stats",None)
+    deltas=STATS.new_deltas()
+    for obj in session.new:
+        if isinstance(obj,ArticleBase):
+            mp_id,status,content_hash,publish_time=_snapshot(obj,False)
+            STATS.article_delta(deltas,mp_id,status if status is not None else DATA_STATUS.ACTIVE,content_hash is not None,publish_time,1)
+        elif isinstance(obj,Feed):
+            STATS.feed_delta(deltas,1)
+    for obj in session.deleted:
+        if isinstance(obj,ArticleBase):
+            mp_id,status,content_hash,publish_time=_snapshot(obj,True)
+            STATS.article_delta(deltas,mp_id,status,content_hash is not None,publish_time,-1)
+        elif isinstance(obj,Feed):
+            STATS.feed_delta(deltas,-1)
+    for obj in session.dirty:
+        if not isinstance(obj,ArticleBase) or not session.is_modified(obj):
+            continue
+        old=_snapshot(obj,True)
+        new=_snapshot(obj,False)
+        if old==new:
+            continue
+        # 先减去旧值再加上新值, ArticleBase没有正文字段, 两侧都按无正文处理
+        STATS.article_delta(deltas,old[0],old[1],old[2] is not None,None,-1)
+        STATS.article_delta(deltas,new[0],new[1],new[2] is not None,new[3],1)
+    if deltas:
+        session.info["article_stats"]=deltas
+
+@event.listens_for(Session,"after_flush")
+def _apply_stats(session,flush_context):
+    deltas=session.info.pop("article_stats",None)
+    if not deltas:
+        return
+    try:
+        STATS.apply(session.connection(),deltas)
+    except Exception as e:
+        print_warning(f"更新文章统计失败: {e}")
+
+@event.listens_for(Session,"after_soft_rollback")
+def _discard_stats(session,previous_transaction):
+    # flush失败回滚后丢弃未应用的增量
+    session.info.pop("article_stats",None)
+
 def laxArticle():
+    """文章统计信息, 读取article_stats全局统计行"""
     info=ArticleInfo()
-    session=DB.get_session()
-    #获取没有内容的文章数量
-    info.no_content_count=session.query(Article).filter(Article.content == None).count()
+    row=STATS.get()
+    if row is None:
+        row=STATS.recompute()
     #所有文章数量
-    info.all_count=session.query(Article).count()
+    info.all_count=row["total"]
     #有内容的文章数量
-    info.has_content_count=info.all_count-info.no_content_count
-
+    info.has_content_count=row["has_content"]
+    #获取没有内容的文章数量
+    info.no_content_count=info.all_count-info.has_content_count
     #获取删除的文章
-    info.wrong_count=session.query(Article).filter(Article.status !=DATA_STATUS.ACTIVE ).count()
-
+    info.wrong_count=row["wrong"]
     #公众号总数
-    info.mp_all_count=session.query(Feed).distinct(Feed.id).count()
-    # session.close()
+    info.mp_all_count=row["feeds"]
     return info.__dict__
-    pass
-ARTICLE_INFO=laxArticle()
-print(ARTICLE_INFO)
\ No newline at end of file
@@ -0,0 +1,113 @@
+import importlib.util
+from contextlib import asynccontextmanager
+from typing import Optional
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession, AsyncEngine
+from starlette.concurrency import run_in_threadpool
+from core.config import cfg
+from core.db import DB, Db
+from core.print import print_warning, print_success
+
+# 各数据库对应的异步驱动 (驱动名, 模块名)
+ASYNC_DRIVERS = {
+    "sqlite": ("sqlite+aiosqlite", "aiosqlite"),
+    "mysql": ("mysql+asyncmy", "asyncmy"),
+    "postgresql": ("postgresql+asyncpg", "asyncpg"),
+}
+
+def async_url(con_str: str) -> Optional[str]:
+    """把同步连接串转换为异步驱动的连接串, 没有安装对应驱动时返回None"""
+    url = make_url(con_str)
+    driver = ASYNC_DRIVERS.get(url.get_backend_name())
+    if driver is None or importlib.util.find_spec(driver[1]) is None:
+        return None
+    return url.set(drivername=driver[0]).render_as_string(hide_password=False)
+
+class ThreadedSession:
+    """没有异步驱动时的替代会话: 同步会话的查询放到线程池执行, 接口与AsyncSession一致"""
+    def __init__(self, session):
+        self.session = session
+
+    @property
+    def bind(self):
+        return self.session.get_bind()
+
+    async def execute(self, statement, *args, **kwargs):
+        # 结果在线程中一次性取完, 事件循环中不再访问游标
+        return await run_in_threadpool(lambda: self.session.execute(statement, *args, **kwargs).freeze()())
+
+    async def scalar(self, statement, *args, **kwargs):
+        return await run_in_threadpool(self.session.scalar, statement, *args, **kwargs)
+
+    async def scalars(self, statement, *args, **kwargs):
+        return (await self.execute(statement, *args, **kwargs)).scalars()
+
+    async def get(self, entity, ident, **kwargs):
+        return await run_in_threadpool(self.session.get, entity, ident, **kwargs)
+
+    async def commit(self):
+        await run_in_threadpool(self.session.commit)
+
+    async def rollback(self):
+        await run_in_threadpool(self.session.rollback)
+
+    async def close(self):
+        await run_in_threadpool(self.session.close)
+
+class AsyncDb:
+    """异步数据库访问, 供FastAPI接口使用, 慢查询不再阻塞事件循环
+
+    与同步的 Db 共用同一个连接串和 db_pool 配置, 首次使用时创建异步引擎
+    """
+    def __init__(self, db: Db):
+        self.db = db
+        self.engine: Optional[AsyncEngine] = None
+        self.session_factory = None
+        self._inited = False
+
+    def init(self) -> None:
+        self._inited = True
+        url = async_url(self.db.connection_str)
+        if url is None:
+            print_warning("未安装异步数据库驱动(aiosqlite/asyncmy/asyncpg), 查询将在线程池中执行")
+            return
+        self.engine = create_async_engine(url,
+                                          pool_size=int(cfg.get("db_pool.size", 2)),
+                                          max_overflow=int(cfg.get("db_pool.max_overflow", 20)),
+                                          pool_timeout=int(cfg.get("db_pool.timeout", 30)),
+                                          pool_recycle=int(cfg.get("db_pool.recycle", 60)),
+                                          pool_pre_ping=True,
+                                          echo=False)
+        self.session_factory = async_sessionmaker(self.engine, class_=AsyncSession, expire_on_commit=False)
+        print_success(f"[{self.db.tag}]异步连接初始化")
+
+    def get_session(self):
+        """获取异步会话, 使用完需要 await session.close()"""
+        if not self._inited:
+            self.init()
+        if self.session_factory is None:
+            return ThreadedSession(self.db.get_session_factory()())
+        return self.session_factory()
+
+    @asynccontextmanager
+    async def session(self):
+        session = self.get_session()
+        try:
+            yield session
+        finally:
+            await session.close()
+
+    async def session_dependency(self):
+        """FastAPI依赖项"""
+        async with self.session() as session:
+            yield session
+
+    async def dispose(self) -> None:
+        if self.engine is not None:
+            await self.engine.dispose()
+            self.engine = None
+            self.session_factory = None
+            self._inited = False
+
+# 全局异步数据库实例
+ADB = AsyncDb(DB)
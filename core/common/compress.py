@@ -0,0 +1,78 @@
+import zlib
+import gzip
+import hashlib
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# 可用的压缩算法, 安装了zstandard时优先使用zstd
+CODEC_ZSTD = "zstd"
+CODEC_ZLIB = "zlib"
+CODEC_RAW = "raw"
+DEFAULT_CODEC = CODEC_ZSTD if zstandard else CODEC_ZLIB
+
+def content_hash(text: str) -> str:
+    """计算文本的sha256摘要"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def compress_text(text: str, codec: str = None) -> tuple:
+    """压缩文本, 返回 (codec, bytes)"""
+    codec = codec or DEFAULT_CODEC
+    data = text.encode("utf-8")
+    if codec == CODEC_ZSTD and zstandard:
+        return CODEC_ZSTD, zstandard.ZstdCompressor(level=3).compress(data)
+    if codec == CODEC_RAW:
+        return CODEC_RAW, data
+    return CODEC_ZLIB, zlib.compress(data, 6)
+
+def decompress_text(codec: str, data: bytes) -> str:
+    """按codec解压为文本"""
+    if data is None:
+        return None
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise RuntimeError("解压文章内容需要安装zstandard")
+        return zstandard.ZstdDecompressor().decompress(data).decode("utf-8")
+    if codec == CODEC_ZLIB:
+        return zlib.decompress(data).decode("utf-8")
+    return bytes(data).decode("utf-8")
+
+# HTTP响应压缩(Content-Encoding), 安装了brotli时优先使用br
+HTTP_ENCODINGS = ("br", "gzip") if brotli else ("gzip",)
+
+def negotiate_encoding(accept_encoding: str) -> str:
+    """按请求头 Accept-Encoding 选择压缩方式, 不接受压缩时返回None"""
+    accepted = {}
+    for part in (accept_encoding or "").lower().split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            accepted[name.strip()] = q
+    for encoding in HTTP_ENCODINGS:
+        if accepted.get(encoding, accepted.get("*", 0)) > 0:
+            return encoding
+    return None
+
+def http_compress(data, encoding: str, level: int = None) -> bytes:
+    """按Content-Encoding压缩响应内容"""
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    if encoding == "br":
+        if brotli is None:
+            raise RuntimeError("br压缩需要安装brotli")
+        return brotli.compress(data, quality=9 if level is None else level)
+    if encoding == "gzip":
+        # mtime固定为0, 相同内容压缩结果一致
+        return gzip.compress(data, compresslevel=6 if level is None else level, mtime=0)
+    raise ValueError(f"Unsupported encoding: {encoding}")
@@ -1,16 +1,30 @@
 import yaml
 import sys
 import os
+import re
+import copy
+import time
 import argparse
+import threading
 from string import Template
 from core.print import print_warning, print_error,print_info
 from .file import FileCrypto
+# 匹配 ${VAR:-default} 或 ${VAR} 格式
+_ENV_PATTERN = re.compile(r'\$\{([^}:]+)(?::-([^}]*))?\}')
 class Config: 
     config_path=None
     config={}
     def __init__(self, config_path=None, encrypt=False):
         self.args = self.parse_args()
         self.config_path = config_path or self.args.config
+        # 加载后的配置快照: 环境变量替换、类型转换只在加载时做一次, 按"a.b.c"平铺, get为一次字典查找
+        self._values = {}
+        # 快照对应的配置文件(mtime, size), 文件未变化时reload不重新读取
+        self._stamp = None
+        self._lock = threading.RLock()
+        self._watcher = None
+        # 快照版本, 每次重新加载/修改后加1, 供缓存配置派生数据的地方判断是否需要更新
+        self.version = 0
 
         # 确保目录存在
         if os.path.dirname(self.config_path) != "":
@@ -62,8 +76,9 @@ class Config:
             return data  # 解密失败返回原始数据
 
     def save_config(self):
-        config_to_save = self.config.copy()
-        try:
+        with self._lock:
+            config_to_save = self.config.copy()
+            try:
                 # 生成YAML内容
                 yaml_content = yaml.dump(config_to_save)
                 # 验证YAML格式是否合法
@@ -74,13 +89,20 @@ class Config:
                     raise
                 # 加密整个YAML内容
                 encrypted_content = self._encrypt(yaml_content)
-                os.remove(self.config_path)
-                with open(self.config_path, 'w', encoding='utf-8') as f:
-                    f.write(encrypted_content)
-                self.reload()
-        except Exception as e:
-            print_error(f"保存配置文件失败: {e}")
-            raise
+                # 先写临时文件再替换, 其它进程不会读到空文件或写了一半的文件
+                tmp_path = f"{self.config_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                try:
+                    with open(tmp_path, 'w', encoding='utf-8') as f:
+                        f.write(encrypted_content)
+                    os.replace(tmp_path, self.config_path)
+                finally:
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+                # 同一秒内多次写入时mtime可能不变, 强制重新加载
+                self.reload(force=True)
+            except Exception as e:
+                print_error(f"保存配置文件失败: {e}")
+                raise
     def replace_env_vars(self,data):
             if isinstance(data, dict):
                 return {k: self.replace_env_vars(v) for k, v in data.items()}
@@ -88,18 +110,44 @@ class Config:
                 return [self.replace_env_vars(item) for item in data]
             elif isinstance(data, str):
                 try:
-                    import re
-                    # 匹配 ${VAR:-default} 或 ${VAR} 格式
-                    pattern = re.compile(r'\$\{([^}:]+)(?::-([^}]*))?\}')
                     def replace_match(match):
                         var_name = match.group(1)
                         default_value = match.group(2)
                         return os.getenv(var_name, default_value) if default_value is not None else os.getenv(var_name, '')
-                    return pattern.sub(replace_match, data)
+                    return _ENV_PATTERN.sub(replace_match, data)
                 except:
                     return data
             return data
+    def _file_stamp(self):
+        try:
+            st = os.stat(self.config_path)
+            return (st.st_mtime_ns, st.st_size)
+        except OSError:
+            return None
+    def _build(self, config):
+        """由原始配置生成快照并整体替换"""
+        resolved = self.replace_env_vars(config) if config is not None else None
+        values = {}
+        def walk(data, prefix):
+            for k, v in data.items():
+                # 与逐级查找一致: 只有字符串key可以用"a.b"访问, 含"."的key无法访问
+                if not isinstance(k, str):
+                    if prefix is None:
+                        values[k] = self.__fix(v)
+                    continue
+                if '.' in k:
+                    continue
+                path = k if prefix is None else f"{prefix}.{k}"
+                values[path] = self.__fix(v)
+                if isinstance(v, dict):
+                    walk(v, path)
+        if isinstance(resolved, dict):
+            walk(resolved, None)
+        self._config = resolved
+        self._values = values
+        self.version += 1
     def get_config(self):
+        stamp = self._file_stamp()
         try:
             with open(self.config_path, 'r', encoding='utf-8') as f:
                 content = f.read()
@@ -115,20 +163,51 @@ class Config:
                 else:
                     config = yaml.safe_load(content)
                 
+                self._stamp = stamp
                 if config is None:
-                    return {}
+                    config = {}
                 
                 self.config = config
-                self._config = self.replace_env_vars(config)
+                self._build(config)
                 return self.config
         except Exception as e:
             print_error(f"加载配置文件 {self.config_path} 错误: {e}")
             # sys.exit(1)
-    def reload(self):
-        self.config=self.get_config()
+        # 读取失败时保留上一次的配置
+        return self.config
+    def reload(self, force: bool = False):
+        """配置文件有变化时重新加载, 未变化时直接返回"""
+        with self._lock:
+            if not force and self._stamp is not None and self._file_stamp() == self._stamp:
+                return
+            self.config=self.get_config()
+    def watch(self, interval: float = 5):
+        """后台定时检查配置文件的修改时间, 变化时重新加载, interval为0时不检查
+
+        由服务(web.py)和定时任务启动时调用, 重复调用只启动一个线程
+        """
+        if not interval or interval <= 0 or self._watcher is not None:
+            return
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.reload()
+                except Exception as e:
+                    print_error(f"重新加载配置文件 {self.config_path} 错误: {e}")
+        self._watcher = threading.Thread(target=run, name=f"config-watch:{self.config_path}", daemon=True)
+        self._watcher.start()
     def set(self,key,default:any=None):
-        self.config[key] = default
-        self.save_config()
+        with self._lock:
+            self.config[key] = default
+            self._build(self.config)
+            self.save_config()
+    def update(self, values: dict):
+        """一次设置多个配置项, 只写一次文件"""
+        with self._lock:
+            self.config.update(values)
+            self._build(self.config)
+            self.save_config()
     def __fix(self,v:str):
         if v in ("", "''", '""', None):
             return ""
@@ -146,22 +225,19 @@ class Config:
         except:
             return v
     def get(self,key,default:any=None):
-        _config=self.replace_env_vars(self.config)
-        
         # 支持嵌套key访问
-        keys = key.split('.') if isinstance(key, str) else [key]
-        value = _config
         try:
-            for k in keys:
-                value = value[k]
-            val=self.__fix(value)
-            if val is None and default is not None  :
-                return default
-            else:
-                return val
+            val = self._values[key]
         except (KeyError, TypeError):
             print_warning("Key {} not found in configuration".format(key))
-        return default 
+            return default
+        if isinstance(val, (dict, list)):
+            # 返回副本, 调用方修改不影响快照
+            return copy.deepcopy(val)
+        if val is None and default is not None  :
+            return default
+        else:
+            return val
 
 cfg=Config()
 def set_config(key:str,value:str):
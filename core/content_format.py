@@ -1,13 +1,108 @@
  
 from bs4 import BeautifulSoup
 import re
+import os
+import threading
 from core.log import logger
+from core.config import cfg
+from core.common.compress import compress_text,decompress_text,content_hash as sha256_hash,DEFAULT_CODEC,CODEC_ZSTD,CODEC_ZLIB,CODEC_RAW
 
-def format_content(content:str,content_format:str='html'):
+class FormatCache:
+    """format_content转换结果的磁盘缓存
+
+    转换结果只取决于原文和格式, 按 (正文sha256, 格式) 存放, 同一正文的不同文章共用;
+    总大小超过上限时按最近使用时间(mtime, 命中时更新)淘汰最旧的文件
+    """
+    CODECS=(DEFAULT_CODEC,CODEC_ZSTD,CODEC_ZLIB,CODEC_RAW)
+    def __init__(self):
+        self.root=os.path.normpath(cfg.get("format_cache.dir","data/cache/format"))
+        self.max_bytes=int(float(cfg.get("format_cache.max_mb",256) or 0)*1024*1024)
+        self.size=None
+        self._lock=threading.Lock()
+    @property
+    def enabled(self)->bool:
+        return self.max_bytes>0
+    def _path(self,hash:str,content_format:str,codec:str)->str:
+        return os.path.join(self.root,content_format,hash[:2],f"{hash}.{codec}")
+    def _files(self):
+        for dirpath,_,filenames in os.walk(self.root):
+            for name in filenames:
+                if not name.endswith(".tmp"):
+                    yield os.path.join(dirpath,name)
+    def get(self,hash:str,content_format:str):
+        for codec in self.CODECS:
+            path=self._path(hash,content_format,codec)
+            try:
+                with open(path,"rb") as f:
+                    data=f.read()
+                os.utime(path)
+                return decompress_text(codec,data)
+            except FileNotFoundError:
+                continue
+            except Exception as e:
+                logger.warning('format cache read error: %s',e)
+                return None
+        return None
+    def put(self,hash:str,content_format:str,text:str)->None:
+        codec,data=compress_text(text)
+        path=self._path(hash,content_format,codec)
+        try:
+            os.makedirs(os.path.dirname(path),exist_ok=True)
+            tmp=f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp,"wb") as f:
+                f.write(data)
+            os.replace(tmp,path)
+        except Exception as e:
+            logger.warning('format cache write error: %s',e)
+            return
+        with self._lock:
+            if self.size is None:
+                self.size=sum(os.path.getsize(p) for p in self._files())
+            else:
+                self.size+=len(data)
+            if self.size>self.max_bytes:
+                self._evict()
+    def _evict(self)->None:
+        """淘汰最久未使用的文件, 直到总大小降到上限的90%"""
+        files=[]
+        for path in self._files():
+            try:
+                stat=os.stat(path)
+                files.append((stat.st_mtime,stat.st_size,path))
+            except FileNotFoundError:
+                continue
+        files.sort()
+        self.size=sum(f[1] for f in files)
+        for _,size,path in files:
+            if self.size<=self.max_bytes*0.9:
+                break
+            try:
+                os.remove(path)
+                self.size-=size
+            except FileNotFoundError:
+                pass
+
+FORMAT_CACHE=FormatCache()
+
+def format_content(content:str,content_format:str='html',content_hash:str=None):
     #格式化内容
     # content_format: 'text' or 'markdown' or 'html'
     # content: str
+    # content_hash: 原文的sha256(articles.content_hash), 不传时按内容计算
     # return: str
+    if content_format in ('text','markdown') and content and FORMAT_CACHE.enabled:
+        hash=content_hash or sha256_hash(content)
+        cached=FORMAT_CACHE.get(hash,content_format)
+        if cached is not None:
+            return cached
+        result=_format_content(content,content_format)
+        # 转换失败时返回的是原文, 不缓存
+        if result is not content:
+            FORMAT_CACHE.put(hash,content_format,result)
+        return result
+    return _format_content(content,content_format)
+
+def _format_content(content:str,content_format:str='html'):
     try:
         if content_format == 'text':
             # 去除HTML标签，保留纯文本
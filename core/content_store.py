@@ -0,0 +1,88 @@
+import os
+import re
+import threading
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from core.config import cfg
+from core.common.compress import compress_text, decompress_text, content_hash, DEFAULT_CODEC, CODEC_ZSTD, CODEC_ZLIB, CODEC_RAW
+from core.print import print_warning
+
+# 文章正文缓存(按内容寻址)
+# 以原始正文的sha256(即articles.content_hash)为文件名, 按前两级哈希分目录存放压缩后的正文,
+# 文章ID到哈希的对应关系就是数据库里的content_hash, 内容相同的文件已存在时不再写入
+
+_IMG_SRC = re.compile(r'(<img[^>]*src=["\'])(?!\/static\/res\/logo\/)([^"\']*)', re.IGNORECASE)
+
+def add_logo_prefix(text: str) -> str:
+    """图片地址前添加/static/res/logo/前缀(经本站代理访问)"""
+    try:
+        return _IMG_SRC.sub(r'\1/static/res/logo/\2', text)
+    except Exception:
+        return text
+
+class ContentStore:
+    """文章正文的内容寻址缓存, 在写入文章时填充, /rss/content 读取"""
+    CODECS = (DEFAULT_CODEC, CODEC_ZSTD, CODEC_ZLIB, CODEC_RAW)
+
+    def __init__(self, root: str = None):
+        self.root = os.path.normpath(root or cfg.get("rss.content_cache_dir", "data/cache/content/objects"))
+        self.enabled = str(cfg.get("rss.content_cache", True)).lower() in ("true", "1", "yes")
+        self._lock = threading.Lock()
+
+    def path(self, hash: str, codec: str) -> str:
+        if not re.fullmatch(r"[0-9a-f]{64}", hash or ""):
+            raise ValueError(f"Invalid content hash: {hash}")
+        return os.path.join(self.root, hash[:2], hash[2:4], f"{hash}.{codec}")
+
+    def exists(self, hash: str) -> bool:
+        return any(os.path.exists(self.path(hash, codec)) for codec in self.CODECS)
+
+    def put(self, text: str, hash: str = None) -> str:
+        """保存正文(图片地址已替换), 返回哈希; 已存在时跳过"""
+        if not self.enabled or not text:
+            return None
+        hash = hash or content_hash(text)
+        try:
+            if self.exists(hash):
+                return hash
+            codec, data = compress_text(add_logo_prefix(text))
+            path = self.path(hash, codec)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except Exception as e:
+            print_warning(f"写入正文缓存失败: {e}")
+        return hash
+
+    def get(self, hash: str) -> str:
+        """读取正文, 不存在时返回None"""
+        if not self.enabled or not hash:
+            return None
+        for codec in self.CODECS:
+            try:
+                with open(self.path(hash, codec), "rb") as f:
+                    return decompress_text(codec, f.read())
+            except FileNotFoundError:
+                continue
+            except Exception as e:
+                print_warning(f"读取正文缓存失败: {e}")
+                return None
+        return None
+
+CONTENT_STORE = ContentStore()
+
+@event.listens_for(Session, "after_flush")
+def _store_contents(session, flush_context):
+    # ORM写入正文时同时保存到正文缓存, 批量写入在调用处单独保存
+    if not CONTENT_STORE.enabled:
+        return
+    from core.models.article import ArticleContent
+    for obj in (*session.new, *session.dirty):
+        # set_text写入的正文保留在对象上, 没有修改正文的对象不处理
+        if not isinstance(obj, ArticleContent) or not inspect(obj).attrs.data.history.has_changes():
+            continue
+        text = obj.__dict__.get("_text")
+        if text:
+            CONTENT_STORE.put(text)
@@ -0,0 +1,115 @@
+import time
+import threading
+from sqlalchemy import event, select, func, text
+from sqlalchemy.orm import Session
+from core.config import cfg
+from core.print import print_warning
+
+# 列表接口总数缓存
+# 按 (表名, 归一化的筛选条件) 缓存 count 结果, 表有写入时整表失效, 另有TTL兜底(多进程部署时其它进程的写入只能靠TTL)
+
+class CountCache:
+    """分页列表总数缓存"""
+    def __init__(self, max_entries: int = 1024):
+        self.ttl = int(cfg.get("count_cache.ttl", 60) or 0)
+        self.estimate = str(cfg.get("count_cache.estimate", False)).lower() in ("true", "1", "yes")
+        self.max_entries = max_entries
+        self._data = {}
+        self._generation = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(table: str, filters: dict = None) -> tuple:
+        """归一化筛选条件: 忽略空值, 按名称排序"""
+        items = tuple(sorted((k, str(v).strip()) for k, v in (filters or {}).items() if v not in (None, "")))
+        return (table, items)
+
+    def get(self, key: tuple):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires < time.time():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key: tuple, value: int, generation: int) -> None:
+        with self._lock:
+            # 计数期间表有写入时不缓存, 避免存入旧值
+            if self._generation.get(key[0], 0) != generation:
+                return
+            if len(self._data) >= self.max_entries:
+                self._data.pop(next(iter(self._data)))
+            self._data[key] = (value, time.time() + self.ttl)
+
+    def invalidate(self, *tables: str) -> None:
+        """表有写入时清除相关缓存"""
+        with self._lock:
+            for table in tables:
+                self._generation[table] = self._generation.get(table, 0) + 1
+            self._data = {k: v for k, v in self._data.items() if k[0] not in tables}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    async def _estimate(self, session, table: str):
+        """从数据库统计信息估算整表行数, 不支持时返回None"""
+        dialect = session.bind.dialect.name
+        if dialect == "postgresql":
+            sql, params = "SELECT reltuples::bigint FROM pg_class WHERE relname = :table", {"table": table}
+        elif dialect == "mysql":
+            sql, params = "SELECT TABLE_ROWS FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table", {"table": table}
+        elif dialect == "sqlite":
+            # 需要执行过 ANALYZE
+            sql, params = "SELECT stat FROM sqlite_stat1 WHERE tbl = :table LIMIT 1", {"table": table}
+        else:
+            return None
+        try:
+            value = await session.scalar(text(sql), params)
+            if value is None:
+                return None
+            value = int(str(value).split(" ")[0])
+            return value if value >= 0 else None
+        except Exception as e:
+            print_warning(f"估算{table}总数失败, 改为精确计数: {e}")
+            self.estimate = False
+            return None
+
+    async def count(self, session, table: str, stmt, filters: dict = None) -> int:
+        """返回查询的总数, 优先使用缓存
+
+        Args:
+            session: 异步会话
+            table: 主表名, 用于写入失效
+            stmt: 列表查询(select)
+            filters: 影响结果的筛选条件, 为空且开启estimate时使用统计信息估算
+        """
+        key = self.make_key(table, filters)
+        if self.ttl > 0:
+            value = self.get(key)
+            if value is not None:
+                return value
+        with self._lock:
+            generation = self._generation.get(table, 0)
+        value = None
+        if self.estimate and not key[1]:
+            value = await self._estimate(session, table)
+        if value is None:
+            value = await session.scalar(select(func.count()).select_from(stmt.order_by(None).subquery())) or 0
+        if self.ttl > 0:
+            self.set(key, value, generation)
+        return value
+
+COUNTS = CountCache()
+
+@event.listens_for(Session, "after_flush")
+def _invalidate_after_flush(session, flush_context):
+    # ORM写入后失效对应表的计数, 批量写入在调用处单独失效
+    tables = {getattr(obj, "__tablename__", None) for obj in (*session.new, *session.deleted)}
+    tables.update(getattr(obj, "__tablename__", None) for obj in session.dirty if session.is_modified(obj))
+    tables.discard(None)
+    if tables:
+        COUNTS.invalidate(*tables)
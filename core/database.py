@@ -1,3 +1,8 @@
 from core.db import DB
 def get_db():
-    return DB.get_session()
\ No newline at end of file
+    return DB.get_session()
+async def get_async_db():
+    # 异步会话, 供只读接口使用
+    from core.async_db import ADB
+    async with ADB.session() as session:
+        yield session
@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine, Engine,Text,event
+from sqlalchemy import create_engine, Engine,Text,event,text
 from sqlalchemy.orm import sessionmaker, declarative_base,scoped_session
 from sqlalchemy import Column, Integer, String, DateTime
 from typing import Optional, List
@@ -6,9 +6,192 @@ from .models import Feed, Article
 from .config import cfg
 from core.models.base import Base  
 from core.print import print_warning,print_info,print_error,print_success
+from core.fts import FTS
+from core.count_cache import COUNTS
+from core.article_lax import STATS
+from core.rss_cache import FEED_CACHE
+from core.content_store import CONTENT_STORE
+from core.memberships import MEMBERSHIPS
+from core.feed_meta import FEED_META
+from core.rss_render import MATERIALIZER
+import threading
+import atexit
 # 声明基类
 # Base = declarative_base()
 
+class DbHealth:
+    """数据库连接健康检查
+
+    连接池在借出连接时通过 pool_pre_ping 校验连接有效性,
+    这里再由后台线程按固定间隔探测数据库, 探测失败后按指数退避释放并重建连接池,
+    并记录探测/失败/重连次数
+    """
+    def __init__(self, engine:Engine, name:str, interval:int=60, max_backoff:int=60):
+        self.engine=engine
+        self.name=name
+        self.interval=interval
+        self.max_backoff=max_backoff
+        self.probes=0
+        self.failures=0
+        self.reconnects=0
+        self.healthy=True
+        self.last_error=None
+        self.last_probe_time=None
+        self._lock=threading.Lock()
+        self._stop_event=threading.Event()
+        self._thread=None
+    def probe(self)->bool:
+        """执行一次探测, 返回数据库是否可用"""
+        import time
+        with self._lock:
+            self.probes+=1
+            self.last_probe_time=int(time.time())
+        try:
+            with self.engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+            self.healthy=True
+            return True
+        except Exception as e:
+            with self._lock:
+                self.failures+=1
+                self.last_error=str(e)
+            self.healthy=False
+            return False
+    def reconnect(self)->bool:
+        """释放连接池并重试, 直到探测成功或监控停止"""
+        backoff=1
+        while not self._stop_event.is_set():
+            print_warning(f"[{self.name}] Database connection lost: {self.last_error}. Reconnecting in {backoff}s...")
+            if self._stop_event.wait(backoff):
+                break
+            try:
+                self.engine.dispose()
+            except Exception as e:
+                print_error(f"[{self.name}] 释放连接池失败: {e}")
+            with self._lock:
+                self.reconnects+=1
+            if self.probe():
+                print_success(f"[{self.name}] 数据库连接已恢复")
+                return True
+            backoff=min(backoff*2,self.max_backoff)
+        return False
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            if not self.probe():
+                self.reconnect()
+    def start(self):
+        """启动后台探测线程, interval<=0 时不启动"""
+        if self.interval<=0 or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stop_event.clear()
+        self._thread=threading.Thread(target=self._run,name=f"db-health-{self.name}",daemon=True)
+        self._thread.start()
+    def stop(self):
+        self._stop_event.set()
+    def stats(self)->dict:
+        with self._lock:
+            return {
+                "healthy":self.healthy,
+                "probes":self.probes,
+                "failures":self.failures,
+                "reconnects":self.reconnects,
+                "last_error":self.last_error,
+                "last_probe_time":self.last_probe_time,
+            }
+
+class EngineRegistry:
+    """进程内共享的数据库引擎
+
+    按连接串复用同一个引擎(连接池)和健康检查, 各个 Db(tag=...) 只保留自己的会话工厂和计数,
+    连接池大小由 db_pool 配置统一控制
+    """
+    def __init__(self):
+        self._engines={}
+        self._health={}
+        self._tags={}
+        self._lock=threading.Lock()
+    @staticmethod
+    def _mask(con_str:str)->str:
+        """隐藏连接串中的密码"""
+        from sqlalchemy.engine import make_url
+        try:
+            return make_url(con_str).render_as_string(hide_password=True)
+        except Exception:
+            return "***"
+    def _create(self, con_str:str)->Engine:
+        # 检查SQLite数据库文件是否存在
+        if con_str.startswith('sqlite:///'):
+            import os
+            db_path = con_str[10:]  # 去掉'sqlite:///'前缀
+            if not os.path.exists(db_path):
+                try:
+                    os.makedirs(os.path.dirname(db_path), exist_ok=True)
+                except Exception as e:
+                    pass
+                open(db_path, 'w').close()
+        return create_engine(con_str,
+                             pool_size=int(cfg.get("db_pool.size",2)),                  # 最小空闲连接数
+                             max_overflow=int(cfg.get("db_pool.max_overflow",20)),      # 允许的最大溢出连接数
+                             pool_timeout=int(cfg.get("db_pool.timeout",30)),           # 获取连接时的超时时间（秒）
+                             echo=False,
+                             pool_recycle=int(cfg.get("db_pool.recycle",60)),           # 连接池回收时间（秒）
+                             pool_pre_ping=True,  # 借出连接前校验连接是否可用
+                             isolation_level="AUTOCOMMIT",  # 设置隔离级别
+                            #  isolation_level="READ COMMITTED",  # 设置隔离级别
+                            #  query_cache_size=0,
+                             connect_args={"check_same_thread": False} if con_str.startswith('sqlite:///') else {}
+                             )
+    def get_engine(self, con_str:str)->Engine:
+        """获取连接串对应的引擎, 不存在时创建并启动健康检查"""
+        with self._lock:
+            engine=self._engines.get(con_str)
+            if engine is None:
+                engine=self._create(con_str)
+                self._engines[con_str]=engine
+                health=DbHealth(engine,name=self._mask(con_str),interval=int(cfg.get("db_pool.health_interval",60) or 0))
+                health.start()
+                self._health[con_str]=health
+                print_success(f"[{self._mask(con_str)}]连接池初始化")
+            return engine
+    def get_health(self, con_str:str)->Optional[DbHealth]:
+        return self._health.get(con_str)
+    def register(self, tag:str, con_str:str)->dict:
+        """登记使用引擎的Db实例, 返回该tag的计数"""
+        with self._lock:
+            metrics=self._tags.setdefault(tag,{"engine":self._mask(con_str),"instances":0,"sessions":0})
+            metrics["engine"]=self._mask(con_str)
+            metrics["instances"]+=1
+            return metrics
+    def stats(self)->dict:
+        """各连接池与tag的使用情况"""
+        with self._lock:
+            pools={}
+            for con_str,engine in self._engines.items():
+                pool=engine.pool
+                pools[self._mask(con_str)]={
+                    "size":pool.size() if hasattr(pool,"size") else None,
+                    "checked_out":pool.checkedout() if hasattr(pool,"checkedout") else None,
+                    "overflow":pool.overflow() if hasattr(pool,"overflow") else None,
+                    "health":self._health[con_str].stats(),
+                }
+            return {"pools":pools,"tags":{tag:dict(m) for tag,m in self._tags.items()}}
+    def dispose_all(self)->None:
+        """停止健康检查并关闭所有连接池"""
+        with self._lock:
+            for health in self._health.values():
+                health.stop()
+            for engine in self._engines.values():
+                try:
+                    engine.dispose()
+                except Exception as e:
+                    print_error(f"关闭数据库连接池失败: {e}")
+            self._engines.clear()
+            self._health.clear()
+
+# 进程内全局引擎注册表
+ENGINES=EngineRegistry()
+atexit.register(ENGINES.dispose_all)
+
 class Db:
     connection_str: str=None
     def __init__(self,tag:str="默认",User_In_Thread=True):
@@ -16,7 +199,7 @@ class Db:
         self.engine = None
         self.User_In_Thread=User_In_Thread
         self.tag=tag
-        print_success(f"[{tag}]连接初始化")
+        self.metrics=None
         self.init(cfg.get("db"))
     def get_engine(self) -> Engine:
         """Return the SQLAlchemy engine for this database connection."""
@@ -26,31 +209,17 @@ class Db:
     def get_session_factory(self):
         return sessionmaker(bind=self.engine, autoflush=True, expire_on_commit=True, future=True)
     def init(self, con_str: str) -> None:
-        """Initialize database connection and create tables"""
+        """绑定到共享引擎, 同一连接串重复调用不会创建新的连接池"""
         try:
+            if self.engine is not None and self.connection_str==con_str:
+                return
             self.connection_str=con_str
-            # 检查SQLite数据库文件是否存在
-            if con_str.startswith('sqlite:///'):
-                import os
-                db_path = con_str[10:]  # 去掉'sqlite:///'前缀
-                if not os.path.exists(db_path):
-                    try:
-                        os.makedirs(os.path.dirname(db_path), exist_ok=True)
-                    except Exception as e:
-                        pass
-                    open(db_path, 'w').close()
-            self.engine = create_engine(con_str,
-                                     pool_size=2,          # 最小空闲连接数
-                                     max_overflow=20,      # 允许的最大溢出连接数
-                                     pool_timeout=30,      # 获取连接时的超时时间（秒）
-                                     echo=False,
-                                     pool_recycle=60,  # 连接池回收时间（秒）
-                                     isolation_level="AUTOCOMMIT",  # 设置隔离级别
-                                    #  isolation_level="READ COMMITTED",  # 设置隔离级别
-                                    #  query_cache_size=0,
-                                     connect_args={"check_same_thread": False} if con_str.startswith('sqlite:///') else {}
-                                     )
+            self.engine = ENGINES.get_engine(con_str)
             self.session_factory=self.get_session_factory()
+            self.Session=None
+            if self.metrics is None:
+                self.metrics=ENGINES.register(self.tag,con_str)
+                print_success(f"[{self.tag}]连接初始化")
         except Exception as e:
             print(f"Error creating database connection: {e}")
             raise
@@ -75,11 +244,25 @@ class Db:
         
     def __exit__(self, exc_type, exc_val, exc_tb):
         self.close()
+    @staticmethod
+    def article_id(article_data:dict)->str:
+        """文章在articles表中的ID(公众号ID-文章ID)"""
+        if not article_data.get("id"):
+            return article_data.get("id")
+        return f"{str(article_data.get('mp_id'))}-{article_data['id']}".replace("MP_WXS_","")
+    @staticmethod
+    def _to_datetime(value,default):
+        from datetime import datetime
+        if value is None:
+            return default
+        if isinstance(value,datetime):
+            return value
+        return datetime.strptime(str(value),'%Y-%m-%d %H:%M:%S')
     def delete_article(self,article_data:dict)->bool:
         try:
             art = Article(**article_data)
             if art.id:
-               art.id=f"{str(art.mp_id)}-{art.id}".replace("MP_WXS_","")
+               art.id=self.article_id(article_data)
             session=DB.get_session()
             article = session.query(Article).filter(Article.id == art.id).first()
             if article is not None:
@@ -97,7 +280,7 @@ class Db:
             from datetime import datetime
             art = Article(**article_data)
             if art.id:
-               art.id=f"{str(art.mp_id)}-{art.id}".replace("MP_WXS_","")
+               art.id=self.article_id(article_data)
             
             if check_exist:
                 # 检查文章是否已存在
@@ -106,13 +289,9 @@ class Db:
                     print_warning(f"Article already exists: {art.id}")
                     return False
                 
-            if art.created_at is None:
-                art.created_at=datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            if art.updated_at is None:
-                art.updated_at=datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            art.created_at=datetime.strptime(art.created_at ,'%Y-%m-%d %H:%M:%S')
-            art.updated_at=datetime.strptime(art.updated_at,'%Y-%m-%d %H:%M:%S')
-            art.content=art.content
+            now=datetime.now().replace(microsecond=0)
+            art.created_at=self._to_datetime(art.created_at,now)
+            art.updated_at=self._to_datetime(art.updated_at,now)
             from core.models.base import DATA_STATUS
             art.status=DATA_STATUS.ACTIVE
             session.add(art)
@@ -126,6 +305,158 @@ class Db:
                 print_error(f"Failed to add article: {e}")
             return False
         return True    
+
+    def _upsert_stmt(self, table, rows:list, update:bool=False, update_cols:list=None):
+        """按数据库方言生成批量写入语句, 主键冲突时跳过或更新"""
+        dialect=self.engine.dialect.name
+        if update_cols is None:
+            update_cols=[c.name for c in table.columns if not c.primary_key]
+        pk=[c for c in table.primary_key.columns]
+        if dialect in ("sqlite","postgresql"):
+            if dialect=="sqlite":
+                from sqlalchemy.dialects.sqlite import insert
+            else:
+                from sqlalchemy.dialects.postgresql import insert
+            stmt=insert(table).values(rows)
+            if update:
+                return stmt.on_conflict_do_update(index_elements=pk,set_={c:stmt.excluded[c] for c in update_cols})
+            return stmt.on_conflict_do_nothing()
+        if dialect=="mysql":
+            from sqlalchemy.dialects.mysql import insert
+            stmt=insert(table).values(rows)
+            if update:
+                return stmt.on_duplicate_key_update({c:stmt.inserted[c] for c in update_cols})
+            return stmt.on_duplicate_key_update({pk[0].name:pk[0]})
+        return None
+
+    def add_articles_bulk(self, articles:List[dict], update:bool=False, chunk_size:int=200) -> List[str]:
+        """批量写入文章
+
+        使用数据库原生的 INSERT ... ON CONFLICT / ON DUPLICATE KEY 分块写入,
+        已存在的文章默认跳过, update=True 时用新数据覆盖
+
+        Returns:
+            本次新增的文章ID列表(articles表中的ID)
+        """
+        if not articles:
+            return []
+        from datetime import datetime
+        from sqlalchemy import select,or_
+        from core.models.base import DATA_STATUS
+        from core.models.article import ArticleContent
+        from core.common.compress import compress_text,content_hash
+        table=Article.__table__
+        content_table=ArticleContent.__table__
+        columns=[c.name for c in table.columns]
+        now=datetime.now().replace(microsecond=0)
+        rows={}
+        contents={}
+        texts={}
+        for data in articles:
+            row={c:data.get(c) for c in columns}
+            row["id"]=self.article_id(data)
+            if not row["id"]:
+                continue
+            row["created_at"]=self._to_datetime(row["created_at"],now)
+            row["updated_at"]=self._to_datetime(row["updated_at"],now)
+            row["status"]=DATA_STATUS.ACTIVE
+            row["url_hash"]=content_hash(row["url"]) if row["url"] else None
+            text=data.get("content")
+            if text:
+                row["content_hash"]=content_hash(text)
+                codec,blob=compress_text(text)
+                contents[row["id"]]={"id":row["id"],"codec":codec,"data":blob,"size":len(text.encode("utf-8")),"updated_at":now}
+                texts[row["id"]]=text
+            # 同一批次内重复的文章以最后一条为准
+            rows[row["id"]]=row
+        # 同一批次内链接相同的文章只保留第一条
+        seen_urls=set()
+        unique_rows=[]
+        for row in rows.values():
+            if row["url_hash"] is not None:
+                if row["url_hash"] in seen_urls:
+                    continue
+                seen_urls.add(row["url_hash"])
+            unique_rows.append(row)
+        rows=unique_rows
+        new_ids=[]
+        touched_mps=set()
+        stored_ids=[]
+        engine=self.get_engine()
+        try:
+            with engine.connect() as conn:
+                # 引擎默认AUTOCOMMIT, 这里切回数据库默认隔离级别, 保证出错时整批回滚
+                conn.execution_options(isolation_level=engine.dialect.default_isolation_level or "READ COMMITTED")
+                with conn.begin():
+                    for i in range(0,len(rows),chunk_size):
+                        chunk=rows[i:i+chunk_size]
+                        ids=[row["id"] for row in chunk]
+                        hashes={row["id"]:row["content_hash"] for row in chunk}
+                        url_hashes=[row["url_hash"] for row in chunk if row["url_hash"] is not None]
+                        existing={}
+                        existing_urls={}
+                        for id,url_hash,mp_id,status,old_hash in conn.execute(select(table.c.id,table.c.url_hash,table.c.mp_id,table.c.status,table.c.content_hash)
+                                                                                .where(or_(table.c.id.in_(ids),table.c.url_hash.in_(url_hashes)))):
+                            existing[id]=(mp_id,status,old_hash)
+                            if url_hash is not None:
+                                existing_urls[url_hash]=id
+                        # 链接已被其它文章占用的跳过, 避免违反url唯一索引
+                        chunk=[row for row in chunk if existing_urls.get(row["url_hash"],row["id"])==row["id"]]
+                        if not chunk:
+                            continue
+                        ids=[row["id"] for row in chunk]
+                        # 没有正文的新数据不应清掉已有正文的摘要, content_hash单独更新;
+                        # 状态不随覆盖更新, 避免已删除的文章被重新采集后复活
+                        stmt=self._upsert_stmt(table,chunk,update=update,update_cols=[c for c in columns if c not in ("id","created_at","content_hash","status")])
+                        if stmt is None:
+                            # 未知方言: 只插入不存在的文章
+                            chunk=[row for row in chunk if row["id"] not in existing]
+                            if not chunk:
+                                continue
+                            stmt=table.insert().values(chunk)
+                        conn.execute(stmt)
+                        chunk_new=[id for id in ids if id not in existing]
+                        new_ids.extend(chunk_new)
+                        # 正文写入article_contents, 跳过模式下只写新增文章的正文
+                        content_rows=[contents[id] for id in (ids if update else chunk_new) if id in contents]
+                        if content_rows:
+                            stored_ids.extend(r["id"] for r in content_rows)
+                            stmt=self._upsert_stmt(content_table,content_rows,update=True)
+                            if stmt is None:
+                                conn.execute(content_table.delete().where(content_table.c.id.in_([r["id"] for r in content_rows])))
+                                stmt=content_table.insert().values(content_rows)
+                            conn.execute(stmt)
+                            if update:
+                                from sqlalchemy import bindparam
+                                conn.execute(table.update().where(table.c.id==bindparam("b_id")).values(content_hash=bindparam("b_hash")),
+                                             [{"b_id":r["id"],"b_hash":hashes[r["id"]]} for r in content_rows])
+                        # 批量写入不经过ORM事件，这里单独累加文章统计
+                        deltas=STATS.new_deltas()
+                        for row in chunk:
+                            if row["id"] not in existing:
+                                STATS.article_delta(deltas,row["mp_id"],row["status"],row["content_hash"] is not None,row["publish_time"],1)
+                                touched_mps.add(row["mp_id"])
+                            elif update:
+                                mp_id,status,old_hash=existing[row["id"]]
+                                touched_mps.update((mp_id,row["mp_id"]))
+                                STATS.article_delta(deltas,mp_id,status,old_hash is not None,None,-1)
+                                STATS.article_delta(deltas,row["mp_id"],status,old_hash is not None or row["content_hash"] is not None,row["publish_time"],1)
+                        STATS.apply(conn,deltas)
+                        # 批量写入不经过ORM事件，这里单独更新全文索引
+                        FTS.index_ids(conn,ids if update else chunk_new)
+        except Exception as e:
+            # 事务已回滚, 不能再把本次数据当作已写入
+            print_error(f"Failed to add articles: {e}")
+            return []
+        if new_ids or update:
+            COUNTS.invalidate(table.name)
+        # 清除涉及这些公众号的RSS内存缓存, 在后台重新生成并推送给WebSub订阅者
+        FEED_CACHE.invalidate_feeds(touched_mps)
+        MATERIALIZER.schedule(touched_mps)
+        # 写入的正文保存到正文缓存, 内容相同的已存在时跳过
+        for id in stored_ids:
+            CONTENT_STORE.put(texts[id])
+        return new_ids
         
     def get_articles(self, id:str=None, limit:int=30, offset:int=0) -> List[Article]:
         try:
@@ -161,7 +492,7 @@ class Db:
             return e
 
     def get_faker_id(self, mp_id:str):
-        data = self.get_mps(mp_id)
+        data = FEED_META.get(self.get_session(), mp_id)
         return data.faker_id
     def expire_all(self):
         if self.Session:
@@ -201,6 +532,7 @@ class Db:
             _session()
         
         session = self.Session()
+        self.metrics["sessions"]+=1
         # session.expire_all()
         # session.expire_on_commit = True  # 确保每次提交后对象过期
         # 检查会话是否已经关闭
@@ -209,18 +541,14 @@ class Db:
             print_info(f"[{self.tag}] Session is already closed.")
             _session()
             return self.Session()
-        # 检查数据库连接是否已断开
-        try:
-            from core.models import User
-            # 尝试执行一个简单的查询来检查连接状态
-            session.query(User.id).count()
-        except Exception as e:
-            from core.print import print_warning
-            print_warning(f"[{self.tag}] Database connection lost: {e}. Reconnecting...")
-            self.init(self.connection_str)
-            _session()
-            return self.Session()
+        # 连接有效性由连接池pre_ping和后台健康检查(DbHealth)保证，这里不再逐次探测
         return session
+    @property
+    def health(self)->Optional[DbHealth]:
+        return ENGINES.get_health(self.connection_str)
+    def health_stats(self)->dict:
+        """连接健康检查计数"""
+        return self.health.stats() if self.health else {}
     def auto_refresh(self):
         # 定义一个事件监听器，在对象更新后自动刷新
         def receive_after_update(mapper, connection, target):
@@ -238,5 +566,4 @@ class Db:
             session.remove()
 
 # 全局数据库实例
-DB = Db(User_In_Thread=True)
-DB.init(cfg.get("db"))
\ No newline at end of file
+DB = Db(User_In_Thread=True)
\ No newline at end of file
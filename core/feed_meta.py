@@ -0,0 +1,104 @@
+import time
+import threading
+from collections import OrderedDict, namedtuple
+from sqlalchemy import event, select, inspect
+from sqlalchemy.orm import Session
+from core.config import cfg
+from core.models.feed import Feed
+
+# 公众号基本信息缓存
+# 文章列表、任务等只需要公众号名称/封面/简介/faker_id, 按ID读穿缓存, 一页内缺失的ID合并为一次IN查询,
+# 公众号新增/修改/删除时失效, 另有TTL兜底(多进程部署时其它进程的写入只能靠TTL)
+
+FeedMeta = namedtuple("FeedMeta", ["id", "mp_name", "mp_cover", "mp_intro", "faker_id"])
+_COLUMNS = (Feed.id, Feed.mp_name, Feed.mp_cover, Feed.mp_intro, Feed.faker_id)
+
+class FeedMetaCache:
+    """公众号基本信息的读穿缓存, 不存在的公众号也缓存(值为None)"""
+    def __init__(self, max_entries: int = 4096):
+        self.ttl = int(cfg.get("feed_cache.ttl", 300) or 0)
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def _lookup(self, ids) -> tuple:
+        """返回(已缓存的{id: FeedMeta|None}, 需要查询的ID, 当前代数)"""
+        found, missing = {}, []
+        now = time.time()
+        with self._lock:
+            for id in ids:
+                item = self._data.get(id)
+                if item is None or item[1] < now:
+                    missing.append(id)
+                    continue
+                self._data.move_to_end(id)
+                found[id] = item[0]
+            return found, missing, self._generation
+
+    def _store(self, missing: list, rows, generation: int) -> dict:
+        loaded = {id: None for id in missing}
+        loaded.update((row[0], FeedMeta(*row)) for row in rows)
+        if self.ttl <= 0:
+            return loaded
+        with self._lock:
+            # 查询期间公众号有写入时不缓存, 避免存入旧值
+            if generation == self._generation:
+                expires = time.time() + self.ttl
+                for id, meta in loaded.items():
+                    self._data[id] = (meta, expires)
+                    self._data.move_to_end(id)
+                while len(self._data) > self.max_entries:
+                    self._data.popitem(last=False)
+        return loaded
+
+    @staticmethod
+    def _ids(ids) -> list:
+        return list(dict.fromkeys(str(id) for id in ids if id))
+
+    def get_many(self, session, ids) -> dict:
+        """批量获取公众号信息(同步会话), 返回{id: FeedMeta}, 不存在的ID不在结果中"""
+        found, missing, generation = self._lookup(self._ids(ids))
+        if missing:
+            found.update(self._store(missing, session.execute(select(*_COLUMNS).where(Feed.id.in_(missing))).all(), generation))
+        return {id: meta for id, meta in found.items() if meta is not None}
+
+    async def aget_many(self, session, ids) -> dict:
+        """批量获取公众号信息(异步会话)"""
+        found, missing, generation = self._lookup(self._ids(ids))
+        if missing:
+            rows = (await session.execute(select(*_COLUMNS).where(Feed.id.in_(missing)))).all()
+            found.update(self._store(missing, rows, generation))
+        return {id: meta for id, meta in found.items() if meta is not None}
+
+    def get(self, session, id: str):
+        """获取单个公众号信息, 不存在时返回None"""
+        return self.get_many(session, [id]).get(str(id))
+
+    def invalidate(self, *ids: str) -> None:
+        """公众号写入时清除缓存, 不传ID时全部清除"""
+        with self._lock:
+            self._generation += 1
+            if not ids:
+                self._data.clear()
+            for id in ids:
+                self._data.pop(id, None)
+
+    def clear(self) -> None:
+        self.invalidate()
+
+FEED_META = FeedMetaCache()
+
+@event.listens_for(Session, "after_flush")
+def _invalidate_feed_meta(session, flush_context):
+    # 公众号新增/修改/删除后清除对应缓存
+    ids = []
+    for obj in (*session.new, *session.deleted, *[o for o in session.dirty if session.is_modified(o)]):
+        if isinstance(obj, Feed):
+            id = inspect(obj).dict.get("id")
+            if id is None:
+                FEED_META.clear()
+                return
+            ids.append(id)
+    if ids:
+        FEED_META.invalidate(*ids)
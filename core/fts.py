@@ -0,0 +1,256 @@
+import re
+import html
+from sqlalchemy import event, inspect, select, text, bindparam, or_, func, String, Float, column
+from sqlalchemy.orm import Session
+from core.models.article import ArticleBase, Article, ArticleContent
+from core.common.compress import decompress_text
+from core.config import cfg
+from core.print import print_warning, print_info
+
+# 文章全文索引
+# SQLite 使用 FTS5 虚拟表, PostgreSQL 使用 tsvector + GIN, MySQL 使用 FULLTEXT WITH PARSER ngram
+# SQLite/PostgreSQL 没有中文分词, 写入和查询前先把连续的中文切成二元组(bigram)
+
+SEARCH_TABLE = "article_search"
+_CJK = "\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff"
+_TOKEN_RE = re.compile(f"[{_CJK}]+|[^\\W_{_CJK}]+")
+_CJK_RE = re.compile(f"[{_CJK}]")
+_TAG_RE = re.compile(r"<(script|style)[^>]*>.*?</\1>|<[^>]+>", re.S | re.I)
+_SPACE_RE = re.compile(r"\s+")
+
+def html_to_text(content: str) -> str:
+    """去掉HTML标签, 只保留用于检索的文本"""
+    if not content:
+        return ""
+    return _SPACE_RE.sub(" ", html.unescape(_TAG_RE.sub(" ", content))).strip()
+
+def tokenize(value: str) -> list:
+    """切分为检索词: 中文连续片段切成二元组, 其它按单词"""
+    tokens = []
+    for part in _TOKEN_RE.findall(value or ""):
+        if _CJK_RE.match(part):
+            if len(part) == 1:
+                tokens.append(part)
+            else:
+                tokens.extend(part[i:i+2] for i in range(len(part) - 1))
+        else:
+            tokens.append(part.lower())
+    return tokens
+
+def split_keyword(keyword: str) -> list:
+    """与原有搜索一致, 空格、-、| 分隔的多个词按 OR 匹配"""
+    return [w for w in keyword.replace("-", " ").replace("|", " ").split(" ") if w.strip()]
+
+class ArticleSearch:
+    """文章全文检索, 按数据库方言选择实现"""
+    def __init__(self):
+        self.enabled = str(cfg.get("search.fts", True)).lower() not in ("false", "0", "no")
+        self.max_content = int(cfg.get("search.max_content", 20000) or 0)
+        self._ready = {}
+
+    def _db(self):
+        from core.db import DB
+        return DB
+
+    def ready(self, bind=None) -> bool:
+        """索引表是否存在(按引擎缓存结果)"""
+        if not self.enabled:
+            return False
+        bind = bind if bind is not None else self._db().get_engine()
+        key = str(bind.engine.url)
+        if key not in self._ready:
+            try:
+                # 传入连接时在该连接上检查, 另开连接归还时的回滚会撤销同一连接上未提交的写入(SQLite内存库)
+                self._ready[key] = bind.dialect.name in ("sqlite", "postgresql", "mysql") and inspect(bind).has_table(SEARCH_TABLE)
+            except Exception as e:
+                print_warning(f"检查全文索引失败: {e}")
+                self._ready[key] = False
+        return self._ready[key]
+
+    def ensure(self, engine) -> bool:
+        """创建索引表, 返回是否为新建"""
+        dialect = engine.dialect.name
+        if inspect(engine).has_table(SEARCH_TABLE):
+            self._ready[str(engine.url)] = True
+            return False
+        if dialect == "sqlite":
+            ddl = [f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5(id UNINDEXED, title, description, content, tokenize='unicode61')"]
+        elif dialect == "postgresql":
+            ddl = [f"CREATE TABLE IF NOT EXISTS {SEARCH_TABLE} (id VARCHAR(255) PRIMARY KEY, tsv TSVECTOR)",
+                   f"CREATE INDEX IF NOT EXISTS ix_{SEARCH_TABLE}_tsv ON {SEARCH_TABLE} USING GIN (tsv)"]
+        elif dialect == "mysql":
+            ddl = [f"CREATE TABLE IF NOT EXISTS {SEARCH_TABLE} (id VARCHAR(255) NOT NULL PRIMARY KEY, title TEXT, description TEXT, content MEDIUMTEXT, "
+                   f"FULLTEXT KEY ft_{SEARCH_TABLE} (title, description, content) WITH PARSER ngram) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4"]
+        else:
+            print_warning(f"数据库 {dialect} 不支持全文索引, 使用模糊搜索")
+            return False
+        with engine.begin() as conn:
+            for sql in ddl:
+                conn.execute(text(sql))
+        self._ready[str(engine.url)] = True
+        return True
+
+    def _docs(self, conn, ids: list) -> list:
+        """从文章表读取需要索引的文本"""
+        table = ArticleBase.__table__
+        content_table = ArticleContent.__table__
+        docs = {row.id: {"id": row.id, "title": row.title or "", "description": html_to_text(row.description), "content": ""}
+                for row in conn.execute(select(table.c.id, table.c.title, table.c.description).where(table.c.id.in_(ids)))}
+        if docs:
+            for row in conn.execute(select(content_table.c.id, content_table.c.codec, content_table.c.data).where(content_table.c.id.in_(list(docs)))):
+                content = html_to_text(decompress_text(row.codec, row.data))
+                docs[row.id]["content"] = content[:self.max_content] if self.max_content else content
+        return list(docs.values())
+
+    def index_ids(self, conn, ids) -> int:
+        """重建指定文章的索引, 文章已不存在时删除对应索引"""
+        ids = list(set(ids or []))
+        if not ids or not self.ready(conn):
+            return 0
+        docs = self._docs(conn, ids)
+        self.remove(conn, ids)
+        if not docs:
+            return 0
+        dialect = conn.dialect.name
+        if dialect == "sqlite":
+            conn.execute(text(f"INSERT INTO {SEARCH_TABLE} (id, title, description, content) VALUES (:id, :title, :description, :content)"),
+                         [{"id": d["id"], "title": " ".join(tokenize(d["title"])), "description": " ".join(tokenize(d["description"])),
+                           "content": " ".join(tokenize(d["content"]))} for d in docs])
+        elif dialect == "postgresql":
+            conn.execute(text(f"INSERT INTO {SEARCH_TABLE} (id, tsv) VALUES (:id, "
+                              "setweight(to_tsvector('simple', :title), 'A') || setweight(to_tsvector('simple', :description), 'B') || "
+                              "setweight(to_tsvector('simple', :content), 'C'))"),
+                         [{"id": d["id"], "title": " ".join(tokenize(d["title"])), "description": " ".join(tokenize(d["description"])),
+                           "content": " ".join(tokenize(d["content"]))} for d in docs])
+        elif dialect == "mysql":
+            # ngram 解析器自行处理中文
+            conn.execute(text(f"INSERT INTO {SEARCH_TABLE} (id, title, description, content) VALUES (:id, :title, :description, :content)"), docs)
+        return len(docs)
+
+    def remove(self, conn, ids) -> None:
+        ids = list(ids or [])
+        if ids and self.ready(conn):
+            conn.execute(text(f"DELETE FROM {SEARCH_TABLE} WHERE id IN :ids").bindparams(bindparam("ids", expanding=True)), {"ids": ids})
+
+    def remove_orphans(self, conn) -> None:
+        """删除文章已不存在的索引(批量删除文章后调用)"""
+        if self.ready(conn):
+            conn.execute(text(f"DELETE FROM {SEARCH_TABLE} WHERE id NOT IN (SELECT id FROM articles)"))
+
+    def rebuild(self, engine=None, batch_size: int = 200) -> int:
+        """全量重建索引"""
+        engine = engine or self._db().get_engine()
+        if not self.enabled:
+            return 0
+        self.ensure(engine)
+        table = ArticleBase.__table__
+        count = 0
+        last_id = ""
+        with engine.begin() as conn:
+            conn.execute(text(f"DELETE FROM {SEARCH_TABLE}"))
+        while True:
+            with engine.begin() as conn:
+                ids = [r[0] for r in conn.execute(select(table.c.id).where(table.c.id > last_id).order_by(table.c.id).limit(batch_size))]
+                if not ids:
+                    break
+                last_id = ids[-1]
+                count += self.index_ids(conn, ids)
+        print_info(f"全文索引重建完成: {count}")
+        return count
+
+    def _query(self, dialect: str, words: list) -> str:
+        """把检索词转换为各数据库的全文查询语法, 多个词为OR"""
+        if dialect == "sqlite":
+            return " OR ".join('"' + " ".join(tokenize(w)) + '"' for w in words)
+        if dialect == "postgresql":
+            return " | ".join("(" + " <-> ".join(tokenize(w)) + ")" for w in words)
+        return " ".join('"' + w.replace('"', " ") + '"' for w in words)
+
+    def _match_sql(self, dialect: str, rank: bool = False) -> str:
+        if dialect == "sqlite":
+            where, score = f"{SEARCH_TABLE} MATCH :fts_kw", f"-bm25({SEARCH_TABLE}, 0, 10.0, 5.0, 1.0)"
+        elif dialect == "postgresql":
+            where, score = "tsv @@ to_tsquery('simple', :fts_kw)", "ts_rank(tsv, to_tsquery('simple', :fts_kw))"
+        else:
+            where = score = "MATCH(title, description, content) AGAINST (:fts_kw IN BOOLEAN MODE)"
+        if rank:
+            return f"SELECT id, {score} AS score FROM {SEARCH_TABLE} WHERE {where}"
+        return f"SELECT id FROM {SEARCH_TABLE} WHERE {where}"
+
+    def _split(self, keyword: str) -> tuple:
+        """分出可用全文索引的词和只能模糊匹配的词(单个汉字无法命中二元组)"""
+        words, like_words = [], []
+        for w in split_keyword(keyword):
+            tokens = tokenize(w)
+            if not tokens or (len(tokens) == 1 and len(tokens[0]) == 1 and _CJK_RE.match(tokens[0])):
+                like_words.append(w)
+            else:
+                words.append(w)
+        return words, like_words
+
+    def match(self, keyword: str, model=None):
+        """返回全文检索过滤条件, 不可用时返回None"""
+        model = model or Article
+        if not keyword or not self.ready():
+            return None
+        words, like_words = self._split(keyword)
+        if not words:
+            return None
+        dialect = self._db().get_engine().dialect.name
+        sub = text(self._match_sql(dialect)).bindparams(fts_kw=self._query(dialect, words)).columns(column("id", String))
+        return or_(model.id.in_(sub), *[model.title.like(f"%{w}%") for w in like_words])
+
+    def scores(self, keyword: str):
+        """关键词的相关度子查询(id, score), 分数越大越相关, 不可用时返回None"""
+        if not keyword or not self.ready():
+            return None
+        words, _ = self._split(keyword)
+        if not words:
+            return None
+        dialect = self._db().get_engine().dialect.name
+        return (text(self._match_sql(dialect, rank=True)).bindparams(fts_kw=self._query(dialect, words))
+                .columns(column("id", String), column("score", Float)).subquery("fts_scores"))
+
+    def order_by_rank(self, query, keyword: str, model=None):
+        """按相关度排序(相同时按发布时间倒序), 全文索引不可用时返回None
+
+        只靠模糊匹配命中的文章没有分数, 排在全文命中的文章之后
+        """
+        model = model or Article
+        scores = self.scores(keyword)
+        if scores is None:
+            return None
+        return (query.outerjoin(scores, scores.c.id == model.id)
+                .order_by(func.coalesce(scores.c.score, 0).desc(), model.publish_time.desc(), model.id.desc()))
+
+FTS = ArticleSearch()
+
+_INDEXED_FIELDS = ("title", "description", "content_hash")
+
+def _changed(obj) -> bool:
+    state = inspect(obj)
+    return any(name in state.attrs and state.attrs[name].history.has_changes() for name in _INDEXED_FIELDS)
+
+@event.listens_for(Session, "after_flush")
+def _index_after_flush(session, flush_context):
+    # ORM写入文章后增量更新索引, 批量写入在 Db.add_articles_bulk 中处理
+    if not FTS.enabled:
+        return
+    ids, removed = set(), set()
+    for obj in session.new:
+        if isinstance(obj, (ArticleBase, ArticleContent)):
+            ids.add(obj.id)
+    for obj in session.dirty:
+        if isinstance(obj, ArticleContent) or (isinstance(obj, ArticleBase) and _changed(obj)):
+            ids.add(obj.id)
+    for obj in session.deleted:
+        if isinstance(obj, ArticleBase):
+            removed.add(obj.id)
+    if not ids and not removed:
+        return
+    try:
+        conn = session.connection()
+        FTS.remove(conn, removed - ids)
+        FTS.index_ids(conn, ids)
+    except Exception as e:
+        print_warning(f"更新全文索引失败: {e}")
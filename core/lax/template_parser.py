@@ -1,5 +1,8 @@
 import re
-from typing import Any, Dict, List, Union
+import hashlib
+import threading
+from collections import ChainMap, OrderedDict, namedtuple
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Union
 # """
 # 模板引擎使用示例
 
@@ -8,540 +11,549 @@ from typing import Any, Dict, List, Union
 # 2. 条件判断: {% if condition %}...{% endif %}
 # 3. 循环结构: {% for item in items %}...{% endfor %}
 # """
+
+# 模板先解析为语法树, 再编译为嵌套的闭包, 表达式在编译时预先compile;
+# 编译结果按模板内容的哈希在进程内缓存, webhook、RSS模板等相同模板只编译一次
+
+# Split template into static parts and control blocks
+_TOKEN_RE = re.compile(
+    r'(\{\%.*?\%\})|'  # control blocks {% ... %}
+    r'(\{\{.*?\}\})'    # variables {{ ... }}
+)
+
+_SAFE_BUILTINS = {
+    'None': None,
+    'True': True,
+    'False': False,
+    'bool': bool,
+    'int': int,
+    'float': float,
+    'str': str,
+    'list': list,
+    'dict': dict,
+    'tuple': tuple,
+    'len': len,
+    'sum': sum,
+    'min': min,
+    'max': max,
+    'abs': abs,
+    'round': round
+}
+
+_FORBIDDEN = [
+    'import', 'open', 'exec', 'eval', 'system', 'subprocess',
+    '__import__', 'getattr', 'setattr', 'delattr', 'compile',
+    'globals', 'locals', 'vars', 'dir', 'help', 'reload',
+    'input', 'file', 'execfile', 'reload', 'exit', 'quit'
+]
+
+def is_safe_expression(expr: str) -> bool:
+    """Check if an expression contains potentially dangerous operations."""
+    expr_lower = expr.lower()
+    return not any(keyword in expr_lower for keyword in _FORBIDDEN)
+
+def clean_output(output: str) -> str:
+    """Clean up the final output by removing excessive newlines and whitespace."""
+    lines = output.split('\n')
+    cleaned = []
+    prev_line_empty = False
+
+    for line in lines:
+        stripped = line.strip()
+
+        # Skip empty lines between list items
+        if not stripped and cleaned and cleaned[-1].strip().startswith('-'):
+            continue
+
+        # Skip consecutive empty lines
+        if not stripped and prev_line_empty:
+            continue
+
+        cleaned.append(line)
+        prev_line_empty = not stripped
+
+    # Ensure exactly one newline at end
+    return '\n'.join(cleaned).strip()
+
+class _Cleaner:
+    """Incremental clean_output: feed chunks, the concatenated results equal clean_output of the whole."""
+    __slots__ = ('partial', 'kept', 'last_item', 'prev_line_empty', 'started', 'pending')
+
+    def __init__(self):
+        self.partial = []            # pieces of the current unfinished line
+        self.kept = False            # any line kept yet
+        self.last_item = False       # last kept line is a list item
+        self.prev_line_empty = False
+        self.started = False         # leading whitespace already stripped
+        self.pending = ''            # trailing whitespace held back until more text follows
+
+    def _lines(self, lines: List[str]) -> str:
+        out = []
+        for line in lines:
+            stripped = line.strip()
+            if not stripped and (self.last_item or self.prev_line_empty):
+                continue
+            out.append('\n' + line if self.kept else line)
+            self.kept = True
+            self.last_item = stripped.startswith('-')
+            self.prev_line_empty = not stripped
+        return ''.join(out)
+
+    def _emit(self, text: str) -> str:
+        if not self.started:
+            text = text.lstrip()
+            if not text:
+                return ''
+            self.started = True
+        body = text.rstrip()
+        if not body:
+            self.pending += text
+            return ''
+        text, self.pending = self.pending + body, text[len(body):]
+        return text
+
+    def feed(self, chunk: str) -> str:
+        if '\n' not in chunk:
+            self.partial.append(chunk)
+            return ''
+        lines = chunk.split('\n')
+        if self.partial:
+            self.partial.append(lines[0])
+            lines[0] = ''.join(self.partial)
+        self.partial = [lines.pop()]
+        return self._emit(self._lines(lines))
+
+    def close(self) -> str:
+        return self._emit(self._lines([''.join(self.partial)]))
+
+def clean_chunks(chunks: Iterable[str]) -> Iterator[str]:
+    """Apply clean_output to a stream of chunks without joining them."""
+    cleaner = _Cleaner()
+    for chunk in chunks:
+        if chunk:
+            text = cleaner.feed(chunk)
+            if text:
+                yield text
+    text = cleaner.close()
+    if text:
+        yield text
+
+# render返回完整字符串, stream逐段返回(循环的每次迭代、每个变量各为一段), 输出拼接后与render相同
+Program = namedtuple('Program', ['render', 'stream'])
+
+class _Env:
+    """Per-render evaluation globals (builtins plus registered functions)."""
+    __slots__ = ('eval_globals', 'safe_globals', 'functions')
+
+    def __init__(self, functions: Dict[str, callable]):
+        self.eval_globals = {**_SAFE_BUILTINS, **functions}
+        self.safe_globals = dict(_SAFE_BUILTINS)
+        self.functions = functions
+
+def _compile_code(expr: str, mode: str = 'eval'):
+    """Precompile an expression, returning (code, error message)."""
+    try:
+        # eval() strips leading spaces and tabs of string input, compile() does not
+        return compile(expr.lstrip(' \t') if mode == 'eval' else expr, '<string>', mode), None
+    except Exception as e:
+        return None, str(e)
+
+def _lookup_path(scope, path: List[str], missing):
+    """Resolve a dotted name (dict keys or attributes), None stops the lookup."""
+    current = scope.get(path[0], {})
+    for name in path[1:]:
+        if isinstance(current, dict):
+            current = current.get(name, missing)
+        else:
+            current = getattr(current, name, missing)
+        if current is None:
+            return None
+    return current
+
+def _compile_var(expr: str) -> Callable:
+    """Compile a {{ ... }} expression."""
+    if expr.startswith('='):
+        # Evaluate the expression (after =)
+        source = expr[1:]
+        if not is_safe_expression(source):
+            message = '[Error: Potentially dangerous expression detected]'
+            return lambda scope, env: message
+        code, error = _compile_code(source)
+        if code is None:
+            message = f'[Error: {error}]'
+            return lambda scope, env: message
+
+        def render_eval(scope, env):
+            try:
+                return str(eval(code, env.eval_globals, scope))
+            except Exception as e:
+                return f'[Error: {str(e)}]'
+        return render_eval
+    if '.' in expr:
+        # Handle nested attribute access
+        path = expr.split('.')
+
+        def render_path(scope, env):
+            current = _lookup_path(scope, path, '')
+            return '' if current is None else str(current)
+        return render_path
+    # Simple variable access
+    return lambda scope, env: str(scope.get(expr, ''))
+
+def _merge(scope, updated: dict, env) -> None:
+    """Merge variables created by a condition code block into the scope."""
+    for k, v in updated.items():
+        if not k.startswith('__') and k not in env.functions:
+            if k not in scope or scope[k] != v:
+                scope[k] = v
+
+def _compile_condition(condition: str) -> Callable:
+    """Compile an {% if ... %} condition into a function returning bool."""
+    never = lambda scope, env: False
+    if not is_safe_expression(condition):
+        return never
+
+    # Special handling for loop variables
+    if 'loop.' in condition:
+        has_not = 'not ' in condition
+        loop_var = condition.split('loop.')[-1].strip()
+        if has_not:
+            loop_var = loop_var.replace('not ', '').strip()
+        if loop_var not in ('last', 'first', 'index', 'index0'):
+            return (lambda scope, env: True) if has_not else never
+        default = False if loop_var in ('last', 'first') else 0
+
+        def loop_condition(scope, env):
+            try:
+                result = bool(scope.get('loop', {}).get(loop_var, default))
+            except Exception:
+                return False
+            return not result if has_not else result
+        return loop_condition
+
+    # Multi-line code blocks, the result is read from __result__
+    if '\n' in condition.strip():
+        code, _ = _compile_code(condition, 'exec')
+        if code is None:
+            return never
+
+        def block_condition(scope, env):
+            local_vars = ChainMap({}, scope)
+            try:
+                exec(code, env.eval_globals, local_vars)
+                result = bool(local_vars.get('__result__', False))
+            except Exception:
+                return False
+            _merge(scope, local_vars.maps[0], env)
+            return result
+        return block_condition
+
+    # Function calls with = prefix
+    if condition.startswith('='):
+        code, _ = _compile_code(condition[1:])
+        if code is None:
+            return never
+
+        def eval_condition(scope, env):
+            try:
+                return bool(eval(code, env.eval_globals, scope))
+            except Exception:
+                return False
+        return eval_condition
+
+    # Nested attribute access (e.g. user.is_admin)
+    if '.' in condition:
+        path = condition.split('.')
+
+        def path_condition(scope, env):
+            try:
+                return bool(_lookup_path(scope, path, None))
+            except Exception:
+                return False
+        return path_condition
+
+    # Direct variable reference, other expressions are evaluated
+    code, _ = _compile_code(condition)
+
+    def name_condition(scope, env):
+        try:
+            if condition in scope:
+                return bool(scope[condition])
+            return code is not None and bool(eval(code, env.eval_globals, scope))
+        except Exception:
+            return False
+    return name_condition
+
+def _compile_if(condition: str, body: Program, otherwise: Program) -> Program:
+    test = _compile_condition(condition)
+
+    def render_if(scope, env):
+        if test(scope, env):
+            return clean_output(body.render(scope, env))
+        if otherwise is not None:
+            return clean_output(otherwise.render(scope, env))
+        return ''
+
+    def stream_if(scope, env):
+        if test(scope, env):
+            return clean_chunks(body.stream(scope, env))
+        if otherwise is not None:
+            return clean_chunks(otherwise.stream(scope, env))
+        return ()
+    return Program(render_if, stream_if)
+
+def _compile_for(loop_var: str, iterable: str, body: Program) -> Program:
+    code, _ = _compile_code(iterable) if is_safe_expression(iterable) else (None, None)
+
+    def get_items(scope, env):
+        if iterable in scope:
+            return scope[iterable]
+        if code is None:
+            return []
+        try:
+            return eval(code, env.safe_globals, scope)
+        except Exception:
+            return []
+
+    def iter_scopes(scope, env):
+        items = get_items(scope, env)
+        total_items = len(items)
+        parent = scope.get('loop')
+        # 每次迭代只创建一层新的作用域, 不复制整个上下文
+        for item_idx, item in enumerate(items):
+            yield ChainMap({loop_var: item, 'loop': {
+                'index': item_idx + 1,
+                'index0': item_idx,
+                'first': item_idx == 0,
+                'last': item_idx == total_items - 1,
+                'length': total_items,
+                'parentloop': parent
+            }}, scope)
+
+    def render_for(scope, env):
+        return '\n'.join([body.render(item_scope, env) for item_scope in iter_scopes(scope, env)])
+
+    def stream_for(scope, env):
+        first = True
+        for item_scope in iter_scopes(scope, env):
+            if not first:
+                yield '\n'
+            first = False
+            yield from body.stream(item_scope, env)
+    return Program(render_for, stream_for)
+
+def _compile_nodes(nodes: list) -> Program:
+    """Compile a node list, adjacent static text is merged."""
+    parts = []
+    for node in nodes:
+        kind = node[0]
+        if kind == 'text':
+            if parts and isinstance(parts[-1], str):
+                parts[-1] += node[1]
+            else:
+                parts.append(node[1])
+        elif kind == 'var':
+            render = _compile_var(node[1])
+            parts.append(Program(render, lambda scope, env, render=render: (render(scope, env),)))
+        elif kind == 'if':
+            parts.append(_compile_if(node[1], _compile_nodes(node[2]), _compile_nodes(node[3]) if node[3] is not None else None))
+        elif kind == 'for':
+            parts.append(_compile_for(node[1], node[2], _compile_nodes(node[3])))
+    if not parts:
+        return Program(lambda scope, env: '', lambda scope, env: ())
+    if len(parts) == 1 and isinstance(parts[0], str):
+        text = parts[0]
+        return Program(lambda scope, env: text, lambda scope, env: (text,))
+    if len(parts) == 1:
+        return parts[0]
+    renders = [part if isinstance(part, str) else part.render for part in parts]
+    streams = [part if isinstance(part, str) else part.stream for part in parts]
+
+    def render_nodes(scope, env):
+        return ''.join([part if part.__class__ is str else part(scope, env) for part in renders])
+
+    def stream_nodes(scope, env):
+        for part in streams:
+            if part.__class__ is str:
+                yield part
+            else:
+                yield from part(scope, env)
+    return Program(render_nodes, stream_nodes)
+
+def parse_tokens(tokens: List[Union[str, None]]) -> list:
+    """Parse split template parts into a node tree.
+
+    Nodes: ('text', s), ('var', expr), ('if', condition, body, else_body), ('for', var, iterable, body).
+    An unclosed if is dropped (its contents stay in place), an unclosed for runs to the end.
+    """
+    root = []
+    # frame: [kind, node, current children]
+    stack = [['root', None, root]]
+
+    def close(frame):
+        kind, node, _ = frame
+        parent = stack[-1][2]
+        if kind == 'if_open':
+            # Unclosed if: keep its contents without the condition
+            parent.extend(node[2])
+            if node[3] is not None:
+                parent.extend(node[3])
+        else:
+            parent.append(node)
+
+    def end(kind):
+        if not any(frame[0] == kind for frame in stack):
+            return
+        while True:
+            frame = stack.pop()
+            if frame[0] == kind:
+                node = frame[1]
+                stack[-1][2].append(('if', *node[1:]) if kind == 'if_open' else node)
+                return
+            close(frame)
+
+    for part in tokens:
+        if part is None:
+            continue
+        if part.startswith('{{') and part.endswith('}}'):
+            stack[-1][2].append(('var', part[2:-2].strip()))
+        elif part.startswith('{%') and part.endswith('%}'):
+            block = part[2:-2].strip()
+            if block.startswith('if '):
+                node = ['if', block[3:].strip(), [], None]
+                stack.append(['if_open', node, node[2]])
+            elif block.startswith('for ') and ' in ' in block:
+                loop_var, iterable = block[4:].split(' in ', 1)
+                node = ('for', loop_var.strip(), iterable.strip(), [])
+                stack.append(['for', node, node[3]])
+            elif block == 'else':
+                frame = stack[-1]
+                if frame[0] == 'if_open' and frame[1][3] is None:
+                    frame[1][3] = []
+                    frame[2] = frame[1][3]
+            elif block == 'endif':
+                end('if_open')
+            elif block == 'endfor':
+                end('for')
+        else:
+            stack[-1][2].append(('text', part))
+    while len(stack) > 1:
+        close(stack.pop())
+    return root
+
+def compile_tokens(tokens: List[Union[str, None]]) -> Program:
+    """Compile split template parts into a Program of render(scope, env) -> str and stream(scope, env) -> chunks."""
+    return _compile_nodes(parse_tokens(tokens))
+
+_CACHE = OrderedDict()
+_CACHE_LOCK = threading.Lock()
+_CACHE_SIZE = 256
+
+def load_template(template: str) -> Program:
+    """Compiled Program of a template, cached process-wide by template hash."""
+    key = hashlib.sha1(template.encode('utf-8')).hexdigest()
+    with _CACHE_LOCK:
+        program = _CACHE.get(key)
+        if program is not None:
+            _CACHE.move_to_end(key)
+            return program
+    program = compile_tokens(_TOKEN_RE.split(template))
+    with _CACHE_LOCK:
+        _CACHE[key] = program
+        while len(_CACHE) > _CACHE_SIZE:
+            _CACHE.popitem(last=False)
+    return program
+
 class TemplateParser:
     """A lightweight template engine supporting variables, conditions and loops."""
-    
+
     def __init__(self, template: str):
         """Initialize the template parser with a template string."""
         self.template = template
         self.compiled = None
         self.custom_functions = {}
-        
+
     def register_function(self, name: str, func: callable) -> None:
         """
         Register a custom function to be available in template expressions.
-        
+
         Args:
             name: The name to use in templates
             func: The function to register
         """
         self.custom_functions[name] = func
-        
+
     def register_functions(self, functions: Dict[str, callable]) -> None:
         """
         Register multiple custom functions at once.
-        
+
         Args:
             functions: Dictionary of function names to functions
         """
         self.custom_functions.update(functions)
 
     def compile_template(self) -> None:
-        """Compile the template into an intermediate representation."""
-        # Split template into static parts and control blocks
-        pattern = re.compile(
-            r'(\{\%.*?\%\})|'  # control blocks {% ... %}
-            r'(\{\{.*?\}\})'    # variables {{ ... }}
-        )
-        self.compiled = pattern.split(self.template)
-        
+        """Compile the template into a Program (shared by all parsers of the same template)."""
+        self.compiled = load_template(self.template)
+
+    def _prepare(self, context: Dict[str, Any]) -> Program:
+        # Security check: validate context keys
+        for key in context.keys():
+            if not isinstance(key, str) or not key.isidentifier():
+                raise ValueError(f"Invalid context key: {key}. Keys must be valid Python identifiers")
+
+        if self.compiled is None:
+            self.compile_template()
+        elif not isinstance(self.compiled, Program):
+            # compiled was set to a list of template parts
+            self.compiled = compile_tokens(self.compiled)
+        return self.compiled
+
     def render(self, context: Dict[str, Any]) -> str:
         """
         Render the template with the given context.
-        
+
         Args:
             context: A dictionary containing variables for template rendering
-            
+
         Returns:
             The rendered template as a string
         """
-        # Security check: validate context keys
-        for key in context.keys():
-            if not isinstance(key, str) or not key.isidentifier():
-                raise ValueError(f"Invalid context key: {key}. Keys must be valid Python identifiers")
-        
-        if self.compiled is None:
-            print("Compiling template...")
-            self.compile_template()
-            
-        output = []
-        i = 0
-        while i < len(self.compiled):
-            part = self.compiled[i]
-            
-            if part is None:
-                i += 1
-                continue
-                
-            # Handle variables {{ var }} and nested {{ var.attr }} and eval expressions
-            if part.startswith('{{') and part.endswith('}}'):
-                # print(f"\nProcessing variable part: {part}")
-                var_expr = part[2:-2].strip()
-                # print(f"Extracted expression: {var_expr}")
-                
-                # Check if this is an eval expression (starts with =)
-                if var_expr.startswith('='):
-                    try:
-                        # Evaluate the expression (after =)
-                        expr = var_expr[1:]
-                        if not self._is_safe_expression(expr):
-                            raise ValueError("Potentially dangerous expression detected")
-                            
-                        # Create safe evaluation environment
-                        safe_globals = self._get_safe_globals()
-                        eval_globals = {**safe_globals, **self.custom_functions}
-                        
-                        result = eval(expr, eval_globals, context)
-                        output.append(str(result))
-                    except Exception as e:
-                        output.append(f'[Error: {str(e)}]')
-                elif '.' in var_expr:
-                    # print(f"DEBUG - Processing nested variable: {var_expr}")  # Debug
-                    # Handle nested attribute access
-                    parts = var_expr.split('.')
-                    current = context.get(parts[0], {})
-                    for part_name in parts[1:]:
-                        if isinstance(current, dict):
-                            current = current.get(part_name, '')
-                        else:
-                            current = getattr(current, part_name, '')
-                        if current is None:
-                            current = ''
-                            break
-                    output.append(str(current))
-                else:
-                    # Simple variable access
-                    output.append(str(context.get(var_expr, '')))
-                i += 1
-                
-            # Handle control blocks {% ... %}
-            elif part.startswith('{%') and part.endswith('%}'):
-                block = part[2:-2].strip()
-                
-                # Handle if condition
-                if block.startswith('if '):
-                    condition = block[3:].strip()
-                    result, updated_context = self._evaluate_condition(condition, context)
-                    # Merge all variables except special ones and functions
-                    for k, v in updated_context.items():
-                        if not k.startswith('__') and k not in self.custom_functions:
-                            # Only update context if the key doesn't exist or was modified
-                            if k not in context or context[k] != v:
-                                context[k] = v
-                    # Ensure final_price is available in context if it was calculated
-                    if 'final_price' in updated_context:
-                        context['final_price'] = updated_context['final_price']
-                    
-                    # Find matching endif using helper method
-                    endif_idx = self._skip_control_block(i, 'if', 'endif')
-                    if endif_idx == len(self.compiled):
-                        i += 1
-                        continue
-                    
-                    # Find else if exists
-                    else_idx = -1
-                    for j in range(i+1, endif_idx):
-                        part = self.compiled[j]
-                        if isinstance(part, str) and part.strip() in ('{% else %}', 'else'):
-                            else_idx = j
-                            break
-                    
-                    # print(f"DEBUG - Control block boundaries: else={else_idx}, endif={endif_idx}")
-                    
-                    # Process the appropriate block
-                    if result:
-                        # Process if block (from current position to else or endif)
-                        end_idx = else_idx if else_idx != -1 else endif_idx
-                        if_content = self.compiled[i+1:end_idx]
-                        # print(f"DEBUG - Processing if block from {i+1} to {end_idx}")
-                        
-                        if_parser = TemplateParser('')
-                        if_parser.compiled = if_content
-                        rendered = if_parser.render(context)
-                        output.append(rendered)
-                    elif else_idx != -1:
-                        # Process else block
-                        else_content = self.compiled[else_idx+1:endif_idx]
-                        # print(f"DEBUG - Processing else block from {else_idx+1} to {endif_idx}")
-                        
-                        else_parser = TemplateParser('')
-                        else_parser.compiled = else_content
-                        rendered = else_parser.render(context)
-                        output.append(rendered)
-                    
-                    # Skip to after endif
-                    i = endif_idx + 1
-                    
-                # Handle for loop
-                elif block.startswith('for ') and ' in ' in block:
-                    loop_var, iterable = self._parse_for_block(block)
-                    items = self._get_iterable(iterable, context)
-                    
-                    # Collect loop content
-                    loop_content = []
-                    j = i + 1
-                    while j < len(self.compiled):
-                        inner_part = self.compiled[j]
-                        if (isinstance(inner_part, str) and 
-                            inner_part.startswith('{% endfor %}')):
-                            break
-                        loop_content.append(str(inner_part) if inner_part else '')
-                        j += 1
-                        
-                    # Render loop
-                    # print(f"DEBUG - For loop items: {items}")  # Debug
-                    loop_output = []
-                    total_items = len(items)
-                    for item_idx, item in enumerate(items):
-                        loop_context = context.copy()
-                        loop_context[loop_var] = item
-                        
-                        # Add loop variable with iteration info
-                        loop_context['loop'] = {
-                            'index': item_idx + 1,
-                            'index0': item_idx,
-                            'first': item_idx == 0,
-                            'last': item_idx == total_items - 1,
-                            'length': total_items,
-                            'parentloop': context.get('loop')  # Save parent loop context
-                        }
-                        
-                        # Render loop content with current item
-                        item_output = []
-                        j = 0
-                        while j < len(loop_content):
-                            part = loop_content[j]
-                            if part is None:
-                                j += 1
-                                continue
-                            
-                            # Handle if conditions inside for loop
-                            if (isinstance(part, str) and 
-                                part.startswith('{% if ') and 
-                                part.endswith('%}')):
-                                condition = part[6:-2].strip()
-                                result, _ = self._evaluate_condition(condition, loop_context)
-                                
-                                # Find matching endif
-                                endif_idx = j + 1
-                                nested_depth = 1
-                                while endif_idx < len(loop_content):
-                                    inner_part = loop_content[endif_idx]
-                                    if (isinstance(inner_part, str) and 
-                                        inner_part.startswith('{% if ') and 
-                                        inner_part.endswith('%}')):
-                                        nested_depth += 1
-                                    elif (isinstance(inner_part, str) and 
-                                          inner_part.startswith('{% endif %}')):
-                                        nested_depth -= 1
-                                        if nested_depth == 0:
-                                            break
-                                    endif_idx += 1
-                                
-                                # Process if block if condition is true
-                                if result:
-                                    if_content = loop_content[j+1:endif_idx]
-                                    rendered = self._render_parts(if_content, loop_context)
-                                    item_output.append(rendered)
-                                
-                                # Skip to after endif
-                                j = endif_idx + 1
-                            
-                            # Handle variable references
-                            elif isinstance(part, str) and part.startswith('{{') and part.endswith('}}'):
-                                var_expr = part[2:-2].strip()
-                                # print(f"DEBUG - Evaluating variable: {var_expr}")  # Debug
-                            
-                                if var_expr.startswith('='):
-                                    # Handle eval expressions
-                                    try:
-                                        expr = var_expr[1:]
-                                        if not self._is_safe_expression(expr):
-                                            raise ValueError("Potentially dangerous expression detected")
-                                        
-                                        safe_globals = self._get_safe_globals()
-                                        eval_globals = {**safe_globals, **self.custom_functions}
-                                    
-                                        result = eval(expr, eval_globals, loop_context)
-                                        value = str(result)
-                                    except Exception as e:
-                                        value = f'[Error: {str(e)}]'
-                                elif '.' in var_expr:
-                                    # Handle nested attributes
-                                    parts = var_expr.split('.')
-                                    current = loop_context.get(parts[0], {})
-                                    for part_name in parts[1:]:
-                                        if isinstance(current, dict):
-                                            current = current.get(part_name, '')
-                                        else:
-                                            current = getattr(current, part_name, '')
-                                        if current is None:
-                                            current = ''
-                                            break
-                                    value = str(current)
-                                else:
-                                    # Handle simple variable
-                                    value = str(loop_context.get(var_expr, ''))
-                            
-                                # print(f"DEBUG - Variable value: {value}")  # Debug
-                                item_output.append(value)
-                                j += 1
-                            
-                            else:
-                                # Handle literal text (preserve whitespace and newlines)
-                                item_output.append(str(part))
-                                j += 1
-                        
-                        rendered_item = ''.join(item_output)
-                        # print(f"DEBUG - Rendered item {item_idx}:\n{repr(rendered_item)}")  # Debug
-                        loop_output.append(rendered_item)
-                    
-                    if loop_output:
-                        # Join all loop items with newlines and add to output
-                        loop_result = '\n'.join(loop_output)
-                        output.append(loop_result)
-                    else:
-                        # print("DEBUG - No loop output generated")
-                        pass
-                    
-                    # Skip to end of loop
-                    i = j + 1
-                    
-                # Handle endif/endfor
-                elif block in ('endif', 'endfor'):
-                    i += 1
-                    
-                else:
-                    i += 1
-                    
-            # Static text
-            else:
-                output.append(str(part) if part else '')
-                i += 1
-                
-        # Clean up the output by removing excessive newlines
-        result = ''.join(output)
+        result = self._prepare(context).render(context, _Env(self.custom_functions))
         return self._clean_output(result)
-    
+
+    def render_iter(self, context: Dict[str, Any]) -> Iterator[str]:
+        """
+        Render the template chunk by chunk, whitespace is cleaned incrementally.
+
+        ''.join(render_iter(context)) equals render(context), but the full output
+        is never held in memory (at most one loop iteration / variable at a time).
+
+        Args:
+            context: A dictionary containing variables for template rendering
+
+        Returns:
+            An iterator over the rendered chunks
+        """
+        program = self._prepare(context)
+        return clean_chunks(program.stream(context, _Env(self.custom_functions)))
+
     def _get_safe_globals(self) -> Dict[str, Any]:
         """Return a dictionary of safe builtins for eval/exec."""
-        safe_builtins = {
-            'None': None,
-            'True': True,
-            'False': False,
-            'bool': bool,
-            'int': int,
-            'float': float,
-            'str': str,
-            'list': list,
-            'dict': dict,
-            'tuple': tuple,
-            'len': len,
-            'sum': sum,
-            'min': min,
-            'max': max,
-            'abs': abs,
-            'round': round
-        }
-        return safe_builtins
+        return dict(_SAFE_BUILTINS)
 
     def _is_safe_expression(self, expr: str) -> bool:
         """Check if an expression contains potentially dangerous operations."""
-        forbidden = [
-            'import', 'open', 'exec', 'eval', 'system', 'subprocess',
-            '__import__', 'getattr', 'setattr', 'delattr', 'compile',
-            'globals', 'locals', 'vars', 'dir', 'help', 'reload',
-            'input', 'file', 'execfile', 'reload', 'exit', 'quit'
-        ]
-        expr_lower = expr.lower()
-        return not any(keyword in expr_lower for keyword in forbidden)
-
-    def _evaluate_condition(self, condition: str, context: Dict[str, Any]) -> tuple:
-        """
-        Evaluate a condition expression or code block in the given context.
-        Returns (result, updated_context) where updated_context contains any new variables
-        created during evaluation.
-        """
-        try:
-            if not self._is_safe_expression(condition):
-                raise ValueError(f"Potentially dangerous expression: {condition}")
-                
-            # Special handling for loop variables
-            if 'loop.' in condition:
-                # Handle not conditions
-                has_not = 'not ' in condition
-                loop_var = condition.split('loop.')[-1].strip()
-                if has_not:
-                    loop_var = loop_var.replace('not ', '').strip()
-                
-                loop_info = context.get('loop', {})
-                result = False
-                
-                if loop_var == 'last':
-                    result = loop_info.get('last', False)
-                elif loop_var == 'first':
-                    result = loop_info.get('first', False)
-                elif loop_var == 'index':
-                    result = bool(loop_info.get('index', 0))
-                elif loop_var == 'index0':
-                    result = bool(loop_info.get('index0', 0))
-                
-                # Invert result if 'not' was present
-                return (not result if has_not else result), context
-                    
-            # Create safe evaluation environment
-            safe_globals = self._get_safe_globals()
-            eval_globals = {**safe_globals, **self.custom_functions}
-            
-            # Make a copy of context to avoid modifying the original
-            local_vars = context.copy()
-            
-            # Handle multi-line code blocks
-            if '\n' in condition.strip():
-                # Compile and execute the code block in restricted environment
-                code = compile(condition, '<string>', 'exec')
-                exec(code, eval_globals, local_vars)
-                # The last expression's value should be in __result__
-                result = bool(local_vars.get('__result__', False))
-                # Return result and updated context (excluding special vars)
-                updated_context = {k: v for k, v in local_vars.items() 
-                                 if not k.startswith('__') and k not in self.custom_functions}
-                
-                # Debug output
-                print(f"DEBUG - Condition evaluation result: {result}")
-                print(f"DEBUG - Local vars after execution: {local_vars.keys()}")
-                print(f"DEBUG - Updated context to return: {updated_context.keys()}")
-                
-                # Ensure all calculated variables are included
-                for k, v in local_vars.items():
-                    if (not k.startswith('__') and 
-                        k not in self.custom_functions and 
-                        k not in updated_context):
-                        updated_context[k] = v
-                        print(f"DEBUG - Added {k} to context: {v}")
-                
-                return result, updated_context
-            
-            # Handle function calls with = prefix
-            if condition.startswith('='):
-                result = bool(eval(condition[1:], eval_globals, local_vars))
-                return result, local_vars
-            
-            # Handle nested attribute access (e.g. user.is_admin)
-            if '.' in condition:
-                parts = condition.split('.')
-                current = local_vars.get(parts[0], {})
-                for part in parts[1:]:
-                    if isinstance(current, dict):
-                        current = current.get(part, None)
-                    else:
-                        current = getattr(current, part, None)
-                    if current is None:
-                        return False, local_vars
-                # Handle empty collections
-                if isinstance(current, (list, dict, set)) and not current:
-                    return False, local_vars
-                return bool(current), local_vars
-            
-            # Handle direct variable reference
-            if condition in local_vars:
-                value = local_vars[condition]
-                if isinstance(value, (list, dict, set)):
-                    return len(value) > 0, local_vars
-                return bool(value), local_vars
-                
-            # Evaluate other expressions
-            result = bool(eval(condition, eval_globals, local_vars))
-            return result, local_vars
-            
-        except Exception:
-            return False, context
-            
-    def _skip_control_block(self, start_idx: int, start_tag: str, end_tag: str) -> int:
-        """Skip a control block until matching end tag is found."""
-        if start_idx >= len(self.compiled):
-            return len(self.compiled)
-            
-        depth = 1
-        i = start_idx + 1
-        # print(f"DEBUG - Searching for {end_tag} starting from {start_idx}")
-        
-        while i < len(self.compiled):
-            part = self.compiled[i]
-            if isinstance(part, str) and part.startswith('{%') and part.endswith('%}'):
-                block = part[2:-2].strip()
-                # print(f"DEBUG - Token {i}: {block} (depth={depth})")
-                
-                # Handle nested blocks
-                if block.startswith('if ') or block.startswith('for '):
-                    depth += 1
-                    # print(f"DEBUG - Found nested block, depth increased to {depth}")
-                elif block == end_tag:
-                    depth -= 1
-                    # print(f"DEBUG - Found {end_tag}, depth decreased to {depth}")
-                    if depth == 0:
-                        # print(f"DEBUG - Found matching {end_tag} at {i}")
-                        return i
-                elif block == 'else' and depth == 1:
-                    # print(f"DEBUG - Found else at {i}")
-                    # Don't decrease depth for else blocks
-                    pass
-                elif block in ['endif', 'endfor'] and depth > 1:
-                    depth -= 1
-                    # print(f"DEBUG - Found closing tag in nested block, depth decreased to {depth}")
-            
-            i += 1
-        
-        # print(f"DEBUG - Error: Reached end without finding matching {end_tag} (current depth: {depth})")
-        # print(f"DEBUG - Last processed block: {self.compiled[i-1] if i > 0 else 'None'}")
-        return len(self.compiled)
+        return is_safe_expression(expr)
 
     def _clean_output(self, output: str) -> str:
         """Clean up the final output by removing excessive newlines and whitespace."""
-        lines = output.split('\n')
-        cleaned = []
-        prev_line_empty = False
-        
-        for line in lines:
-            stripped = line.strip()
-            
-            # Skip empty lines between list items
-            if not stripped and cleaned and cleaned[-1].strip().startswith('-'):
-                continue
-                
-            # Skip consecutive empty lines
-            if not stripped and prev_line_empty:
-                continue
-                
-            cleaned.append(line)
-            prev_line_empty = not stripped
-            
-        # Ensure exactly one newline at end
-        return '\n'.join(cleaned).strip() 
-        
+        return clean_output(output)
+
     def _parse_for_block(self, block: str) -> tuple:
         """Parse a for block into loop variable and iterable parts."""
         parts = block[4:].split(' in ', 1)
         return parts[0].strip(), parts[1].strip()
-        
-    def _get_iterable(self, iterable: str, context: Dict[str, Any]) -> List[Any]:
-        """Get an iterable from context or evaluate expression."""
-        if iterable in context:
-            return context[iterable]
-        try:
-            if not self._is_safe_expression(iterable):
-                raise ValueError("Potentially dangerous expression detected")
-            
-            safe_globals = self._get_safe_globals()
-            return eval(iterable, safe_globals, context)
-        except Exception:
-            return []
-            
-    def _render_parts(self, parts: List[Union[str, None]], context: Dict[str, Any]) -> str:
-        """Render a list of template parts with the given context."""
-        temp_parser = TemplateParser('')
-        temp_parser.compiled = parts
-        return temp_parser.render(context)
 
 
 # Example usage
@@ -0,0 +1,173 @@
+import json
+import threading
+from sqlalchemy import event, inspect, select, delete, insert, func
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+from core.models.tags import Tags, TagFeed
+from core.models.message_task import MessageTask, TaskFeed
+from core.print import print_warning, print_info
+
+# 标签/消息任务包含的公众号
+# tags.mps_id、message_tasks.mps_id 仍保存前端使用的JSON, 写入时同步到 tag_feeds/task_feeds 关联表,
+# 查询时按关联表走索引; 公众号到标签的反向对应关系缓存在内存中, 关联表变化后失效
+
+def parse_mp_ids(mps_id) -> list:
+    """解析mps_id(JSON: [{"id":..}] 或 ["id"]), 返回去重后的公众号ID"""
+    if not mps_id:
+        return []
+    try:
+        items = json.loads(mps_id) if isinstance(mps_id, str) else mps_id
+    except ValueError:
+        return []
+    ids = []
+    for item in items if isinstance(items, list) else []:
+        mp_id = item.get("id") if isinstance(item, dict) else item
+        if mp_id not in (None, "") and str(mp_id) not in ids:
+            ids.append(str(mp_id))
+    return ids
+
+# 所属对象 -> (关联表模型, 关联表中所属对象的字段)
+_LINKS = {Tags: (TagFeed, "tag_id"), MessageTask: (TaskFeed, "task_id")}
+
+class FeedMemberships:
+    """标签/任务与公众号的对应关系, 关联表不存在(未同步模型)时调用方回退到解析JSON"""
+    def __init__(self):
+        self._ready = {}
+        self._lock = threading.Lock()
+        self._version = 0
+        self._tag_feeds = None
+        self._feed_tags = None
+        self._task_feeds = None
+
+    def _engine(self):
+        from core.db import DB
+        return DB.get_engine()
+
+    def ready(self, bind=None) -> bool:
+        """关联表是否可用(按引擎缓存结果), 第一次检查时迁移已有的JSON数据"""
+        bind = bind if bind is not None else self._engine()
+        key = str(bind.engine.url)
+        if key not in self._ready:
+            try:
+                # 传入连接时检查和迁移都在该连接上进行, 不另开连接
+                inspector = inspect(bind)
+                self._ready[key] = inspector.has_table(TagFeed.__tablename__) and inspector.has_table(TaskFeed.__tablename__)
+                if self._ready[key]:
+                    self.migrate(bind)
+            except Exception as e:
+                print_warning(f"检查标签关联表失败: {e}")
+                self._ready[key] = False
+        return self._ready[key]
+
+    def sync(self, conn, owner, owner_id: str, mp_ids: list) -> None:
+        """按mps_id重写一个标签/任务的关联记录"""
+        model, column = _LINKS[owner]
+        conn.execute(delete(model).where(getattr(model, column) == owner_id))
+        if mp_ids:
+            conn.execute(insert(model), [{column: owner_id, "mp_id": mp_id} for mp_id in mp_ids])
+
+    def migrate(self, bind=None) -> int:
+        """关联表为空时从已有的JSON生成, 返回写入的关联数; bind为连接时在其当前事务中写入"""
+        bind = bind if bind is not None else self._engine()
+        if isinstance(bind, Connection):
+            count = self._migrate(bind)
+        else:
+            with bind.begin() as conn:
+                count = self._migrate(conn)
+        if count:
+            print_info(f"已迁移标签/任务关联的公众号: {count}")
+            self.invalidate()
+        return count
+
+    def _migrate(self, conn) -> int:
+        count = 0
+        for owner, (model, column) in _LINKS.items():
+            if conn.execute(select(func.count()).select_from(model)).scalar():
+                continue
+            for owner_id, mps_id in conn.execute(select(owner.id, owner.mps_id)).all():
+                mp_ids = parse_mp_ids(mps_id)
+                self.sync(conn, owner, owner_id, mp_ids)
+                count += len(mp_ids)
+        return count
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._version += 1
+            self._tag_feeds = self._feed_tags = self._task_feeds = None
+
+    def _load(self) -> tuple:
+        with self._lock:
+            if self._tag_feeds is not None:
+                return self._tag_feeds, self._feed_tags, self._task_feeds
+            version = self._version
+        tag_feeds, feed_tags, task_feeds = {}, {}, {}
+        with self._engine().connect() as conn:
+            for tag_id, mp_id in conn.execute(select(TagFeed.tag_id, TagFeed.mp_id)):
+                tag_feeds.setdefault(tag_id, []).append(mp_id)
+                feed_tags.setdefault(mp_id, set()).add(tag_id)
+            for task_id, mp_id in conn.execute(select(TaskFeed.task_id, TaskFeed.mp_id)):
+                task_feeds.setdefault(task_id, []).append(mp_id)
+        with self._lock:
+            # 加载期间关联表有变化时不保存, 下次重新加载
+            if version == self._version:
+                self._tag_feeds, self._feed_tags, self._task_feeds = tag_feeds, feed_tags, task_feeds
+        return tag_feeds, feed_tags, task_feeds
+
+    def tag_feeds(self, tag_id: str):
+        """标签包含的公众号ID, 关联表不可用时返回None"""
+        if not self.ready():
+            return None
+        return list(self._load()[0].get(tag_id, []))
+
+    def task_feeds(self, task_id: str):
+        """任务包含的公众号ID, 关联表不可用时返回None"""
+        if not self.ready():
+            return None
+        return list(self._load()[2].get(task_id, []))
+
+    def feed_tags(self, mp_ids) -> set:
+        """包含这些公众号的标签ID, 关联表不可用时返回None"""
+        if not self.ready():
+            return None
+        feed_tags = self._load()[1]
+        return set().union(*(feed_tags.get(str(mp_id), ()) for mp_id in mp_ids))
+
+MEMBERSHIPS = FeedMemberships()
+
+def tag_mp_ids(tags: Tags) -> list:
+    """标签包含的公众号ID"""
+    mp_ids = MEMBERSHIPS.tag_feeds(tags.id)
+    return mp_ids if mp_ids is not None else parse_mp_ids(tags.mps_id)
+
+def task_mp_ids(task: MessageTask) -> list:
+    """消息任务包含的公众号ID"""
+    mp_ids = MEMBERSHIPS.task_feeds(task.id)
+    return mp_ids if mp_ids is not None else parse_mp_ids(task.mps_id)
+
+@event.listens_for(Session, "after_flush")
+def _sync_memberships(session, flush_context):
+    # ORM写入标签/任务时同步关联表, 提交后清除缓存
+    changed = False
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if type(obj) not in _LINKS:
+            continue
+        deleted = obj in session.deleted
+        if not deleted and obj not in session.new and not inspect(obj).attrs.mps_id.history.has_changes():
+            continue
+        if not MEMBERSHIPS.ready(session.connection()):
+            return
+        MEMBERSHIPS.sync(session.connection(), type(obj), obj.id, [] if deleted else parse_mp_ids(obj.mps_id))
+        changed = True
+    if changed:
+        session.info["memberships_changed"] = True
+        MEMBERSHIPS.invalidate()
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session):
+    if session.info.pop("memberships_changed", False):
+        MEMBERSHIPS.invalidate()
+
+@event.listens_for(Session, "after_rollback")
+def _invalidate_after_rollback(session):
+    if session.info.pop("memberships_changed", False):
+        MEMBERSHIPS.invalidate()
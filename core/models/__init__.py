@@ -5,8 +5,14 @@ from .feed import Feed
 # 导入用户模型
 from .user import User
 # 导入消息任务模型
-from .message_task import MessageTask
+from .message_task import MessageTask,TaskFeed
+# 导入标签模型
+from .tags import Tags,TagFeed
+# 导入文章统计模型
+from .article_stats import ArticleStats
 # 导入配置管理模型
 from .config_management import ConfigManagement
+# 导入WebSub订阅模型
+from .websub import WebSubSubscription
 # 导入基础模型
 from .base import *
\ No newline at end of file
@@ -1,4 +1,8 @@
-from  .base import Base,Column,String,Integer,DateTime,Text,DATA_STATUS
+from  .base import Base,Column,String,Integer,DateTime,Text,Blob,DATA_STATUS
+from sqlalchemy import Index,event
+from sqlalchemy.orm import relationship,foreign
+from sqlalchemy.ext.hybrid import hybrid_property
+from core.common.compress import compress_text,decompress_text,content_hash
 class ArticleBase(Base):
     from_attributes = True
     __tablename__ = 'articles'
@@ -13,5 +17,84 @@ class ArticleBase(Base):
     created_at = Column(DateTime)
     updated_at = Column(DateTime)  
     is_export = Column(Integer)
+    # url的sha256，唯一索引用于按链接去重
+    url_hash = Column(String(64))
+    __table_args__ = (
+        # 按公众号取最新文章(RSS、文章列表)
+        Index('ix_articles_mp_id_publish_time', mp_id, publish_time.desc()),
+        # 按状态过滤并按发布时间排序
+        Index('ix_articles_status_publish_time', status, publish_time),
+        Index('ux_articles_url_hash', url_hash, unique=True),
+        # RSS条件请求取最后更新时间
+        Index('ix_articles_updated_at', updated_at),
+    )
+@event.listens_for(ArticleBase, 'before_insert', propagate=True)
+def _fill_url_hash(mapper, connection, target):
+    target.url_hash = content_hash(target.url) if target.url else None
+@event.listens_for(ArticleBase, 'before_update', propagate=True)
+def _update_url_hash(mapper, connection, target):
+    # 只在链接变化时更新，迁移时保留为空的重复链接不受影响
+    from sqlalchemy import inspect
+    if inspect(target).attrs.url.history.has_changes():
+        _fill_url_hash(mapper, connection, target)
+@event.listens_for(ArticleBase, 'before_update', propagate=True)
+def _touch_updated_at(mapper, connection, target):
+    # 正文、状态变化时更新updated_at, RSS的ETag依赖它判断内容是否变化
+    from sqlalchemy import inspect
+    from datetime import datetime
+    attrs = inspect(target).attrs
+    if attrs.updated_at.history.has_changes():
+        return
+    if any(name in attrs and attrs[name].history.has_changes() for name in ('content_hash', 'status')):
+        target.updated_at = datetime.now()
+class ArticleContent(Base):
+    #文章正文，压缩后单独存放，列表、统计和RSS查询不再扫描正文
+    __tablename__ = 'article_contents'
+    # 与articles.id一致
+    id = Column(String(255), primary_key=True)
+    # 压缩算法 zstd/zlib/raw
+    codec = Column(String(16))
+    # 压缩后的正文
+    data = Column(Blob)
+    # 原文长度(字节)
+    size = Column(Integer)
+    updated_at = Column(DateTime)
+    @property
+    def text(self)->str:
+        cached=self.__dict__.get('_text')
+        if cached is None:
+            cached=decompress_text(self.codec,self.data)
+            self.__dict__['_text']=cached
+        return cached
+    def set_text(self,text:str):
+        from datetime import datetime
+        self.codec,self.data=compress_text(text)
+        self.size=len(text.encode("utf-8"))
+        self.updated_at=datetime.now().replace(microsecond=0)
+        self.__dict__['_text']=text
 class Article(ArticleBase):
-    content = Column(Text)
+    # 正文的sha256，为空表示还没有正文
+    content_hash = Column(String(64))
+    # 正文按需加载，需要批量读取时使用 selectinload(Article.body)
+    body = relationship(ArticleContent,
+                        primaryjoin=lambda: ArticleBase.id == foreign(ArticleContent.id),
+                        uselist=False,lazy="select",cascade="all, delete-orphan")
+    @hybrid_property
+    def content(self):
+        if self.content_hash is None or self.body is None:
+            return None
+        return self.body.text
+    @content.setter
+    def content(self,value:str):
+        if not value:
+            self.content_hash=None
+            self.body=None
+            return
+        self.content_hash=content_hash(value)
+        if self.body is None:
+            self.body=ArticleContent()
+        self.body.set_text(value)
+    @content.expression
+    def content(cls):
+        # 查询条件中 Article.content == None 等价于没有正文
+        return cls.content_hash
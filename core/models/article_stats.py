@@ -0,0 +1,19 @@
+from  .base import Base,Column,String,Integer,DateTime
+class ArticleStats(Base):
+    #文章统计，按公众号增量维护，mp_id为__all__的一行为全局统计
+    __tablename__ = 'article_stats'
+    # 公众号ID，全局统计为 __all__
+    mp_id = Column(String(255), primary_key=True)
+    # 文章总数
+    total = Column(Integer, default=0)
+    # 有正文的文章数
+    has_content = Column(Integer, default=0)
+    # 状态不正常(非ACTIVE)的文章数
+    wrong = Column(Integer, default=0)
+    # 已删除的文章数
+    deleted = Column(Integer, default=0)
+    # 公众号总数(仅全局统计)
+    feeds = Column(Integer, default=0)
+    # 最后发布时间
+    last_publish_time = Column(Integer)
+    updated_at = Column(DateTime)
@@ -6,8 +6,10 @@ from core.config import cfg
 
 if cfg.get("db","mysql").startswith("mysql"):
     from sqlalchemy.dialects.mysql import MEDIUMTEXT as Text
+    from sqlalchemy.dialects.mysql import MEDIUMBLOB as Blob
 else:
     from sqlalchemy import Text
+    from sqlalchemy import LargeBinary as Blob
 
 class DataStatus():
     DELETED:int = 1000
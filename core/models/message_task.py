@@ -2,6 +2,7 @@
 from .base import Base,Column, Integer, String, DateTime,JSON,Text
 # 从 datetime 模块导入 datetime 类，用于处理日期和时间
 from datetime import datetime
+from sqlalchemy import Index
 
 # 定义 MessageTask 类，继承自 Base 基类
 class MessageTask(Base):
@@ -29,4 +30,14 @@ class MessageTask(Base):
     # 定义创建时间字段，默认值为当前 UTC 时间
     created_at = Column(DateTime)
     # 定义更新时间字段，默认值为当前 UTC 时间，更新时自动更新为当前时间
-    updated_at = Column(DateTime )
\ No newline at end of file
+    updated_at = Column(DateTime )
+
+# 定义 TaskFeed 类，消息任务需要采集的公众号(由 message_tasks.mps_id 同步)
+class TaskFeed(Base):
+    __tablename__ = 'task_feeds'
+    task_id = Column(String(255), primary_key=True)
+    mp_id = Column(String(255), primary_key=True)
+    __table_args__ = (
+        # 按公众号查找所属任务
+        Index('ix_task_feeds_mp_id', mp_id),
+    )
@@ -1,4 +1,5 @@
 from  .base import Base,Column,String,Integer,DateTime,Text
+from sqlalchemy import Index
 class Tags(Base):   
     #标签数据模型类，用于存储和管理标签信息
     __tablename__ = 'tags'
@@ -22,4 +23,12 @@ class Tags(Base):
     created_at = Column(DateTime) 
     # 记录最后更新时间
     updated_at = Column(DateTime)
-    
\ No newline at end of file
+class TagFeed(Base):
+    #标签包含的公众号(由tags.mps_id同步)，标签源按此表关联查询
+    __tablename__ = 'tag_feeds'
+    tag_id = Column(String(255), primary_key=True)
+    mp_id = Column(String(255), primary_key=True)
+    __table_args__ = (
+        # 按公众号查找所属标签
+        Index('ix_tag_feeds_mp_id', mp_id),
+    )
@@ -0,0 +1,30 @@
+from  .base import Base,Column,String,Integer,DateTime
+from sqlalchemy import Index
+class WebSubSubscription(Base):
+    #WebSub订阅(本服务作为自己RSS的hub)，确认订阅意图后才写入
+    __tablename__ = 'websub_subscriptions'
+    # 回调地址和主题的sha1
+    id = Column(String(64), primary_key=True)
+    # 订阅的主题(源地址，即源里的rel=self)
+    topic = Column(String(500))
+    # 订阅者接收推送的地址
+    callback = Column(String(500))
+    # 主题对应的源：公众号ID(全部文章为all)或标签ID，以及格式
+    feed_id = Column(String(255))
+    tag_id = Column(String(255))
+    ext = Column(String(20))
+    # 推送内容签名用的密钥(X-Hub-Signature)，为空时不签名
+    secret = Column(String(200))
+    # 订阅有效期(秒)和到期时间
+    lease_seconds = Column(Integer)
+    expires_at = Column(DateTime)
+    # 连续推送失败次数
+    fail_count = Column(Integer,default=0)
+    # 最后一次推送成功时间
+    delivered_at = Column(DateTime)
+    created_at = Column(DateTime)
+    updated_at = Column(DateTime)
+    __table_args__ = (
+        # 发布时按源查找订阅
+        Index('ix_websub_feed', feed_id, tag_id),
+    )
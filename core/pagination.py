@@ -0,0 +1,61 @@
+import base64
+import json
+from sqlalchemy import and_, or_
+
+# 游标分页(keyset): 按 (publish_time, id) 倒序, 游标记录翻页起点, 深分页不再依赖OFFSET
+
+def encode_cursor(publish_time: int, id: str, direction: str = "next") -> str:
+    """生成不透明游标"""
+    raw = json.dumps([publish_time or 0, id, direction], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str) -> tuple:
+    """解析游标, 返回 (publish_time, id, direction), 非法游标抛出ValueError"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        publish_time, id, direction = json.loads(raw)
+        if direction not in ("next", "prev"):
+            raise ValueError(direction)
+        return int(publish_time), str(id), direction
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+def apply_cursor(query, cursor: str = None, model=None):
+    """给查询加上游标条件和排序, 返回 (query, direction)
+
+    query 可以是 session.query(...) 也可以是 select(...)
+    """
+    if model is None:
+        from core.models.article import Article as model
+    if not cursor:
+        return query.order_by(model.publish_time.desc(), model.id.desc()), "next"
+    publish_time, id, direction = decode_cursor(cursor)
+    if direction == "prev":
+        query = query.filter(or_(model.publish_time > publish_time,
+                                 and_(model.publish_time == publish_time, model.id > id)))
+        return query.order_by(model.publish_time.asc(), model.id.asc()), direction
+    query = query.filter(or_(model.publish_time < publish_time,
+                             and_(model.publish_time == publish_time, model.id < id)))
+    return query.order_by(model.publish_time.desc(), model.id.desc()), direction
+
+def cursor_page(rows: list, limit: int, direction: str = "next", has_before: bool = False, key=None) -> tuple:
+    """整理按 limit+1 取回的结果, 返回 (rows, next_cursor, prev_cursor)
+
+    Args:
+        rows: 按apply_cursor排序、最多limit+1条的结果
+        has_before: 当前页之前是否还有数据(带游标或OFFSET>0)
+        key: 从行中取出文章对象, 默认行本身
+    """
+    key = key or (lambda row: row)
+    has_more = len(rows) > limit
+    rows = list(rows[:limit])
+    if direction == "prev":
+        rows.reverse()
+    next_cursor = prev_cursor = None
+    if rows:
+        first, last = key(rows[0]), key(rows[-1])
+        if has_more if direction == "next" else True:
+            next_cursor = encode_cursor(last.publish_time, last.id, "next")
+        if has_more if direction == "prev" else has_before:
+            prev_cursor = encode_cursor(first.publish_time, first.id, "prev")
+    return rows, next_cursor, prev_cursor
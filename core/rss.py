@@ -1,8 +1,36 @@
-import xml.etree.ElementTree as ET
 from datetime import datetime, timedelta, timezone
 import os
 import json
+import threading
+from xml.sax.saxutils import escape as _escape
 from core.content_format import format_content
+from core.content_store import add_logo_prefix
+from core.common.compress import HTTP_ENCODINGS,http_compress
+
+# 预压缩文件的扩展名
+VARIANT_EXT={"gzip":"gz","br":"br"}
+
+def _escape_attr(value)->str:
+    return _escape(str(value),{'"':"&quot;","\n":"&#10;","\r":"&#13;","\t":"&#09;"})
+
+def _start(tag:str,attrs:dict=None)->str:
+    if not attrs:
+        return f"<{tag}>"
+    return f"<{tag} "+" ".join(f'{k}="{_escape_attr(v)}"' for k,v in attrs.items())+">"
+
+def _element(tag:str,text=None,attrs:dict=None,short:bool=False,escape:bool=True)->str:
+    """生成单个XML元素, short为True时空元素输出为<tag />(与ElementTree默认一致)"""
+    if text is None or text=="":
+        if short:
+            return _start(tag,attrs)[:-1]+" />"
+        return _start(tag,attrs)+f"</{tag}>"
+    text=_escape(str(text)) if escape else text
+    return f"{_start(tag,attrs)}{text}</{tag}>"
+
+def _cdata(text)->str:
+    """CDATA包裹, 内容中的]]>拆成两段"""
+    return "<![CDATA["+str(text).replace("]]>","]]]]><![CDATA[>")+"]]>"
+
 class RSS:
     cache_dir = os.path.normpath("data/cache/rss")
     content_cache_dir = os.path.normpath("data/cache/content")
@@ -26,18 +54,8 @@ class RSS:
             return "application/json"
         return "text/plain"
     
-    def cache_content(self, content_id: str, content: dict):
-        """缓存文章内容"""
-        content["content"]=self.add_logo_prefix_to_urls(content["content"])
-        content_path = os.path.normpath(f"{self.content_cache_dir}/{content_id}.json")
-        if not content_path.startswith(self.content_cache_dir):
-            raise ValueError("Invalid content path: Path traversal detected.")
-        
-        with open(content_path, "w", encoding="utf-8") as f:
-            json.dump(content, f, ensure_ascii=False, indent=2)
-
     def get_cached_content(self, content_id: str) -> dict:
-        """获取缓存的文章内容"""
+        """获取旧版本按文章ID缓存的文章内容, 新的正文缓存见core.content_store"""
         content_path = os.path.normpath(f"{self.content_cache_dir}/{content_id}.json")
         if not content_path.startswith(self.content_cache_dir):
             raise ValueError("Invalid content path: Path traversal detected.")
@@ -89,79 +107,80 @@ class RSS:
         Returns:
             处理后的字符串，所有图片URL前添加了前缀
         """
-        import re
-        try:
-            pattern = re.compile(r'(<img[^>]*src=["\'])(?!\/static\/res\/logo\/)([^"\']*)', re.IGNORECASE)
-            return pattern.sub(r'\1/static/res/logo/\2', text)
-        except:
-            return text
+        return add_logo_prefix(text)
        
     def generate_rss(self,rss_list: dict, title: str = "Mp-We-Rss", 
                     link: str = "https://github.com/rachelos/we-mp-rss",
-                    description: str = "RSS频道", language: str = "zh-CN",image_url:str=""):
+                    description: str = "RSS频道", language: str = "zh-CN",image_url:str="",next_link:str=None,prev_link:str=None,self_link:str=None,hub_link:str=None):
+        tree_str="".join(self.iter_rss(rss_list,title=title,link=link,description=description,language=language,image_url=image_url,next_link=next_link,prev_link=prev_link,self_link=self_link,hub_link=hub_link))
+        self.write_cache(tree_str)
+        return tree_str
+
+    def iter_rss(self,rss_list: dict, title: str = "Mp-We-Rss", 
+                    link: str = "https://github.com/rachelos/we-mp-rss",
+                    description: str = "RSS频道", language: str = "zh-CN",image_url:str="",next_link:str=None,prev_link:str=None,self_link:str=None,hub_link:str=None):
+        """逐段生成RSS 2.0内容, 每次返回频道头或一个item"""
         from core.config import cfg
         full_context=bool(cfg.get("rss.full_context",False))
-        
-        # 创建根元素(RSS标准)
-        rss = ET.Element("rss", version="2.0")
+        add_cover=cfg.get("rss.add_cover",False)==True
+        cdata=cfg.get("rss.cdata",False)==True
+
+        # 根元素(RSS标准)
+        attrs={"version":"2.0"}
         if full_context==True:
-            rss.attrib["xmlns:content"] = "http://purl.org/rss/1.0/modules/content/"
-        channel=ET.SubElement(rss, "channel")
+            attrs["xmlns:content"] = "http://purl.org/rss/1.0/modules/content/"
+        if next_link or prev_link or self_link or hub_link:
+            attrs["xmlns:atom"] = "http://www.w3.org/2005/Atom"
+        head=['<?xml version="1.0" encoding="utf-8"?>\r\n',_start("rss",attrs),"<channel>"]
         # 设置渠道信息
-        ET.SubElement(channel, "title").text = title
-        ET.SubElement(channel, "link").text = link
-        ET.SubElement(channel, "description").text = description
-        ET.SubElement(channel, "language").text = language
-        ET.SubElement(channel, "generator").text = "Mp-We-Rss"
+        head.append(_element("title",title))
+        head.append(_element("link",link))
+        head.append(_element("description",description))
+        head.append(_element("language",language))
+        head.append(_element("generator","Mp-We-Rss"))
         # Use timezone-aware now (CST/UTC+8) so %z shows +0800
-        ET.SubElement(channel, "lastBuildDate").text = datetime.now(timezone(timedelta(hours=8))).strftime("%a, %d %b %Y %H:%M:%S %z")
-    
+        head.append(_element("lastBuildDate",datetime.now(timezone(timedelta(hours=8))).strftime("%a, %d %b %Y %H:%M:%S %z")))
+        # RFC 5005 分页链接
+        if next_link:
+            head.append(_element("atom:link",attrs={"rel":"next","href":next_link}))
+        if prev_link:
+            head.append(_element("atom:link",attrs={"rel":"previous","href":prev_link}))
+        # WebSub 推送订阅地址
+        if self_link:
+            head.append(_element("atom:link",attrs={"rel":"self","href":self_link}))
+        if hub_link:
+            head.append(_element("atom:link",attrs={"rel":"hub","href":hub_link}))
         # 设置image子项
-        if cfg.get("rss.add_cover",False)==True and image_url != "":
-            image = ET.SubElement(channel, "image")
-            ET.SubElement(image, "url").text = image_url
-            ET.SubElement(image, "title").text = title
-            ET.SubElement(image, "link").text = link
+        if add_cover and image_url != "":
+            head.append("<image>"+_element("url",image_url)+_element("title",title)+_element("link",link)+"</image>")
+        yield "".join(head)
 
         for rss_item in rss_list:
-            item = ET.SubElement(channel, "item")
-            ET.SubElement(item, "id").text = rss_item["id"]
-            ET.SubElement(item, "title").text = rss_item["title"]
-            ET.SubElement(item, "description").text = rss_item["description"] 
-            ET.SubElement(item, "guid").text = rss_item["link"]
+            item=["<item>",
+                  _element("id",rss_item["id"]),
+                  _element("title",rss_item["title"]),
+                  _element("description",rss_item["description"]),
+                  _element("guid",rss_item["link"])]
             # 添加图片封面
-            if cfg.get("rss.add_cover",False)==True:
-                enclosure = ET.SubElement(item, "enclosure")
-                enclosure.set("url", rss_item["image"])
-                enclosure.set("length", "0")
-                enclosure.set("type", "image/jpeg")
+            if add_cover:
+                item.append(_element("enclosure",attrs={"url":rss_item["image"],"length":"0","type":"image/jpeg"}))
             if full_context==True:
                 try:
-                    if cfg.get("rss.cdata",False)==True:
-                        content = f"<![CDATA[{str(rss_item['content'])}]]>"  # 使用CDATA包裹内容
+                    if cdata:
+                        item.append(_element("content:encoded",_cdata(rss_item['content']),escape=False))  # 使用CDATA包裹内容
                     else:
-                        content = str(rss_item['content'])
-                    ET.SubElement(item, "content:encoded").text = content
+                        item.append(_element("content:encoded",str(rss_item['content'])))
                 except Exception as e:
                     print(f"Error adding content:encoded element: {e}")
-                pass
-            # ET.SubElement(item, "category").text = rss_item["category"]
-            # ET.SubElement(item, "author").text = rss_item["author"]
-            ET.SubElement(item, "link").text = rss_item["link"]
-            ET.SubElement(item, "pubDate").text = self.datetime_to_rfc822(str(rss_item["updated"]))
-
-        # 生成XML字符串(添加声明和美化输出)
-        tree_str = '<?xml version="1.0" encoding="utf-8"?>\r\n' + \
-                ET.tostring(rss, encoding="utf-8", method="xml", short_empty_elements=False).decode("utf-8")
-        
-        if self.rss_file is not None:
-            with open(self.rss_file, "w", encoding="utf-8") as f:
-                f.write(tree_str)
-        return tree_str
+            item.append(_element("link",rss_item["link"]))
+            item.append(_element("pubDate",self.datetime_to_rfc822(str(rss_item["updated"]))))
+            item.append("</item>")
+            yield "".join(item)
+        yield "</channel></rss>"
      
     def generate_atom(self,rss_list: dict, title: str = "Mp-We-Rss", 
                     link: str = "https://github.com/rachelos/we-mp-rss",
-                    description: str = "RSS频道", language: str = "zh-CN",image_url:str="") -> str:
+                    description: str = "RSS频道", language: str = "zh-CN",image_url:str="",next_link:str=None,prev_link:str=None,self_link:str=None,hub_link:str=None) -> str:
         """生成Atom格式的RSS内容
         
         Args:
@@ -174,64 +193,72 @@ class RSS:
         Returns:
             Atom格式的XML字符串
         """
+        tree_str="".join(self.iter_atom(rss_list,title=title,link=link,description=description,language=language,image_url=image_url,next_link=next_link,prev_link=prev_link,self_link=self_link,hub_link=hub_link))
+        self.write_cache(tree_str)
+        return tree_str
+
+    def iter_atom(self,rss_list: dict, title: str = "Mp-We-Rss", 
+                    link: str = "https://github.com/rachelos/we-mp-rss",
+                    description: str = "RSS频道", language: str = "zh-CN",image_url:str="",next_link:str=None,prev_link:str=None,self_link:str=None,hub_link:str=None):
+        """逐段生成Atom内容, 每次返回头部或一个entry"""
         from core.config import cfg
         full_context = bool(cfg.get("rss.full_context", False))
-        
-        # 创建根元素(Atom标准)
-        feed = ET.Element("feed", xmlns="http://www.w3.org/2005/Atom")
+        add_cover=cfg.get("rss.add_cover",False)==True
+        cdata=cfg.get("rss.cdata",False)==True
+
+        # 根元素(Atom标准)
+        attrs={"xmlns":"http://www.w3.org/2005/Atom"}
         if full_context==True:
-            feed.attrib["xmlns:content"] = "http://purl.org/rss/1.0/modules/content/"
-        ET.SubElement(feed, "title").text = title
-        ET.SubElement(feed, "link",rel="alternate", href=link)
-        ET.SubElement(feed, "link",rel="icon", href=image_url)
-        ET.SubElement(feed, "logo").text=str(image_url)
-        ET.SubElement(feed, "icon").text=str(image_url)
+            attrs["xmlns:content"] = "http://purl.org/rss/1.0/modules/content/"
+        head=['<?xml version="1.0" encoding="utf-8"?>\r\n',_start("feed",attrs)]
+        head.append(_element("title",title,short=True))
+        head.append(_element("link",attrs={"rel":"alternate","href":link},short=True))
+        head.append(_element("link",attrs={"rel":"icon","href":image_url},short=True))
+        # RFC 5005 分页链接
+        if next_link:
+            head.append(_element("link",attrs={"rel":"next","href":next_link},short=True))
+        if prev_link:
+            head.append(_element("link",attrs={"rel":"previous","href":prev_link},short=True))
+        # WebSub 推送订阅地址
+        if self_link:
+            head.append(_element("link",attrs={"rel":"self","href":self_link},short=True))
+        if hub_link:
+            head.append(_element("link",attrs={"rel":"hub","href":hub_link},short=True))
+        head.append(_element("logo",str(image_url),short=True))
+        head.append(_element("icon",str(image_url),short=True))
         # Use timezone-aware now (CST/UTC+8) so %z shows +0800
-        ET.SubElement(feed, "updated").text = datetime.now(timezone(timedelta(hours=8))).strftime("%a, %d %b %Y %H:%M:%S %z")
-        ET.SubElement(feed, "id").text = str(link)
-        ET.SubElement(feed, "author").text = "Mp-We-Rss"
+        head.append(_element("updated",datetime.now(timezone(timedelta(hours=8))).strftime("%a, %d %b %Y %H:%M:%S %z"),short=True))
+        head.append(_element("id",str(link),short=True))
+        head.append(_element("author","Mp-We-Rss",short=True))
         # 设置image子项
-        if cfg.get("rss.add_cover",False)==True and image_url != "":
-            image = ET.SubElement(feed, "image")
-            ET.SubElement(image, "url").text = str(image_url)
-            ET.SubElement(image, "title").text = str(title)
-            ET.SubElement(image, "link").text = str(link)
+        if add_cover and image_url != "":
+            head.append("<image>"+_element("url",str(image_url),short=True)+_element("title",str(title),short=True)+_element("link",str(link),short=True)+"</image>")
+        yield "".join(head)
+
+        type=self.get_content_type() if full_context else None
         for rss_item in rss_list:
-            entry = ET.SubElement(feed, "entry")
-            ET.SubElement(entry, "id").text = rss_item["id"]
-            ET.SubElement(entry, "title").text = str(rss_item["title"])
-            ET.SubElement(entry, "link", href=str(rss_item["link"]))
-            ET.SubElement(entry, "updated").text =self.datetime_to_rfc822(str(rss_item["updated"]))
-            ET.SubElement(entry, "summary").text = str(rss_item["description"])
-            ET.SubElement(entry, "author").text = str(rss_item["mp_name"])
+            entry=["<entry>",
+                   _element("id",rss_item["id"],short=True),
+                   _element("title",str(rss_item["title"]),short=True),
+                   _element("link",attrs={"href":str(rss_item["link"])},short=True),
+                   _element("updated",self.datetime_to_rfc822(str(rss_item["updated"])),short=True),
+                   _element("summary",str(rss_item["description"]),short=True),
+                   _element("author",str(rss_item["mp_name"]),short=True)]
              # 添加图片封面
-            if cfg.get("rss.add_cover",False)==True:
-                enclosure = ET.SubElement(entry, "enclosure")
-                enclosure.set("url", str(rss_item["image"]))
-                enclosure.set("length", "0")
-                enclosure.set("type", "image/jpeg")
-            
+            if add_cover:
+                entry.append(_element("enclosure",attrs={"url":str(rss_item["image"]),"length":"0","type":"image/jpeg"},short=True))
             if full_context:
-                type=self.get_content_type()
-                # content = ET.SubElement(entry, "content", type=f"{str(type)}") 
-                # content.text = format_content(rss_item["content"],type)
-                content=format_content(rss_item["content"],type)
                 try:
-                    if cfg.get("rss.cdata",False)==True:
-                        content = f"<![CDATA[{content}]]>"  # 使用CDATA包裹内容
+                    content=format_content(rss_item["content"],type,content_hash=rss_item.get("content_hash"))
+                    if cdata:
+                        entry.append(_element("content:encoded",_cdata(content),escape=False))  # 使用CDATA包裹内容
                     else:
-                        ET.SubElement(entry, "content:encoded").text = content
+                        entry.append(_element("content:encoded",content,short=True))
                 except Exception as e:
                     print(f"Error adding content:encoded element: {e}")
-                pass
-        # 生成XML字符串
-        tree_str = '<?xml version="1.0" encoding="utf-8"?>\r\n' + \
-                  ET.tostring(feed, encoding="utf-8", method="xml").decode("utf-8")
-        
-        if self.rss_file is not None:
-            with open(self.rss_file, "w", encoding="utf-8") as f:
-                f.write(tree_str)
-        return tree_str
+            entry.append("</entry>")
+            yield "".join(entry)
+        yield "</feed>"
     def set_content_type(self,type:str=None):
         self.content_type=type
     def get_content_type(self)->str:
@@ -245,7 +272,7 @@ class RSS:
         return "html"
     def generate_json(self, rss_list: dict,title: str = "Mp-We-Rss", 
                     link: str = "https://github.com/rachelos/we-mp-rss",
-                    description: str = "RSS频道", language: str = "zh-CN",image_url:str="") -> str:
+                    description: str = "RSS频道", language: str = "zh-CN",image_url:str="",next_link:str=None,prev_link:str=None,self_link:str=None,hub_link:str=None) -> str:
         """获取JSON格式的RSS内容
         
         Args:
@@ -254,39 +281,117 @@ class RSS:
         Returns:
             JSON格式的字符串
         """
+        return "".join(self.iter_json(rss_list,title=title,link=link,description=description,language=language,image_url=image_url,next_link=next_link,prev_link=prev_link,self_link=self_link,hub_link=hub_link))
+
+    def iter_json(self, rss_list: dict,title: str = "Mp-We-Rss", 
+                    link: str = "https://github.com/rachelos/we-mp-rss",
+                    description: str = "RSS频道", language: str = "zh-CN",image_url:str="",next_link:str=None,prev_link:str=None,self_link:str=None,hub_link:str=None):
+        """逐段生成JSON内容, 每次返回头部或一篇文章, 格式与json.dumps(indent=2)一致"""
         type=self.get_content_type()
-        result = {
+        head = {
             "name":title,
             "link":link,
             "description":description,
             "language": language,
             "cover":image_url,
-            "items": [
-                {
-                    "id": item["id"],
-                    "title": item["title"],
-                    "description": item["description"],
-                    "link": item["link"],
-                    "updated": item["updated"].isoformat() if isinstance(item["updated"], datetime) else item["updated"],
-                    "content": format_content(item["content"],type),
-                    "channel_name": item.get("mp_name", ""),
-                    "feed": item.get("feed")
-                } for item in rss_list
-            ]
+            "next":next_link,
+            "prev":prev_link,
         }
-        return json.dumps(result, ensure_ascii=False, indent=2, default=self.serialize_datetime)
+        # WebSub 推送订阅地址(JSON Feed的hubs写法)
+        if self_link:
+            head["feed_url"]=self_link
+        if hub_link:
+            head["hubs"]=[{"type":"WebSub","url":hub_link}]
+        dumps=lambda value:json.dumps(value, ensure_ascii=False, indent=2, default=self.serialize_datetime)
+        # 去掉头部的结尾"\n}", 接着输出items
+        yield dumps(head)[:-2]+',\n  "items": ['
+        first=True
+        for item in rss_list:
+            data={
+                "id": item["id"],
+                "title": item["title"],
+                "description": item["description"],
+                "link": item["link"],
+                "updated": item["updated"].isoformat() if isinstance(item["updated"], datetime) else item["updated"],
+                "content": format_content(item["content"],type,content_hash=item.get("content_hash")),
+                "channel_name": item.get("mp_name", ""),
+                "feed": item.get("feed")
+            }
+            # 字符串中的换行已被转义, 可以按行缩进
+            chunk="\n".join("    "+line for line in dumps(data).split("\n"))
+            yield ("\n" if first else ",\n")+chunk
+            first=False
+        yield "]\n}" if first else "\n  ]\n}"
 
-    def get_cache(self):
+    def get_cache(self,etag:str=None,encoding:str=None):
+        """读取文件缓存, 传入etag时只返回与之对应版本的内容
+
+        encoding为gzip/br时返回预先压缩好的bytes, 没有对应的压缩文件时返回None
+        """
         if not hasattr(self, 'rss_file') or not self.rss_file:
                return None
         try:
-            with open(self.rss_file, "r", encoding="utf-8") as f:
-                return f.read()  
+            if etag is not None and self._read_etag()!=etag:
+                return None
+            if encoding is not None:
+                if etag is None:
+                    return None
+                with open(f"{self.rss_file}.{VARIANT_EXT[encoding]}", "rb") as f:
+                    content=f.read()
+            else:
+                with open(self.rss_file, "r", encoding="utf-8", newline="") as f:
+                    content=f.read()
+            # 读取期间被重新生成时ETag会变化
+            if etag is not None and self._read_etag()!=etag:
+                return None
+            return content
         except FileNotFoundError:
             return None     
+    def _read_etag(self):
+        try:
+            with open(f"{self.rss_file}.etag", "r", encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+    def write_cache(self,content:str,etag:str=None)->None:
+        """写入文件缓存(先写临时文件再替换), etag记录内容对应的版本"""
+        if not self.rss_file:
+            return
+        self._tee_done(self.rss_file,self._write_tmp(self.rss_file,content),etag)
+    @staticmethod
+    def _write_tmp(path:str,content:str)->str:
+        tmp=f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp,"w",encoding="utf-8",newline="") as f:
+            f.write(content)
+        return tmp
+    @staticmethod
+    def _tee_done(path:str,tmp:str,etag:str=None)->None:
+        """用临时文件替换缓存文件; 先删除旧的etag和压缩文件, 替换后再写入新的, 读取方不会拿到版本不符的内容
+
+        记录了etag的内容同时保存gzip/br压缩版本, 每次内容变化只压缩一次
+        """
+        for name in ("etag",*VARIANT_EXT.values()):
+            try:
+                os.remove(f"{path}.{name}")
+            except FileNotFoundError:
+                pass
+        os.replace(tmp,path)
+        if etag is None:
+            return
+        from core.config import cfg
+        with open(path,"rb") as f:
+            data=f.read()
+        if len(data)>=int(cfg.get("compress.min_size",1024) or 0):
+            for encoding in HTTP_ENCODINGS:
+                variant=f"{path}.{VARIANT_EXT[encoding]}"
+                tmp=f"{variant}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(tmp,"wb") as f:
+                    f.write(http_compress(data,encoding))
+                os.replace(tmp,variant)
+        os.replace(RSS._write_tmp(f"{path}.etag",etag),f"{path}.etag")
     def generate(self,rss_list: dict,ext=str, title: str = "Mp-We-Rss", 
                     link: str = "https://github.com/rachelos/we-mp-rss",
-                    description: str = "RSS频道", language: str = "zh-CN",image_url:str="",template:str=None) -> str:
+                    description: str = "RSS频道", language: str = "zh-CN",image_url:str="",template:str=None,next_link:str=None,prev_link:str=None,self_link:str=None,hub_link:str=None) -> str:
         """根据扩展名获取对应格式的RSS内容
         
         Args:
@@ -303,20 +408,86 @@ class RSS:
         ext = ext.lower().strip('.')
         self.ext=ext
         if ext in ('rss', 'xml'):
-            return self.generate_rss(rss_list, title=title, link=link, description=description,language=language,image_url=image_url)
+            return self.generate_rss(rss_list, title=title, link=link, description=description,language=language,image_url=image_url,next_link=next_link,prev_link=prev_link,self_link=self_link,hub_link=hub_link)
+        elif ext in ('atom','md','txt'):
+            return self.generate_atom(rss_list, title=title, link=link, description=description,language=language,image_url=image_url,next_link=next_link,prev_link=prev_link,self_link=self_link,hub_link=hub_link)
+        elif ext in ('json','jmd'):
+            return self.generate_json(rss_list, title=title, link=link, description=description,language=language,image_url=image_url,next_link=next_link,prev_link=prev_link,self_link=self_link,hub_link=hub_link)
+        elif template is not None:
+            return self.generate_by_template(rss_list,template, title=title, link=link, description=description,language=language,image_url=image_url,next_link=next_link,prev_link=prev_link,self_link=self_link,hub_link=hub_link)
+        else:
+            raise ValueError(f"Unsupported extension: {ext}")
+    def stream(self,rss_list: dict,ext=str, title: str = "Mp-We-Rss", 
+                    link: str = "https://github.com/rachelos/we-mp-rss",
+                    description: str = "RSS频道", language: str = "zh-CN",image_url:str="",template:str=None,next_link:str=None,prev_link:str=None,self_link:str=None,hub_link:str=None,
+                    tee:bool=True,on_complete=None,etag:str=None):
+        """与generate相同, 但返回逐段生成内容的迭代器, 供StreamingResponse使用
+
+        Args:
+            tee: 同时写入文件缓存(rss_file), 生成完成后才替换原文件
+            on_complete: 生成完成后回调, 参数为完整内容
+            etag: 写入文件缓存时一并记录的版本
+
+        Raises:
+            ValueError: 当扩展名不支持时
+        """
+        ext = ext.lower().strip('.')
+        self.ext=ext
+        kwargs=dict(title=title, link=link, description=description,language=language,image_url=image_url,next_link=next_link,prev_link=prev_link,self_link=self_link,hub_link=hub_link)
+        if ext in ('rss', 'xml'):
+            chunks=self.iter_rss(rss_list,**kwargs)
         elif ext in ('atom','md','txt'):
-            return self.generate_atom(rss_list, title=title, link=link, description=description,language=language,image_url=image_url)
+            chunks=self.iter_atom(rss_list,**kwargs)
         elif ext in ('json','jmd'):
-            return self.generate_json(rss_list, title=title, link=link, description=description,language=language,image_url=image_url)
+            # generate_json不写文件缓存
+            tee=False
+            chunks=self.iter_json(rss_list,**kwargs)
         elif template is not None:
-            return self.generate_by_template(rss_list,template, title=title, link=link, description=description,language=language,image_url=image_url)
+            tee=False
+            chunks=self.iter_by_template(rss_list,template,**kwargs)
         else:
             raise ValueError(f"Unsupported extension: {ext}")
-    def generate_by_template(self,rss_list: dict, template: str, title: str = "Mp-We-Rss",link: str = "https://github.com/rachelos/we-mp-rss",description: str = "RSS频道",language: str = "zh-CN",image_url:str=""):
+        return self._tee(chunks,self.rss_file if tee else None,on_complete,etag)
+
+    @staticmethod
+    def _tee(chunks,path:str=None,on_complete=None,etag:str=None):
+        """转发生成的内容, 同时写入临时文件, 全部完成后替换缓存文件; 中途中断时丢弃临时文件"""
+        f=None
+        tmp=None
+        parts=[] if on_complete is not None else None
+        try:
+            if path is not None:
+                tmp=f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                f=open(tmp,"w",encoding="utf-8",newline="")
+            for chunk in chunks:
+                if f is not None:
+                    f.write(chunk)
+                if parts is not None:
+                    parts.append(chunk)
+                yield chunk
+            if f is not None:
+                f.close()
+                f=None
+                RSS._tee_done(path,tmp,etag)
+                tmp=None
+            if parts is not None:
+                on_complete("".join(parts))
+        finally:
+            if f is not None:
+                f.close()
+            if tmp is not None and os.path.exists(tmp):
+                os.remove(tmp)
+
+    def generate_by_template(self,rss_list: dict, template: str, title: str = "Mp-We-Rss",link: str = "https://github.com/rachelos/we-mp-rss",description: str = "RSS频道",language: str = "zh-CN",image_url:str="",next_link:str=None,prev_link:str=None,self_link:str=None,hub_link:str=None):
             from core.lax import TemplateParser
             template = TemplateParser(template)
-            return template.render({"articles": rss_list, "title": title,"link":link,"description":description,"language":language,"image_url":image_url})
+            return template.render({"articles": rss_list, "title": title,"link":link,"description":description,"language":language,"image_url":image_url,"next_link":next_link or "","prev_link":prev_link or "","self_link":self_link or "","hub_link":hub_link or ""})
             pass
+    def iter_by_template(self,rss_list: dict, template: str, title: str = "Mp-We-Rss",link: str = "https://github.com/rachelos/we-mp-rss",description: str = "RSS频道",language: str = "zh-CN",image_url:str="",next_link:str=None,prev_link:str=None,self_link:str=None,hub_link:str=None):
+            """与generate_by_template相同, 逐段返回渲染结果"""
+            from core.lax import TemplateParser
+            template = TemplateParser(template)
+            return template.render_iter({"articles": rss_list, "title": title,"link":link,"description":description,"language":language,"image_url":image_url,"next_link":next_link or "","prev_link":prev_link or "","self_link":self_link or "","hub_link":hub_link or ""})
     def clear_cache(self,mp_id:str=""):
 
         """清除所有缓存文件
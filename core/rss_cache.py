@@ -0,0 +1,156 @@
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from core.config import cfg
+from core.common.compress import http_compress
+
+# 已生成的RSS/Feed内容的内存缓存(LRU)
+# 每条缓存记录它包含的公众号, 文章写入时只清除涉及该公众号的条目(单个公众号、全部、包含它的标签)
+
+class FeedCache:
+    """RSS内容内存缓存"""
+    def __init__(self):
+        self.max_bytes = int(float(cfg.get("rss.memory_cache_mb", 64) or 0) * 1024 * 1024)
+        self.ttl = int(cfg.get("rss.memory_cache_ttl", 600) or 0)
+        # 小于该大小的内容不压缩
+        self.min_compress_size = int(cfg.get("compress.min_size", 1024) or 0)
+        self.size = 0
+        # 每次清除缓存加1, 生成期间有写入时不再缓存生成结果
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0 and self.ttl > 0
+
+    @staticmethod
+    def make_key(feed_id: str = None, tag_id: str = None, ext: str = None, ctype: str = None, kw: str = None,
+                 limit: int = None, offset: int = None, template: str = None, cursor: str = None, domain: str = None) -> tuple:
+        template_hash = hashlib.sha1(template.encode("utf-8")).hexdigest() if template else None
+        return (feed_id, tag_id, ext, ctype, kw, limit, offset, template_hash, cursor, domain)
+
+    def get(self, key: tuple, encoding: str = None):
+        """返回 (content, media_type, headers, encoding), 未命中返回None
+
+        指定encoding时返回压缩后的内容, 每个版本只在第一次请求时压缩, 之后直接使用;
+        内容太小不压缩时返回的encoding为None
+        """
+        if not self.enabled:
+            return None
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item["expires"] < time.time():
+                if item is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            variant = item["variants"].get(encoding) if encoding else None
+        if encoding and variant is None:
+            if item["raw_size"] < self.min_compress_size:
+                encoding = None
+            else:
+                variant = http_compress(item["content"], encoding)
+                self._add_variant(key, item, encoding, variant)
+        return (variant if encoding else item["content"]), item["media_type"], item["headers"], encoding
+
+    def _add_variant(self, key: tuple, item: dict, encoding: str, variant: bytes) -> None:
+        with self._lock:
+            # 压缩期间缓存被清除或替换时不再保存
+            if self._data.get(key) is not item or encoding in item["variants"]:
+                return
+            item["variants"][encoding] = variant
+            item["size"] += len(variant)
+            self.size += len(variant)
+            while self.size > self.max_bytes and self._data:
+                self._remove(next(iter(self._data)))
+
+    def put(self, key: tuple, content: str, media_type: str, feeds=None, version: int = None, headers: dict = None, variants: dict = None) -> None:
+        """写入缓存
+
+        Args:
+            feeds: 内容涉及的公众号ID集合, None表示全部公众号
+            version: 开始查询时的 self.version, 之后有过清除则不写入
+            headers: 随内容一起返回的响应头(ETag/Last-Modified)
+            variants: 已压缩好的内容 {encoding: bytes}
+        """
+        if not self.enabled or content is None:
+            return
+        raw_size = len(content.encode("utf-8")) if isinstance(content, str) else len(content)
+        variants = {k: v for k, v in (variants or {}).items() if v is not None}
+        size = raw_size + sum(len(v) for v in variants.values())
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if version is not None and version != self.version:
+                return
+            self._remove(key)
+            self._data[key] = {"content": content, "media_type": media_type, "headers": dict(headers or {}),
+                               "variants": variants, "raw_size": raw_size,
+                               "feeds": set(feeds) if feeds is not None else None,
+                               "size": size, "expires": time.time() + self.ttl}
+            self.size += size
+            while self.size > self.max_bytes and self._data:
+                self._remove(next(iter(self._data)))
+
+    def _remove(self, key: tuple) -> None:
+        item = self._data.pop(key, None)
+        if item is not None:
+            self.size -= item["size"]
+
+    def invalidate_feeds(self, mp_ids) -> None:
+        """公众号的文章或信息变化时, 清除涉及这些公众号的缓存"""
+        mp_ids = set(mp_ids)
+        if not mp_ids:
+            return
+        with self._lock:
+            self.version += 1
+            for key in [k for k, v in self._data.items() if v["feeds"] is None or v["feeds"] & mp_ids]:
+                self._remove(key)
+
+    def invalidate_tag(self, tag_id: str) -> None:
+        """标签变化(包含的公众号、名称等)时清除该标签的缓存"""
+        with self._lock:
+            self.version += 1
+            for key in [k for k in self._data if k[1] == tag_id]:
+                self._remove(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.version += 1
+            self._data.clear()
+            self.size = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._data), "size": self.size, "max_size": self.max_bytes, "hits": self.hits, "misses": self.misses}
+
+FEED_CACHE = FeedCache()
+
+@event.listens_for(Session, "after_flush")
+def _invalidate_feed_cache(session, flush_context):
+    # 文章/公众号/标签写入后清除相关的RSS缓存, 批量写入在调用处单独清除
+    if not FEED_CACHE.enabled:
+        return
+    mp_ids = set()
+    for obj in (*session.new, *session.deleted, *[o for o in session.dirty if session.is_modified(o)]):
+        table = getattr(obj, "__tablename__", None)
+        if table not in ("articles", "feeds", "tags"):
+            continue
+        # 不触发加载, 已过期的对象无法确定所属公众号时清空全部
+        value = inspect(obj).dict.get("mp_id" if table == "articles" else "id")
+        if value is None:
+            FEED_CACHE.clear()
+            return
+        if table == "tags":
+            FEED_CACHE.invalidate_tag(value)
+        else:
+            mp_ids.add(value)
+    FEED_CACHE.invalidate_feeds(mp_ids)
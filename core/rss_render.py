@@ -0,0 +1,270 @@
+import hashlib
+import threading
+from datetime import datetime, timezone, timedelta
+from email.utils import formatdate
+from sqlalchemy import select, func, event, inspect
+from sqlalchemy.orm import Session, selectinload
+from core.config import cfg
+from core.models.feed import Feed
+from core.models.article import Article
+from core.models.tags import Tags, TagFeed
+from core.memberships import MEMBERSHIPS, tag_mp_ids
+from core.pagination import apply_cursor, cursor_page
+from core.rss import RSS
+from core.rss_cache import FEED_CACHE
+from core.print import print_info, print_warning, print_error
+
+# RSS生成的公共部分: 源的范围(公众号/标签/全部)、文章查询、条目转换和ETag计算
+# /feed接口(异步会话)和采集完成后的后台预生成(同步会话)共用, 保证两边生成的内容和ETag一致
+
+def base_url() -> str:
+    """配置的RSS域名(rss.base_url), 未配置时返回None
+
+    后台预生成和WebSub只使用配置的域名, 请求头里的Host可以被伪造
+    """
+    return cfg.get("rss.base_url", None) or None
+
+def scope_stmt(feed_id: str = None, tag_id: str = None):
+    """查询源对应的公众号或标签记录, 全部文章的源不需要查询时返回None"""
+    if feed_id not in ("all", None):
+        return select(Feed).where(Feed.id == feed_id)
+    if tag_id is not None:
+        return select(Tags).where(Tags.id == tag_id)
+    return None
+
+def feed_scope(feed_id: str, tag_id: str, row, rss_domain: str):
+    """确定源的范围
+
+    Args:
+        row: scope_stmt 查询出的公众号或标签记录
+
+    Returns:
+        (频道信息, 文章筛选条件, 参与ETag计算的频道字段, 涉及的公众号ID集合/None表示全部),
+        指定的公众号不存在时返回None
+    """
+    if feed_id not in ("all", None):
+        if row is None:
+            return None
+        # 只用输出的频道字段, 公众号的updated_at每次采集都会变化
+        return row, [Article.mp_id == feed_id], [row.mp_name, row.mp_intro, row.mp_cover], {feed_id}
+    channel = Feed()
+    channel.mp_name = cfg.get("rss.title", "WeRss") or "WeRss"
+    channel.mp_intro = cfg.get("rss.description") or "WeRss高效订阅我的公众号"
+    channel.mp_cover = cfg.get("rss.cover") or f"{rss_domain}static/logo.svg"
+    # 如果传入了tag_id就加载tag对应的订阅信息
+    if tag_id is not None and row is not None:
+        mps_ids = tag_mp_ids(row)
+        channel.mp_name = row.name
+        channel.mp_intro = row.intro
+        channel.mp_cover = f'{rss_domain}{row.cover}'
+        # 关联表可用时按索引关联查询, 否则使用解析出的ID列表
+        members = select(TagFeed.mp_id).where(TagFeed.tag_id == row.id) if MEMBERSHIPS.ready() else mps_ids
+        return channel, [Article.mp_id.in_(members)], [row.updated_at], set(mps_ids)
+    return channel, [], [channel.mp_name, channel.mp_intro, channel.mp_cover], None
+
+def feed_query(conditions: list):
+    """源的文章查询(未分页), 正文随查询一起加载"""
+    query = select(Feed, Article).join(Article, Feed.id == Article.mp_id).options(selectinload(Article.body))
+    return query.where(*conditions) if conditions else query
+
+def version_stmt(model, conditions: list):
+    """ETag用到的聚合值: 数量、最后更新时间、最后发布(文章)/创建时间"""
+    columns = [func.count(), func.max(model.updated_at)]
+    columns.append(func.max(Article.publish_time) if model is Article else func.max(model.created_at))
+    stmt = select(*columns).select_from(model)
+    return stmt.where(*conditions) if conditions else stmt
+
+def make_validators(params, values: tuple, updated: list) -> dict:
+    """计算ETag和Last-Modified
+
+    聚合值加上输出参数(params)一起哈希, 内容里的生成时间每次不同, 所以使用弱ETag
+    """
+    values = tuple(values)
+    times = [t.timestamp() if isinstance(t, datetime) else t for t in (*values[1:], *updated) if isinstance(t, (datetime, int))]
+    etag = hashlib.sha1(repr((params, values, [str(t) for t in updated])).encode("utf-8")).hexdigest()
+    headers = {"ETag": f'W/"{etag}"'}
+    if times:
+        headers["Last-Modified"] = formatdate(int(max(times)), usegmt=True)
+    return headers
+
+def feed_items(rows: list, rss_domain: str) -> list:
+    """(公众号, 文章)结果转换为RSS条目"""
+    cst = timezone(timedelta(hours=8))
+    local = cfg.get("rss.local", False)
+    return [{
+        "id": str(article.id),
+        "title": article.title or "",
+        "link": f"{rss_domain}rss/feed/{article.id}" if local else article.url,
+        "description": article.description if article.description != "" else article.title or "",
+        "content": article.content or "",
+        "content_hash": article.content_hash,
+        "image": article.pic_url or "",
+        "mp_name": _feed.mp_name or "",
+        "updated": datetime.fromtimestamp(article.publish_time, tz=cst),
+        "feed": {
+                "id": _feed.id,
+                "name": _feed.mp_name,
+                "cover": _feed.mp_cover,
+                "intro": _feed.mp_intro
+        }
+    } for _feed, article in rows]
+
+def feed_path(feed_id: str = None, tag_id: str = None, ext: str = "rss") -> str:
+    """源在/feed下的路径(不含域名)"""
+    if feed_id in ("all", None) and tag_id is not None:
+        return f"feed/tag/{tag_id}.{ext}"
+    return f"feed/{feed_id or 'all'}.{ext}"
+
+def hub_links(feed_id: str = None, tag_id: str = None, ext: str = "rss") -> tuple:
+    """源里声明的WebSub地址(rel=self, rel=hub), 未启用WebSub或未配置rss.base_url时返回(None, None)"""
+    domain = base_url()
+    if not domain or str(cfg.get("websub.enabled", True)).lower() not in ("true", "1", "yes"):
+        return None, None
+    return f"{domain}{feed_path(feed_id, tag_id, ext)}", f"{domain}websub/hub"
+
+def feed_targets(session, mp_ids: set) -> list:
+    """公众号更新后受影响的源: 公众号本身、全部文章和包含它的标签, 返回[(feed_id, tag_id)]"""
+    targets = [(mp_id, None) for mp_id in sorted(mp_ids)] + [("all", None)]
+    tag_ids = MEMBERSHIPS.feed_tags(mp_ids)
+    if tag_ids is None:
+        tag_ids = [tags.id for tags in session.execute(select(Tags)).scalars() if mp_ids & set(tag_mp_ids(tags))]
+    targets.extend((None, tag_id) for tag_id in sorted(tag_ids))
+    return targets
+
+class FeedMaterializer:
+    """采集完成后在后台预先生成RSS
+
+    公众号有更新时重新生成该公众号、全部文章和包含它的标签的源, 按配置的格式写入文件缓存(附带ETag),
+    接口读取时ETag一致就直接返回, 生成次数与更新次数相关而不是与访问次数相关;
+    生成后推送给WebSub订阅者. 只使用配置的rss.base_url, 未配置时跳过
+    """
+    def __init__(self):
+        self.enabled = str(cfg.get("rss.materialize", True)).lower() in ("true", "1", "yes")
+        self.formats = [f.strip() for f in str(cfg.get("rss.materialize_formats", "rss,atom,json") or "").split(",") if f.strip()]
+        self.limit = int(cfg.get("rss.materialize_limit", 50))
+        self._warned = False
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._queue = None
+
+    @property
+    def domain(self) -> str:
+        return base_url()
+
+    def schedule(self, mp_ids) -> None:
+        """公众号更新后加入后台生成, 执行前重复提交的公众号会合并"""
+        mp_ids = {str(mp_id) for mp_id in mp_ids if mp_id}
+        if not mp_ids:
+            return
+        if not self.domain:
+            if not self._warned:
+                self._warned = True
+                print_warning("未配置rss.base_url, 跳过RSS预生成和WebSub推送")
+            return
+        if not self.enabled or not self.formats:
+            # 不预生成时直接推送
+            self._notify(mp_ids)
+            return
+        with self._lock:
+            start = not self._pending
+            self._pending.update(mp_ids)
+            if self._queue is None:
+                from core.queue import TaskQueueManager
+                self._queue = TaskQueueManager(tag="RSS预生成")
+                self._queue.run_task_background()
+        if start:
+            self._queue.add_task(self.run)
+
+    def run(self) -> int:
+        """生成等待中的公众号相关的源, 返回生成的文件数"""
+        with self._lock:
+            mp_ids, self._pending = self._pending, set()
+        domain = self.domain
+        if not mp_ids or not domain:
+            return 0
+        from core.db import DB
+        session = DB.get_session_factory()()
+        count = 0
+        try:
+            for feed_id, tag_id in feed_targets(session, mp_ids):
+                for ext in self.formats:
+                    try:
+                        count += self.render(session, feed_id, tag_id, ext, domain)
+                    except Exception as e:
+                        print_error(f"RSS预生成失败[{tag_id or feed_id}.{ext}]: {e}")
+        finally:
+            session.close()
+        print_info(f"RSS预生成完成: {count}个文件")
+        self._notify(mp_ids)
+        return count
+
+    def _notify(self, mp_ids: set) -> None:
+        # 推送给WebSub订阅者, 推送内容读取上面生成的文件缓存
+        from core.websub import HUB
+        HUB.publish(mp_ids)
+
+    def render(self, session, feed_id: str, tag_id: str, ext: str, domain: str) -> int:
+        """生成一个源的第一页, 文件缓存已是当前版本时跳过, 返回写入的文件数"""
+        stmt = scope_stmt(feed_id, tag_id)
+        row = session.execute(stmt).scalars().first() if stmt is not None else None
+        scope = feed_scope(feed_id, tag_id, row, domain)
+        if scope is None:
+            return 0
+        channel, conditions, updated, _ = scope
+        # 与接口默认参数(/feed/{id}.{ext})的缓存键一致, ETag才能对上
+        self_link, hub_link = hub_links(feed_id, tag_id, ext)
+        params = (FEED_CACHE.make_key(feed_id, tag_id, ext, None, "", self.limit, 0, None, None, domain), hub_link)
+        etag = make_validators(params, session.execute(version_stmt(Article, conditions)).one(), updated)["ETag"]
+        rss = RSS(name=f'{tag_id}_{feed_id}_{self.limit}_0', ext=ext)
+        if rss.get_cache(etag=etag) is not None:
+            return 0
+        query, direction = apply_cursor(feed_query(conditions), None)
+        rows = session.execute(query.limit(self.limit + 1)).all()
+        articles, next_cursor, _ = cursor_page(rows, self.limit, direction, key=lambda row: row[1])
+        next_link = f"{domain}{feed_path(feed_id, tag_id, ext)}?cursor={next_cursor}" if next_cursor else None
+        content = "".join(rss.stream(feed_items(articles, domain), ext=ext, title=f"{channel.mp_name}", link=domain,
+                                     description=channel.mp_intro, image_url=channel.mp_cover, next_link=next_link,
+                                     self_link=self_link, hub_link=hub_link, tee=False))
+        rss.write_cache(content, etag=etag)
+        return 1
+
+    def content(self, session, feed_id: str, tag_id: str, ext: str, domain: str):
+        """源第一页的当前内容(不是当前版本时先生成), 返回(内容, 类型), 源不存在时内容为None"""
+        self.render(session, feed_id, tag_id, ext, domain)
+        rss = RSS(name=f'{tag_id}_{feed_id}_{self.limit}_0', ext=ext)
+        return rss.get_cache(), rss.get_type()
+
+MATERIALIZER = FeedMaterializer()
+
+# 源的ETag变化时预先重新生成: 文章增删改(正文填充、状态变化等)、公众号输出字段变化;
+# 采集时只更新公众号的同步时间不影响ETag, 不需要重新生成. 批量写入的新文章由采集完成回调提交
+_CHANNEL_FIELDS = ("mp_name", "mp_intro", "mp_cover")
+
+@event.listens_for(Session, "after_flush")
+def _collect_materialize(session, flush_context):
+    if not MATERIALIZER.enabled:
+        return
+    mp_ids = session.info.setdefault("materialize_mp_ids", set())
+    dirty = [o for o in session.dirty if session.is_modified(o)]
+    for obj in (*session.new, *session.deleted, *dirty):
+        if isinstance(obj, Article):
+            mp_id = inspect(obj).dict.get("mp_id")
+        elif isinstance(obj, Feed):
+            state = inspect(obj)
+            if obj in dirty and not any(state.attrs[name].history.has_changes() for name in _CHANNEL_FIELDS):
+                continue
+            mp_id = state.dict.get("id")
+        else:
+            continue
+        if mp_id:
+            mp_ids.add(mp_id)
+
+@event.listens_for(Session, "after_commit")
+def _schedule_materialize(session):
+    mp_ids = session.info.pop("materialize_mp_ids", None)
+    if mp_ids:
+        MATERIALIZER.schedule(mp_ids)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_materialize(session):
+    session.info.pop("materialize_mp_ids", None)
@@ -0,0 +1,310 @@
+import re
+import hmac
+import socket
+import hashlib
+import secrets
+import ipaddress
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit
+import requests
+from sqlalchemy import select, delete, func, or_
+from core.config import cfg
+from core.models.websub import WebSubSubscription
+from core.rss_render import scope_stmt, feed_targets, hub_links, base_url, MATERIALIZER
+from core.print import print_info, print_warning, print_error
+
+# 本服务作为自己RSS的WebSub hub(https://www.w3.org/TR/websub/)
+# 订阅: 订阅者POST /websub/hub, 后台向回调地址确认订阅意图(hub.challenge)后才保存订阅
+# 发布: 采集到新文章后找出受影响的源, 每个源生成一次内容推送给所有订阅者, 失败按指数退避重试
+# 回调地址由外部提交, 每次请求前都检查解析出的地址(不允许内网、回环、链路本地等), 不跟随重定向
+
+# 可以订阅的主题: {域名}feed/{公众号ID|all}.{ext} 和 {域名}feed/tag/{标签ID}.{ext}
+_TOPIC = re.compile(r"feed/(?:tag/(?P<tag>[^/]+)|(?P<feed>[^/]+))\.(?P<ext>[a-z]+)")
+FEED_EXTS = ("rss", "xml", "atom", "json", "md", "txt", "jmd")
+
+def topic_domains() -> list:
+    """本服务源地址使用的域名, 只用配置的rss.base_url"""
+    domain = base_url()
+    if not domain:
+        return []
+    return [domain if domain.endswith("/") else f"{domain}/"]
+
+def parse_topic(topic: str, domains: list):
+    """主题地址对应的源, 返回(feed_id, tag_id, ext); 协议、主机或路径前缀与本服务不一致等不是本服务的源时返回None"""
+    try:
+        parts = urlsplit(topic)
+        for domain in domains:
+            base = urlsplit(domain)
+            if (parts.scheme.lower(), parts.netloc.lower()) != (base.scheme.lower(), base.netloc.lower()):
+                continue
+            if not parts.path.startswith(base.path):
+                continue
+            match = _TOPIC.fullmatch(parts.path[len(base.path):])
+            if match is not None and match.group("ext") in FEED_EXTS:
+                return match.group("feed"), match.group("tag"), match.group("ext")
+    except ValueError:
+        pass
+    return None
+
+def callback_error(callback: str, allow_private: bool = False):
+    """检查回调地址, 返回错误信息, 可以访问时返回None
+
+    只允许http(s); 主机解析出的任一地址是私有、回环、链路本地、组播或保留地址时拒绝(allow_private为True时不检查)
+    """
+    try:
+        parts = urlsplit(callback or "")
+        port = parts.port
+    except ValueError:
+        return "hub.callback不是有效地址"
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        return "hub.callback必须是http(s)地址"
+    if allow_private:
+        return None
+    try:
+        infos = socket.getaddrinfo(parts.hostname, port or (443 if parts.scheme == "https" else 80), proto=socket.IPPROTO_TCP)
+    except (OSError, UnicodeError) as e:
+        return f"hub.callback无法解析: {e}"
+    for info in infos:
+        ip = ipaddress.ip_address(info[4][0].split("%")[0])
+        if ip.version == 6 and ip.ipv4_mapped is not None:
+            ip = ip.ipv4_mapped
+        if not ip.is_global or ip.is_multicast:
+            return "hub.callback不能指向内网地址"
+    return None
+
+def subscription_id(callback: str, topic: str) -> str:
+    return hashlib.sha1(f"{callback}\n{topic}".encode("utf-8")).hexdigest()
+
+class WebSubHub:
+    """WebSub hub: 处理订阅请求、确认订阅意图、推送更新"""
+    def __init__(self):
+        self.enabled = str(cfg.get("websub.enabled", True)).lower() in ("true", "1", "yes")
+        self.workers = int(cfg.get("websub.workers", 4) or 4)
+        self.timeout = float(cfg.get("websub.timeout", 10) or 10)
+        self.retries = int(cfg.get("websub.retries", 3))
+        self.retry_delay = float(cfg.get("websub.retry_delay", 30) or 30)
+        self.lease_seconds = int(cfg.get("websub.lease_seconds", 864000) or 864000)
+        self.max_lease_seconds = int(cfg.get("websub.max_lease_seconds", 2592000) or 2592000)
+        self.max_subscriptions = int(cfg.get("websub.max_subscriptions", 1000) or 0)
+        self.max_pending = int(cfg.get("websub.max_pending", 100) or 0)
+        self.allow_private = str(cfg.get("websub.allow_private", False)).lower() in ("true", "1", "yes")
+        self._pool = None
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @property
+    def pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="websub")
+            return self._pool
+
+    def _session(self):
+        from core.db import DB
+        return DB.get_session_factory()()
+
+    def request(self, mode: str, topic: str, callback: str, lease_seconds: int = None, secret: str = None) -> str:
+        """接收订阅/取消订阅请求, 校验通过后在后台确认订阅意图(会解析回调域名, 不要在事件循环中调用)
+
+        Returns:
+            错误信息, 校验通过时返回None(接口返回202)
+        """
+        if not self.enabled:
+            return "WebSub未启用"
+        domains = topic_domains()
+        if not domains:
+            return "未配置rss.base_url, WebSub不可用"
+        if mode not in ("subscribe", "unsubscribe"):
+            return f"不支持的hub.mode: {mode}"
+        if len(topic or "") > 500 or len(callback or "") > 500:
+            return "hub.topic或hub.callback过长"
+        target = parse_topic(topic or "", domains)
+        if target is None:
+            return "hub.topic不是本服务的源"
+        if secret is not None and len(secret.encode("utf-8")) >= 200:
+            return "hub.secret必须小于200字节"
+        error = callback_error(callback, self.allow_private)
+        if error:
+            return error
+        lease = min(max(int(lease_seconds or self.lease_seconds), 60), self.max_lease_seconds)
+        # 限制等待确认的请求数, 避免被用来批量向外发请求
+        with self._lock:
+            if self.max_pending and self._pending >= self.max_pending:
+                return "等待确认的订阅请求过多, 请稍后再试"
+            self._pending += 1
+        self.pool.submit(self._verify, mode, topic, callback, lease, secret or None, target)
+        return None
+
+    def _get(self, url: str, params: dict):
+        """向回调地址发送GET, 发送前重新检查解析出的地址, 不跟随重定向"""
+        error = callback_error(url, self.allow_private)
+        if error:
+            raise ValueError(error)
+        return requests.get(url, params=params, timeout=self.timeout, allow_redirects=False)
+
+    def _verify(self, mode: str, topic: str, callback: str, lease: int, secret: str, target: tuple) -> bool:
+        """向回调地址确认订阅意图, 订阅者原样返回hub.challenge时保存(或删除)订阅"""
+        feed_id, tag_id, ext = target
+        id = subscription_id(callback, topic)
+        session = self._session()
+        try:
+            exists = session.get(WebSubSubscription, id) is not None
+            if mode == "unsubscribe" and not exists:
+                # 没有订阅时不需要确认, 也不向回调地址发请求
+                return False
+            if mode == "subscribe":
+                stmt = scope_stmt(feed_id, tag_id)
+                if stmt is not None and session.execute(stmt).scalars().first() is None:
+                    self._deny(topic, callback, "源不存在")
+                    return False
+                if not exists and self.max_subscriptions and \
+                        session.scalar(select(func.count()).select_from(WebSubSubscription)) >= self.max_subscriptions:
+                    print_warning(f"WebSub订阅数已达上限({self.max_subscriptions}), 忽略订阅: {callback}")
+                    return False
+            challenge = secrets.token_urlsafe(24)
+            params = {"hub.mode": mode, "hub.topic": topic, "hub.challenge": challenge}
+            if mode == "subscribe":
+                params["hub.lease_seconds"] = lease
+            try:
+                response = self._get(callback, params)
+            except Exception as e:
+                print_warning(f"WebSub确认订阅失败[{callback}]: {e}")
+                return False
+            if not 200 <= response.status_code < 300 or response.text.strip() != challenge:
+                print_warning(f"WebSub订阅者未确认[{callback}]: {response.status_code}")
+                return False
+            if mode == "unsubscribe":
+                session.execute(delete(WebSubSubscription).where(WebSubSubscription.id == id))
+                session.commit()
+                print_info(f"WebSub取消订阅: {topic} -> {callback}")
+                return True
+            now = datetime.now().replace(microsecond=0)
+            sub = session.get(WebSubSubscription, id)
+            if sub is None:
+                sub = WebSubSubscription(id=id, topic=topic, callback=callback, created_at=now)
+                session.add(sub)
+            sub.feed_id, sub.tag_id, sub.ext = feed_id, tag_id, ext
+            sub.secret = secret
+            sub.lease_seconds = lease
+            sub.expires_at = now + timedelta(seconds=lease)
+            sub.fail_count = 0
+            sub.updated_at = now
+            session.commit()
+            print_info(f"WebSub订阅成功: {topic} -> {callback}")
+            return True
+        except Exception as e:
+            session.rollback()
+            print_error(f"WebSub处理订阅失败: {e}")
+            return False
+        finally:
+            session.close()
+            with self._lock:
+                self._pending -= 1
+
+    def _deny(self, topic: str, callback: str, reason: str) -> None:
+        try:
+            self._get(callback, {"hub.mode": "denied", "hub.topic": topic, "hub.reason": reason})
+        except Exception as e:
+            print_warning(f"WebSub通知拒绝订阅失败[{callback}]: {e}")
+
+    def publish(self, mp_ids) -> None:
+        """公众号有新文章后在后台推送受影响的源"""
+        mp_ids = {str(mp_id) for mp_id in mp_ids if mp_id}
+        if self.enabled and mp_ids:
+            self.pool.submit(self._publish, mp_ids)
+
+    def _publish(self, mp_ids: set) -> int:
+        """每个有订阅的源生成一次内容后分发, 返回推送的订阅数"""
+        domain = MATERIALIZER.domain
+        if not domain:
+            print_warning("未配置rss.base_url, 跳过WebSub推送")
+            return 0
+        session = self._session()
+        count = 0
+        try:
+            now = datetime.now()
+            # 清理过期的订阅
+            session.execute(delete(WebSubSubscription).where(WebSubSubscription.expires_at < now))
+            session.commit()
+            targets = feed_targets(session, mp_ids)
+            feed_ids = [feed_id for feed_id, tag_id in targets if tag_id is None]
+            tag_ids = [tag_id for feed_id, tag_id in targets if tag_id is not None]
+            subs = session.execute(select(WebSubSubscription).where(
+                or_(WebSubSubscription.feed_id.in_(feed_ids), WebSubSubscription.tag_id.in_(tag_ids)))).scalars().all()
+            groups = {}
+            for sub in subs:
+                groups.setdefault((sub.feed_id, sub.tag_id, sub.ext), []).append(sub)
+            for (feed_id, tag_id, ext), group in groups.items():
+                try:
+                    content, media_type = MATERIALIZER.content(session, feed_id, tag_id, ext, domain)
+                except Exception as e:
+                    print_error(f"WebSub生成推送内容失败[{tag_id or feed_id}.{ext}]: {e}")
+                    continue
+                if content is None:
+                    continue
+                body = content.encode("utf-8")
+                _, hub = hub_links(feed_id, tag_id, ext)
+                for sub in group:
+                    self.pool.submit(self._deliver, sub.id, sub.callback, sub.topic, sub.secret, hub, body, media_type, 0)
+                    count += 1
+        except Exception as e:
+            session.rollback()
+            print_error(f"WebSub推送失败: {e}")
+        finally:
+            session.close()
+        if count:
+            print_info(f"WebSub推送: {count}个订阅")
+        return count
+
+    def _deliver(self, id: str, callback: str, topic: str, secret: str, hub: str, body: bytes, media_type: str, attempt: int) -> None:
+        """推送内容到订阅者, 失败时延迟后重新提交, 回调返回410时删除订阅"""
+        headers = {"Content-Type": media_type, "Link": f'<{hub}>; rel="hub", <{topic}>; rel="self"'}
+        if secret:
+            headers["X-Hub-Signature"] = "sha256=" + hmac.new(secret.encode("utf-8"), body, hashlib.sha256).hexdigest()
+        try:
+            error = callback_error(callback, self.allow_private)
+            if error:
+                raise ValueError(error)
+            response = requests.post(callback, data=body, headers=headers, timeout=self.timeout, allow_redirects=False)
+            if 200 <= response.status_code < 300:
+                self._record(id, True)
+                return
+            if response.status_code == 410:
+                self._record(id, None)
+                return
+            error = f"HTTP {response.status_code}"
+        except Exception as e:
+            error = str(e)
+        if attempt < self.retries:
+            timer = threading.Timer(self.retry_delay * 2 ** attempt, self.pool.submit,
+                                    args=(self._deliver, id, callback, topic, secret, hub, body, media_type, attempt + 1))
+            timer.daemon = True
+            timer.start()
+            return
+        print_warning(f"WebSub推送失败[{callback}]: {error}")
+        self._record(id, False)
+
+    def _record(self, id: str, ok) -> None:
+        """记录推送结果, ok为None表示订阅者已取消(410)"""
+        session = self._session()
+        try:
+            sub = session.get(WebSubSubscription, id)
+            if sub is None:
+                return
+            if ok is None:
+                session.delete(sub)
+            elif ok:
+                sub.fail_count = 0
+                sub.delivered_at = datetime.now().replace(microsecond=0)
+            else:
+                sub.fail_count = (sub.fail_count or 0) + 1
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            print_error(f"WebSub记录推送结果失败: {e}")
+        finally:
+            session.close()
+
+HUB = WebSubHub()
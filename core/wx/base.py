@@ -4,9 +4,8 @@ from core.models import Feed
 from driver.wx import DoSuccess
 from core.db import DB
 from core.models.feed import Feed
-from .cfg import cfg,wx_cfg
+from .cfg import cfg,wx_cfg,CREDENTIALS
 from core.print import print_error,print_info
-from core.rss import RSS
 from driver.success import setStatus
 import random
 # 定义一些常见的 User-Agent
@@ -63,6 +62,8 @@ class WxGather:
         return wx
     def __init__(self,is_add:bool=False):
         self.articles=[]
+        self._pending=[]
+        self._pending_callback=None
         self.is_add=is_add
         self._cookies={}
         session=  requests.Session()
@@ -71,13 +72,13 @@ class WxGather:
         self.session=session
         self.get_token()
     def get_token(self):
-        cfg.reload()
-        wx_cfg.reload()
+        # 授权信息在内存中缓存, 只在wx.lic/config.yaml变化或重新登录后重新读取
+        credential = CREDENTIALS.get()
         self.Gather_Content=cfg.get('gather.content',False)
-        self.cookies = wx_cfg.get('cookie', '')
-        self.token=wx_cfg.get('token','')
+        self.cookies = credential.cookie
+        self.token=credential.token
         # 随机选择一个 User-Agent
-        self.user_agent = cfg.get('user_agent', '')
+        self.user_agent = credential.user_agent
         user_agent = random.choice(USER_AGENTS)
         self.user_agent=user_agent
         self.headers = {
@@ -129,10 +130,32 @@ class WxGather:
                 }
                 if 'digest' in data:
                     art['description']=data['digest']
+                bulk=getattr(CallBack,"bulk",None)
+                if bulk is not None:
+                    # 支持批量写入的回调: 先缓冲, 每页结束时由Flush统一写入
+                    self._pending.append((art,Ext_Data))
+                    self._pending_callback=bulk
+                    return
                 if CallBack(art):
                     art["ext"]=Ext_Data
                     # art.pop("content")
                     self.articles.append(art)
+    def Flush(self):
+        """将FillBack缓冲的文章通过批量回调一次写入"""
+        pending=getattr(self,'_pending',None)
+        if not pending:
+            return
+        self._pending=[]
+        try:
+            saved=self._pending_callback([art for art,_ in pending])
+        except Exception as e:
+            print_error(f"批量写入文章失败: {e}")
+            return
+        saved_ids={id(art) for art in saved}
+        for art,ext_data in pending:
+            if id(art) in saved_ids:
+                art["ext"]=ext_data
+                self.articles.append(art)
 
 
     #通过公众号码平台接口查询公众号
@@ -181,6 +204,7 @@ class WxGather:
     
     def Start(self,mp_id=None):
         self.articles=[]
+        self._pending=[]
         self.get_token()
         if self.token=="" or self.token is None:
              self.Error("请先扫码登录公众号平台")
@@ -193,6 +217,7 @@ class WxGather:
 
     def Item_Over(self,item=None,CallBack=None):
         print(f"item end")
+        self.Flush()
         _cookies=[{'name': c.name, 'value': c.value, 'domain': c.domain,'expiry':c.expires,'expires':c.expires} for c in self._cookies]
         _cookies.append({'name':'token','value':self.token})
         if len(_cookies) > 0:   
@@ -215,15 +240,10 @@ class WxGather:
         # raise Exception(error)
 
     def Over(self,CallBack=None):
+        self.Flush()
         if getattr(self, 'articles', None) is not None:
             print(f"成功{len(self.articles)}条")
-            rss=RSS()
-            mp_id=""
-            try:
-                mp_id=self.articles[0]['mp_id']
-            except:
-                pass
-            rss.clear_cache(mp_id=mp_id)  
+        # 文章写入时已按公众号清除内存缓存并安排重新生成RSS, 文件缓存按ETag校验, 这里不再删除
         if CallBack is not None:
             CallBack(self.articles)
 
@@ -1 +1 @@
-from driver.token import wx_cfg,cfg
\ No newline at end of file
+from driver.token import wx_cfg,cfg,CREDENTIALS
\ No newline at end of file
@@ -143,7 +143,6 @@ def get_list(faker_id:str=None,mp_id:str=None,is_add:bool=False):
     try:
         data=data['publish_page']['publish_list']
         wx_db=db.Db(tag="获取公众号列表")
-        wx_db.init(cfg.get('db'))
         for i in data:
             art=i['publish_info']
             art=json.loads(art)
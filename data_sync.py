@@ -1,7 +1,7 @@
 import os
 import importlib
 from typing import Dict, Type
-from sqlalchemy import create_engine, MetaData, inspect
+from sqlalchemy import create_engine, MetaData, inspect, text, bindparam
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.exc import SQLAlchemyError
@@ -193,6 +193,11 @@ class DatabaseSynchronizer:
                         return False
                     continue
             
+            self.migrate_article_contents()
+            self.sync_indexes()
+            self.sync_search_index()
+            self.sync_article_stats()
+            self.sync_memberships()
             self.logger.info("模型同步完成")
             return True
         except SQLAlchemyError as e:
@@ -210,6 +215,192 @@ class DatabaseSynchronizer:
             if self.engine:
                 self.engine.dispose()
 
+    def migrate_article_contents(self, batch_size: int = 200) -> int:
+        """把旧版本articles.content中的正文迁移到压缩存储的article_contents表
+
+        迁移后清空articles.content, 返回迁移的文章数量
+        """
+        from sqlalchemy import text
+        from core.common.compress import compress_text, content_hash
+        from datetime import datetime
+        inspector = inspect(self.engine)
+        if not inspector.has_table("articles") or not inspector.has_table("article_contents"):
+            return 0
+        if "content" not in {c["name"] for c in inspector.get_columns("articles")}:
+            return 0
+        count = 0
+        try:
+            while True:
+                with self.engine.begin() as conn:
+                    rows = conn.execute(text(
+                        "SELECT id, content FROM articles WHERE content IS NOT NULL AND content_hash IS NULL LIMIT :limit"
+                    ), {"limit": batch_size}).fetchall()
+                    if not rows:
+                        break
+                    now = datetime.now().replace(microsecond=0)
+                    for id, content in rows:
+                        if content:
+                            codec, data = compress_text(content)
+                            conn.execute(text("DELETE FROM article_contents WHERE id = :id"), {"id": id})
+                            conn.execute(text(
+                                "INSERT INTO article_contents (id, codec, data, size, updated_at) VALUES (:id, :codec, :data, :size, :updated_at)"
+                            ), {"id": id, "codec": codec, "data": data, "size": len(content.encode("utf-8")), "updated_at": now})
+                            conn.execute(text("UPDATE articles SET content_hash = :hash, content = NULL WHERE id = :id"),
+                                         {"hash": content_hash(content), "id": id})
+                        else:
+                            conn.execute(text("UPDATE articles SET content = NULL WHERE id = :id"), {"id": id})
+                    count += len(rows)
+                self.logger.info(f"已迁移文章正文: {count}")
+        except SQLAlchemyError as e:
+            self.logger.error(f"迁移文章正文失败: {e}")
+        if count and "sqlite" in self.db_url:
+            self.logger.info("正文迁移完成, 可执行 VACUUM 回收SQLite数据库空间")
+        return count
+
+    def backfill_url_hash(self, batch_size: int = 500) -> int:
+        """为已有文章补全url_hash, 重复链接只保留第一篇, 其余保持为空以便建立唯一索引"""
+        from core.common.compress import content_hash
+        inspector = inspect(self.engine)
+        if "url_hash" not in {c["name"] for c in inspector.get_columns("articles")}:
+            self.logger.warning("articles表缺少url_hash字段, 请先执行模型同步")
+            return 0
+        count = 0
+        last_id = ""
+        try:
+            while True:
+                with self.engine.begin() as conn:
+                    rows = conn.execute(text(
+                        "SELECT id, url FROM articles WHERE url_hash IS NULL AND url IS NOT NULL AND url <> '' AND id > :last_id ORDER BY id LIMIT :limit"
+                    ), {"last_id": last_id, "limit": batch_size}).fetchall()
+                    if not rows:
+                        break
+                    last_id = rows[-1][0]
+                    hashes = {}
+                    for id, url in rows:
+                        hashes.setdefault(content_hash(url), id)
+                    used = {r[0] for r in conn.execute(
+                        text("SELECT url_hash FROM articles WHERE url_hash IN :hashes").bindparams(bindparam("hashes", expanding=True)),
+                        {"hashes": list(hashes.keys())})}
+                    for url_hash, id in hashes.items():
+                        if url_hash in used:
+                            continue
+                        conn.execute(text("UPDATE articles SET url_hash = :hash WHERE id = :id"), {"hash": url_hash, "id": id})
+                        count += 1
+        except SQLAlchemyError as e:
+            self.logger.error(f"补全url_hash失败: {e}")
+        if count:
+            self.logger.info(f"已补全url_hash: {count}")
+        return count
+
+    def sync_indexes(self) -> bool:
+        """在线创建模型中定义、但数据库中缺失的索引
+
+        PostgreSQL 使用 CREATE INDEX CONCURRENTLY, MySQL 使用 ALGORITHM=INPLACE, LOCK=NONE,
+        建索引期间不阻塞读写; SQLite直接创建
+        """
+        from sqlalchemy.schema import CreateIndex
+        own_engine = self.engine is None
+        if own_engine:
+            self.engine = create_engine(self.db_url)
+        if not self.models:
+            self.load_models()
+        dialect = self.engine.dialect.name
+        ok = True
+        try:
+            inspector = inspect(self.engine)
+            tables = {model.__table__ for model in self.models.values()}
+            for table in tables:
+                if not inspector.has_table(table.name):
+                    continue
+                existing = {ix["name"] for ix in inspector.get_indexes(table.name)}
+                columns = {c["name"] for c in inspector.get_columns(table.name)}
+                for index in table.indexes:
+                    if index.name in existing:
+                        continue
+                    missing = [c.name for c in index.columns if c.name not in columns]
+                    if missing:
+                        self.logger.warning(f"跳过索引 {index.name}: 缺少字段 {missing}")
+                        continue
+                    if table.name == "articles" and "url_hash" in [c.name for c in index.columns]:
+                        self.backfill_url_hash()
+                    ddl = str(CreateIndex(index).compile(dialect=self.engine.dialect))
+                    if dialect == "postgresql":
+                        ddl = ddl.replace("CREATE INDEX", "CREATE INDEX CONCURRENTLY", 1)\
+                                 .replace("CREATE UNIQUE INDEX", "CREATE UNIQUE INDEX CONCURRENTLY", 1)
+                    elif dialect == "mysql":
+                        ddl = f"{ddl} ALGORITHM=INPLACE LOCK=NONE"
+                    try:
+                        # CONCURRENTLY不能在事务中执行
+                        with self.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                            conn.execute(text(ddl))
+                        self.logger.info(f"创建索引: {index.name}")
+                    except SQLAlchemyError as e:
+                        ok = False
+                        self.logger.error(f"创建索引 {index.name} 失败: {e}")
+        finally:
+            if own_engine:
+                self.engine.dispose()
+                self.engine = None
+        return ok
+
+    def sync_search_index(self) -> bool:
+        """创建文章全文索引表, 新建时为已有文章建立索引"""
+        from core.fts import FTS
+        if not FTS.enabled:
+            return False
+        own_engine = self.engine is None
+        if own_engine:
+            self.engine = create_engine(self.db_url)
+        try:
+            if FTS.ensure(self.engine):
+                self.logger.info("创建全文索引表, 开始建立索引")
+                FTS.rebuild(self.engine)
+            return True
+        except SQLAlchemyError as e:
+            self.logger.error(f"创建全文索引失败, 搜索将使用模糊匹配: {e}")
+            return False
+        finally:
+            if own_engine:
+                self.engine.dispose()
+                self.engine = None
+
+    def sync_article_stats(self) -> bool:
+        """文章统计表为空时全量计算一次"""
+        from core.article_lax import STATS, GLOBAL_STATS
+        own_engine = self.engine is None
+        if own_engine:
+            self.engine = create_engine(self.db_url)
+        try:
+            with self.engine.connect() as conn:
+                exists = conn.execute(text("SELECT mp_id FROM article_stats WHERE mp_id = :mp_id"), {"mp_id": GLOBAL_STATS}).first()
+            if exists is None:
+                STATS.recompute(self.engine)
+            return True
+        except SQLAlchemyError as e:
+            self.logger.error(f"计算文章统计失败: {e}")
+            return False
+        finally:
+            if own_engine:
+                self.engine.dispose()
+                self.engine = None
+
+    def sync_memberships(self) -> bool:
+        """标签/任务关联表为空时从mps_id的JSON生成"""
+        from core.memberships import MEMBERSHIPS
+        own_engine = self.engine is None
+        if own_engine:
+            self.engine = create_engine(self.db_url)
+        try:
+            MEMBERSHIPS.migrate(self.engine)
+            return True
+        except SQLAlchemyError as e:
+            self.logger.error(f"迁移标签关联表失败: {e}")
+            return False
+        finally:
+            if own_engine:
+                self.engine.dispose()
+                self.engine = None
+
 def main():
     # 示例使用 - 支持多种数据库
     # SQLite
@@ -223,7 +414,21 @@ def main():
     from core.config import cfg
     db_url=cfg.get("db","sqlite:///data/db.db")
     synchronizer = DatabaseSynchronizer(db_url=db_url)
-    synchronizer.sync()
+    # python data_sync.py -index True 只在线创建缺失的索引
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-index', help='只创建缺失的索引', default=False)
+    parser.add_argument('-search', help='重建文章全文索引', default=False)
+    args, _ = parser.parse_known_args()
+    if args.index == "True":
+        synchronizer.sync_indexes()
+    elif args.search == "True":
+        from core.fts import FTS
+        engine = create_engine(db_url)
+        FTS.rebuild(engine)
+        engine.dispose()
+    else:
+        synchronizer.sync()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
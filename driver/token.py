@@ -1,4 +1,8 @@
 from core.config import Config,cfg
+from core.print import print_error
+from collections import namedtuple
+import threading
+import time
 # 确保data目录和wx.lic文件存在
 import os
 lic_path="./data/wx.lic"
@@ -8,6 +12,80 @@ if not os.path.exists(lic_path):
         f.write("{}")
 wx_cfg = Config(lic_path)
 
+# 微信授权信息
+Credential = namedtuple("Credential", ["token", "cookie", "expiry", "user_agent"])
+
+class WxCredentials:
+    """微信授权信息(token/cookie/user_agent)的内存缓存
+
+    采集器每次创建都要读取授权信息, 这里只在wx.lic或config.yaml变化、或登录写入新授权时重新读取;
+    文件检查最多每check_interval秒一次(只比较修改时间), 授权变化时通知subscribe注册的回调(old, new)
+    """
+    def __init__(self, check_interval: float = 1):
+        self.check_interval = check_interval
+        self._state = None
+        self._versions = None
+        self._checked = 0
+        self._lock = threading.Lock()
+        self._listeners = []
+
+    def _load(self) -> Credential:
+        return Credential(
+            token=wx_cfg.get('token', ''),
+            cookie=wx_cfg.get('cookie', ''),
+            expiry=wx_cfg.get('expiry', {}),
+            user_agent=cfg.get('user_agent', ''),
+        )
+
+    def get(self, force: bool = False) -> Credential:
+        """当前授权信息, force为True时立即检查文件"""
+        changed = None
+        with self._lock:
+            now = time.monotonic()
+            if force or self._state is None or now - self._checked >= self.check_interval:
+                self._checked = now
+                # 文件未变化时reload只比较修改时间
+                wx_cfg.reload()
+                cfg.reload()
+                versions = (wx_cfg.version, cfg.version)
+                if versions != self._versions:
+                    old, self._state = self._state, self._load()
+                    self._versions = versions
+                    if old is not None and old != self._state:
+                        changed = (old, self._state)
+            state = self._state
+        if changed is not None:
+            self._publish(*changed)
+        return state
+
+    def invalidate(self) -> None:
+        """授权写入后调用, 下次get时重新读取"""
+        with self._lock:
+            self._versions = None
+            self._checked = 0
+
+    def refresh(self) -> Credential:
+        """立即重新读取并通知变化"""
+        self.invalidate()
+        return self.get(force=True)
+
+    def subscribe(self, callback) -> None:
+        """注册授权变化回调 callback(old: Credential, new: Credential)"""
+        self._listeners.append(callback)
+
+    def unsubscribe(self, callback) -> None:
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def _publish(self, old: Credential, new: Credential) -> None:
+        for callback in list(self._listeners):
+            try:
+                callback(old, new)
+            except Exception as e:
+                print_error(f"授权变化通知失败: {e}")
+
+CREDENTIALS = WxCredentials()
+
 def set_token(data:any,ext_data:any=None):
 
     """
@@ -16,14 +94,17 @@ def set_token(data:any,ext_data:any=None):
     """
     if data.get("token", "") == "":
         return
-    wx_cfg.set("token", data.get("token", ""))
-    wx_cfg.set("cookie", data.get("cookies_str", ""))
-    wx_cfg.set("expiry", data.get("expiry", {}))
+    values = {
+        "token": data.get("token", ""),
+        "cookie": data.get("cookies_str", ""),
+        "expiry": data.get("expiry", {}),
+    }
     if ext_data is not None:
-        wx_cfg.set("ext_data", ext_data)
+        values["ext_data"] = ext_data
         print(ext_data)
-    wx_cfg.save_config()
-    wx_cfg.reload()
+    # 一次写入wx.lic
+    wx_cfg.update(values)
+    CREDENTIALS.refresh()
     from jobs.notice import sys_notice
     sys_notice(f"""WeRss授权成功
                - Token: {data.get("token")}
@@ -15,6 +15,12 @@ def UpdateArticle(art:dict,check_exist=False):
         mps_count=mps_count+1
         return True
     return False
+def UpdateArticles(arts:list[dict])->list[dict]:
+    """批量写入一页文章, 返回其中新增的文章"""
+    new_ids=set(DB.add_articles_bulk(arts))
+    return [art for art in arts if DB.article_id(art) in new_ids]
+# 采集器(WxGather.FillBack)发现回调带有bulk时, 按页缓冲文章后批量写入
+UpdateArticle.bulk=UpdateArticles
 def Update_Over(data=None):
-    print("更新完成")
-    pass
\ No newline at end of file
+    # 相关RSS的重新生成和WebSub推送在文章写入时安排(Db.add_articles_bulk和ORM提交)
+    print("更新完成")
\ No newline at end of file
@@ -68,10 +68,9 @@ def add_job(feeds:list[Feed]=None,task:MessageTask=None,isTest=False):
         print(f"{feed.mp_name}，加入队列成功")
     print_success(TaskQueue.get_queue_info())
     pass
-import json
+from core.memberships import task_mp_ids
 def get_feeds(task:MessageTask=None):
-     mps = json.loads(task.mps_id)
-     ids=",".join([item["id"]for item in mps])
+     ids=",".join(task_mp_ids(task))
      mps=wx_db.get_mps_list(ids)
      if len(mps)==0:
         mps=wx_db.get_all_mps()
@@ -97,6 +96,8 @@ def run(job_id:str=None,isTest=False):
             pass
     return tasks
 def start_job(job_id:str=None):
+    # 定时任务进程也需要感知config.yaml的修改
+    cfg.watch(cfg.get("config_watch_interval", 5))
     from .taskmsg import get_message_task
     tasks=get_message_task(job_id)
     if not tasks:
@@ -111,6 +112,9 @@ def start_job(job_id:str=None):
       
         job_id=scheduler.add_cron_job(add_job,cron_expr=cron_exp,args=[get_feeds(task),task],job_id=str(task.id),tag="定时采集")
         print(f"已添加任务: {job_id}")
+    #定时全量重算文章统计，修复增量统计的偏差
+    from core.article_lax import STATS
+    scheduler.add_cron_job(STATS.recompute,cron_expr=cfg.get("article.stats_cron","30 3 * * *"),job_id="article_stats",tag="统计修复")
     scheduler.start()
     print("启动任务")
 def start_all_task():
@@ -11,6 +11,47 @@ from core.config import cfg
 from bs4 import BeautifulSoup
 from core.content_format import format_content
 import re
+
+# 未设置消息模板时使用的默认模板
+DEFAULT_MESSAGE_TEMPLATE = """
+### {{feed.mp_name}} 订阅消息：
+{% if articles %}
+{% for article in articles %}
+- [**{{ article.title }}**]({{article.url}}) ({{ article.publish_time }})\n
+{% endfor %}
+{% else %}
+- 暂无文章\n
+{% endif %}
+    """
+
+DEFAULT_WEBHOOK_TEMPLATE = """{
+  "feed": {
+    "id": "{{ feed.id }}",
+    "name": "{{ feed.mp_name }}"
+  },
+  "articles": [
+    {% if articles %}
+     {% for article in articles %}
+        {
+          "id": "{{ article.id }}",
+          "mp_id": "{{ article.mp_id }}",
+          "title": "{{ article.title }}",
+          "pic_url": "{{ article.pic_url }}",
+          "url": "{{ article.url }}",
+          "description": "{{ article.description }}",
+          "publish_time": "{{ article.publish_time }}"
+        }{% if not loop.last %},{% endif %}
+      {% endfor %}
+    {% endif %}
+  ],
+  "task": {
+    "id": "{{ task.id }}",
+    "name": "{{ task.name }}"
+  },
+  "now": "{{ now }}"
+}
+"""
+
 @dataclass
 class MessageWebHook:
     task: MessageTask
@@ -28,16 +69,7 @@ def send_message(hook: MessageWebHook) -> str:
     返回:
         str: 格式化后的消息内容
     """
-    template = hook.task.message_template if hook.task.message_template else """
-### {{feed.mp_name}} 订阅消息：
-{% if articles %}
-{% for article in articles %}
-- [**{{ article.title }}**]({{article.url}}) ({{ article.publish_time }})\n
-{% endfor %}
-{% else %}
-- 暂无文章\n
-{% endif %}
-    """
+    template = hook.task.message_template if hook.task.message_template else DEFAULT_MESSAGE_TEMPLATE
     parser = TemplateParser(template)
     data = {
         "feed": hook.feed,
@@ -64,33 +96,7 @@ def call_webhook(hook: MessageWebHook) -> str:
     异常:
         ValueError: 当webhook调用失败时抛出
     """
-    template = hook.task.message_template if hook.task.message_template else """{
-  "feed": {
-    "id": "{{ feed.id }}",
-    "name": "{{ feed.mp_name }}"
-  },
-  "articles": [
-    {% if articles %}
-     {% for article in articles %}
-        {
-          "id": "{{ article.id }}",
-          "mp_id": "{{ article.mp_id }}",
-          "title": "{{ article.title }}",
-          "pic_url": "{{ article.pic_url }}",
-          "url": "{{ article.url }}",
-          "description": "{{ article.description }}",
-          "publish_time": "{{ article.publish_time }}"
-        }{% if not loop.last %},{% endif %}
-      {% endfor %}
-    {% endif %}
-  ],
-  "task": {
-    "id": "{{ task.id }}",
-    "name": "{{ task.name }}"
-  },
-  "now": "{{ now }}"
-}
-"""
+    template = hook.task.message_template if hook.task.message_template else DEFAULT_WEBHOOK_TEMPLATE
     
     # 检查template是否需要content
     template_needs_content = "content" in template.lower()
@@ -137,13 +143,12 @@ def call_webhook(hook: MessageWebHook) -> str:
     
     parser = TemplateParser(template)
     
-    payload = parser.render(data)
-    # logger.info(payload)
-
     # 检查web_hook_url是否为空
     if not hook.task.web_hook_url:
         logger.error("web_hook_url为空")
         return 
+    # 边渲染边发送(分块传输)，不在内存中拼接完整请求体
+    payload = (chunk.encode("utf-8") for chunk in parser.render_iter(data))
     # 发送webhook请求
     import requests
     # print_success(f"发送webhook请求{payload}")
@@ -158,6 +163,22 @@ def call_webhook(hook: MessageWebHook) -> str:
     except Exception as e:
         raise ValueError(f"Webhook调用失败: {str(e)}")
 
+def load_contents(articles:list)->dict:
+    """一次IN查询读取Article对象中未加载的正文, 返回{文章ID: 正文}, 避免逐篇懒加载"""
+    from sqlalchemy import inspect, select
+    from core.models.article import ArticleContent
+    from core.common.compress import decompress_text
+    ids=[article.id for article in articles
+         if isinstance(article,Article) and article.content_hash is not None and "body" in inspect(article).unloaded]
+    if not ids:
+        return {}
+    from core.db import DB
+    contents=dict.fromkeys(ids)
+    with DB.get_engine().connect() as conn:
+        for row in conn.execute(select(ArticleContent.id,ArticleContent.codec,ArticleContent.data).where(ArticleContent.id.in_(ids))):
+            contents[row.id]=decompress_text(row.codec,row.data)
+    return contents
+
 def web_hook(hook:MessageWebHook):
     """
     根据消息类型路由到对应的处理函数
@@ -178,6 +199,7 @@ def web_hook(hook:MessageWebHook):
             # raise ValueError("没有更新到文章")
             logger.warning("没有更新到文章")
             return 
+        contents = load_contents(hook.articles)
         for article in hook.articles:
             if isinstance(article, dict):
                 # 如果是字典类型，直接使用
@@ -189,6 +211,7 @@ def web_hook(hook:MessageWebHook):
                     )
                     for field in Article.__table__.columns
                 }
+                processed_article["content"]=article.get("content","")
             else:
                 # 如果是Article对象，使用getattr获取属性
                 processed_article = {
@@ -199,6 +222,7 @@ def web_hook(hook:MessageWebHook):
                     )
                     for field in Article.__table__.columns
                 }
+                processed_article["content"]=contents[article.id] if article.id in contents else article.content
             processed_articles.append(processed_article)
         
         hook.articles = processed_articles
@@ -0,0 +1,94 @@
+"""测试公共配置
+
+core.config在导入时读取当前目录下的config.yaml并按其中的db创建全局引擎,
+所以在收集测试(导入core模块)之前切换到临时目录, 写入只包含测试数据库的配置
+"""
+import os
+import sys
+import tempfile
+import uuid
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORK_DIR = tempfile.mkdtemp(prefix="we-mp-rss-test-")
+
+
+def pytest_sessionstart(session):
+    with open(os.path.join(WORK_DIR, "config.yaml"), "w", encoding="utf-8") as f:
+        # health_interval为0时不启动后台健康检查线程
+        f.write(f"db: sqlite:///{WORK_DIR}/data/db.db\ndb_pool:\n  health_interval: 0\n")
+    # web.py按相对路径挂载static目录
+    os.symlink(os.path.join(ROOT, "static"), os.path.join(WORK_DIR, "static"))
+    os.chdir(WORK_DIR)
+    sys.path.insert(0, ROOT)
+
+
+@pytest.fixture(scope="session")
+def db():
+    """建表并准备全文索引、文章统计"""
+    from core.db import DB
+    from core.fts import FTS
+    from core.article_lax import STATS
+    DB.create_tables()
+    FTS.ensure(DB.get_engine())
+    STATS.recompute()
+    return DB
+
+
+@pytest.fixture
+def session(db):
+    session = db.get_session_factory()()
+    yield session
+    session.close()
+
+
+@pytest.fixture(scope="session")
+def client(db):
+    from fastapi.testclient import TestClient
+    import web
+    return TestClient(web.app)
+
+
+@pytest.fixture
+def api_client(client):
+    """跳过登录校验的接口客户端"""
+    from apis.auth import get_current_user
+    client.app.dependency_overrides[get_current_user] = lambda: {"username": "admin"}
+    yield client
+    client.app.dependency_overrides.pop(get_current_user, None)
+
+
+@pytest.fixture
+def config(monkeypatch):
+    """临时修改配置快照, 测试结束后恢复, 不写入config.yaml"""
+    from core.config import cfg
+    def set(key, value):
+        monkeypatch.setitem(cfg._values, key, value)
+    return set
+
+
+@pytest.fixture
+def feed(session):
+    """新建一个公众号, 每个测试使用自己的ID避免数据互相影响"""
+    from core.models import Feed
+    item = Feed(id=f"MP_WXS_{uuid.uuid4().hex[:8]}", mp_name="测试公众号", mp_intro="简介",
+                mp_cover="cover.png", faker_id="faker", status=1)
+    session.add(item)
+    session.commit()
+    return item
+
+
+def make_articles(mp_id: str, count: int, start: int = 0, **fields) -> list:
+    """生成采集格式的文章数据"""
+    articles = []
+    for i in range(start, start + count):
+        article = {"id": str(i), "mp_id": mp_id, "title": f"文章{i}", "url": f"https://mp.example/{mp_id}/{i}",
+                   "content": f"<p>正文{i}</p>", "publish_time": 1700000000 + i}
+        article.update(fields)
+        articles.append(article)
+    return articles
+
+
+def article_id(mp_id: str, id) -> str:
+    return f"{mp_id}-{id}".replace("MP_WXS_", "")
@@ -0,0 +1,38 @@
+import pytest
+
+from core.common.compress import CODEC_RAW, CODEC_ZLIB, DEFAULT_CODEC, compress_text, content_hash, decompress_text
+from core.models import Article
+from core.models.article import ArticleContent
+
+
+@pytest.mark.parametrize("codec", [DEFAULT_CODEC, CODEC_ZLIB, CODEC_RAW])
+def test_compress_round_trip(codec):
+    text = "<p>正文内容</p>" * 50
+    used, data = compress_text(text, codec)
+    assert decompress_text(used, data) == text
+
+
+def test_body_is_stored_compressed_in_separate_table(db, session, feed):
+    text = "<p>很长的正文</p>" * 200
+    session.add(Article(id="content-1", mp_id=feed.id, title="t", url="https://x/content-1", publish_time=1, status=1, content=text))
+    session.commit()
+
+    body = session.get(ArticleContent, "content-1")
+    assert body.codec == DEFAULT_CODEC
+    assert body.size == len(text.encode("utf-8"))
+    assert len(body.data) < body.size
+    article = session.get(Article, "content-1")
+    assert article.content_hash == content_hash(text)
+    assert article.content == text
+    assert session.query(Article).filter(Article.id == "content-1", Article.content != None).count() == 1
+
+
+def test_clearing_content_removes_body(db, session, feed):
+    session.add(Article(id="content-2", mp_id=feed.id, title="t", url="https://x/content-2", publish_time=1, status=1, content="正文"))
+    session.commit()
+    article = session.get(Article, "content-2")
+    article.content = None
+    session.commit()
+
+    assert session.get(ArticleContent, "content-2") is None
+    assert session.query(Article).filter(Article.id == "content-2", Article.content == None).count() == 1
@@ -0,0 +1,50 @@
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from conftest import article_id, make_articles
+from core.article_lax import COUNTERS, STATS
+from core.models import Article, DATA_STATUS
+
+
+def counters(mp_id):
+    row = STATS.get(mp_id)
+    return {c: row[c] for c in ("total", "has_content", "wrong", "deleted")}
+
+
+def test_incremental_stats(db, session, feed):
+    db.add_articles_bulk(make_articles(feed.id, 2) + make_articles(feed.id, 1, start=2, content=""))
+    assert counters(feed.id) == {"total": 3, "has_content": 2, "wrong": 0, "deleted": 0}
+    assert STATS.get(feed.id)["last_publish_time"] == 1700000002
+
+    # 覆盖更新补上正文
+    db.add_articles_bulk(make_articles(feed.id, 1, start=2), update=True)
+    assert counters(feed.id)["has_content"] == 3
+
+    session.add(Article(id="stats-orm", mp_id=feed.id, title="t", url="https://x/stats-orm", publish_time=1, status=1))
+    session.commit()
+    article = session.get(Article, "stats-orm")
+    article.status = DATA_STATUS.DELETED
+    session.commit()
+    assert counters(feed.id) == {"total": 4, "has_content": 3, "wrong": 1, "deleted": 1}
+
+    session.delete(session.get(Article, article_id(feed.id, 0)))
+    session.commit()
+    assert counters(feed.id) == {"total": 3, "has_content": 2, "wrong": 1, "deleted": 1}
+
+    incremental = STATS.get()
+    recomputed = STATS.recompute()
+    assert {c: incremental[c] for c in COUNTERS} == {c: recomputed[c] for c in COUNTERS}
+
+
+def test_failed_flush_is_not_counted(db, session, feed):
+    session.add(Article(id="stats-dup", mp_id=feed.id, title="a", url="https://x/stats-dup-1", publish_time=1, status=1))
+    session.commit()
+    session.add(Article(id="stats-dup", mp_id=feed.id, title="b", url="https://x/stats-dup-2", publish_time=2, status=1))
+    with pytest.raises(IntegrityError):
+        session.commit()
+    session.rollback()
+    assert "article_stats" not in session.info
+
+    session.add(Article(id="stats-next", mp_id=feed.id, title="c", url="https://x/stats-next", publish_time=3, status=1))
+    session.commit()
+    assert counters(feed.id)["total"] == session.query(Article).filter(Article.mp_id == feed.id).count() == 2
@@ -0,0 +1,40 @@
+import asyncio
+from unittest import mock
+
+from sqlalchemy import select
+
+from conftest import article_id, make_articles
+from core.async_db import AsyncDb, ThreadedSession, async_url
+from core.models import Article
+
+
+def test_async_url_maps_drivers():
+    with mock.patch("core.async_db.importlib.util.find_spec", return_value=object()):
+        assert async_url("sqlite:///data/db.db") == "sqlite+aiosqlite:///data/db.db"
+        assert async_url("mysql+pymysql://u:p@h/db") == "mysql+asyncmy://u:p@h/db"
+        assert async_url("postgresql://u:p@h/db") == "postgresql+asyncpg://u:p@h/db"
+    with mock.patch("core.async_db.importlib.util.find_spec", return_value=None):
+        assert async_url("sqlite:///data/db.db") is None
+
+
+def test_threaded_session_without_driver(db, feed):
+    db.add_articles_bulk(make_articles(feed.id, 2))
+    adb = AsyncDb(db)
+    with mock.patch("core.async_db.async_url", return_value=None):
+        async def run():
+            async with adb.session() as session:
+                assert isinstance(session, ThreadedSession)
+                result = await session.execute(select(Article.id).where(Article.mp_id == feed.id).order_by(Article.id))
+                return result.scalars().all()
+        assert asyncio.run(run()) == [article_id(feed.id, 0), article_id(feed.id, 1)]
+
+
+def test_article_endpoints(api_client, db, feed):
+    db.add_articles_bulk(make_articles(feed.id, 3))
+    data = api_client.get(f"/api/v1/wx/articles?mp_id={feed.id}&limit=2&has_content=true").json()["data"]
+    assert data["total"] == 3
+    assert [a["id"] for a in data["list"]] == [article_id(feed.id, 2), article_id(feed.id, 1)]
+    assert {a["mp_name"] for a in data["list"]} == {"测试公众号"}
+    assert data["list"][0]["content"]
+    detail = api_client.get(f"/api/v1/wx/articles/{article_id(feed.id, 0)}").json()["data"]
+    assert detail["content"] == "<p>正文0</p>"
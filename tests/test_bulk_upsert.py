@@ -0,0 +1,51 @@
+from unittest import mock
+
+from conftest import article_id, make_articles
+from core.models import Article
+from core.models.base import DATA_STATUS
+
+
+def test_insert_then_skip_existing(db, session, feed):
+    articles = make_articles(feed.id, 3)
+    assert db.add_articles_bulk(articles) == [article_id(feed.id, i) for i in range(3)]
+    # 默认跳过已存在的文章
+    changed = make_articles(feed.id, 4, title="新标题")
+    assert db.add_articles_bulk(changed) == [article_id(feed.id, 3)]
+    assert session.get(Article, article_id(feed.id, 0)).title == "文章0"
+    assert session.get(Article, article_id(feed.id, 0)).content == "<p>正文0</p>"
+
+
+def test_duplicates_in_batch_and_taken_urls_are_skipped(db, session, feed):
+    articles = make_articles(feed.id, 2)
+    # 同一批次内ID重复以最后一条为准
+    articles.append(dict(articles[0], title="最后一条"))
+    # 链接被其它文章占用
+    articles.append(dict(make_articles(feed.id, 1, start=9)[0], url=articles[1]["url"]))
+    assert sorted(db.add_articles_bulk(articles)) == [article_id(feed.id, 0), article_id(feed.id, 1)]
+    assert session.get(Article, article_id(feed.id, 0)).title == "最后一条"
+    assert session.get(Article, article_id(feed.id, 9)) is None
+
+
+def test_update_overwrites_but_keeps_deleted_status(db, session, feed):
+    db.add_articles_bulk(make_articles(feed.id, 2))
+    article = session.get(Article, article_id(feed.id, 0))
+    article.status = DATA_STATUS.DELETED
+    session.commit()
+
+    assert db.add_articles_bulk(make_articles(feed.id, 2, title="更新", content="<p>新正文</p>"), update=True) == []
+    session.expire_all()
+    deleted = session.get(Article, article_id(feed.id, 0))
+    assert deleted.title == "更新"
+    assert deleted.status == DATA_STATUS.DELETED
+    assert deleted.content == "<p>新正文</p>"
+    assert session.get(Article, article_id(feed.id, 1)).status == DATA_STATUS.ACTIVE
+
+
+def test_failed_batch_is_rolled_back(db, session, feed):
+    with mock.patch("core.db.FTS.index_ids", side_effect=RuntimeError("boom")), \
+            mock.patch("core.db.CONTENT_STORE.put") as put:
+        assert db.add_articles_bulk(make_articles(feed.id, 2)) == []
+    assert not put.called
+    assert session.get(Article, article_id(feed.id, 0)) is None
+    # 回滚后可以重新写入
+    assert len(db.add_articles_bulk(make_articles(feed.id, 2))) == 2
@@ -0,0 +1,52 @@
+import gzip
+
+import pytest
+
+from conftest import make_articles
+from core.common.compress import HTTP_ENCODINGS, brotli, http_compress, negotiate_encoding
+
+
+def test_negotiate_encoding():
+    assert negotiate_encoding("gzip") == "gzip"
+    assert negotiate_encoding("gzip;q=0") is None
+    assert negotiate_encoding("identity") is None
+    assert negotiate_encoding("") is None
+    assert negotiate_encoding("*") == HTTP_ENCODINGS[0]
+    assert negotiate_encoding("br, gzip") == HTTP_ENCODINGS[0]
+    assert negotiate_encoding("br;q=0, gzip") == "gzip"
+
+
+def test_gzip_output_is_stable():
+    assert http_compress("内容", "gzip") == http_compress("内容", "gzip")
+    assert gzip.decompress(http_compress("内容", "gzip")).decode("utf-8") == "内容"
+
+
+@pytest.mark.parametrize("accept", ["gzip"] + (["br"] if brotli else []))
+def test_feed_is_served_compressed(client, db, feed, accept):
+    db.add_articles_bulk(make_articles(feed.id, 20, description="摘要" * 50))
+    url = f"/feed/{feed.id}.json"
+    plain = client.get(url, headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+    assert plain.headers["vary"] == "Accept-Encoding"
+
+    # 第一次生成和命中内存缓存都按请求压缩
+    for _ in range(2):
+        response = client.get(url, headers={"Accept-Encoding": accept})
+        assert response.headers["content-encoding"] == accept
+        assert response.text == plain.text
+        assert response.headers["vary"] == "Accept-Encoding"
+        # content为解压后的内容, 按实际传输的字节数比较
+        assert response.num_bytes_downloaded < len(plain.content)
+
+    not_modified = client.get(url, headers={"Accept-Encoding": accept, "If-None-Match": response.headers["etag"]})
+    assert not_modified.status_code == 304
+
+
+def test_small_feeds_are_not_compressed(client, feed):
+    url = f"/feed/{feed.id}.json"
+    # 第一次流式生成由GZipMiddleware压缩, Vary只出现一次
+    first = client.get(url, headers={"Accept-Encoding": "gzip"})
+    assert first.headers["vary"] == "Accept-Encoding"
+    cached = client.get(url, headers={"Accept-Encoding": "gzip"})
+    assert cached.text == first.text
+    assert "content-encoding" not in cached.headers
@@ -0,0 +1,94 @@
+import os
+import time
+from unittest import mock
+
+import pytest
+
+from core.config import Config
+
+
+@pytest.fixture
+def path(tmp_path, monkeypatch):
+    monkeypatch.setenv("WE_RSS_TEST_PORT", "8081")
+    path = tmp_path / "config.yaml"
+    path.write_text("app_name: 测试\nserver:\n  port: ${WE_RSS_TEST_PORT}\n  debug: 'True'\n"
+                    "  name: ${WE_RSS_TEST_MISSING:-默认}\nlist: [1, 2]\n", encoding="utf-8")
+    return path
+
+
+def rewrite(path, text):
+    # 修改时间精度不够时保证mtime变化
+    stat = os.stat(path)
+    path.write_text(text, encoding="utf-8")
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+
+def test_snapshot_lookups(path):
+    config = Config(str(path))
+    assert config.get("app_name") == "测试"
+    assert config.get("server.port") == 8081
+    assert config.get("server.debug") is True
+    assert config.get("server.name") == "默认"
+    assert config.get("server")["port"] == "8081"
+    assert config.get("server.missing", 5) == 5
+    config.get("list").append(3)
+    assert config.get("list") == [1, 2]
+
+
+def test_reload_only_when_changed(path):
+    config = Config(str(path))
+    version = config.version
+    with mock.patch("builtins.open", side_effect=AssertionError("不应重新读取")):
+        config.reload()
+    assert config.version == version
+
+    rewrite(path, "app_name: 新名字\n")
+    config.reload()
+    assert config.get("app_name") == "新名字"
+    assert config.get("server.port") is None
+    # 文件损坏时保留上一次的配置
+    rewrite(path, "app_name: [\n")
+    config.reload()
+    assert config.get("app_name") == "新名字"
+
+
+def test_set_and_update_save_atomically(path):
+    config = Config(str(path))
+    config.set("app_name", "改名")
+    config.update({"token": "abc", "interval": "10"})
+    assert (config.get("app_name"), config.get("token"), config.get("interval")) == ("改名", "abc", 10)
+    assert Config(str(path)).get("token") == "abc"
+    assert os.listdir(path.parent) == ["config.yaml"]
+
+    # 写入失败时原文件不变, 临时文件被清理
+    with mock.patch("os.replace", side_effect=OSError("disk full")), pytest.raises(OSError):
+        config.set("app_name", "写入失败")
+    assert Config(str(path)).get("app_name") == "改名"
+    assert os.listdir(path.parent) == ["config.yaml"]
+
+
+def test_watcher(path):
+    config = Config(str(path))
+    # 加载配置不启动后台线程
+    assert config._watcher is None
+    config.watch(0)
+    assert config._watcher is None
+    config.watch(0.05)
+    watcher = config._watcher
+    config.watch(0.05)
+    assert config._watcher is watcher and watcher.is_alive()
+
+    rewrite(path, "app_name: 自动生效\n")
+    deadline = time.time() + 5
+    while config.get("app_name") != "自动生效" and time.time() < deadline:
+        time.sleep(0.05)
+    assert config.get("app_name") == "自动生效"
+
+
+def test_watcher_is_started_by_web_startup(config):
+    import web
+    from core.config import cfg
+    config("config_watch_interval", 7)
+    with mock.patch.object(cfg, "watch") as watch:
+        web.watch_config()
+    watch.assert_called_once_with(7)
@@ -0,0 +1,46 @@
+import os
+
+from conftest import article_id, make_articles
+from core.common.compress import content_hash
+from core.content_store import CONTENT_STORE, ContentStore
+from core.models import Article
+
+
+def test_put_is_content_addressed(tmp_path):
+    store = ContentStore(root=str(tmp_path))
+    text = '<p><img src="http://img/x.png"></p>'
+    hash = store.put(text)
+    assert hash == content_hash(text)
+    assert store.get(hash) == '<p><img src="/static/res/logo/http://img/x.png"></p>'
+    files = [name for _, _, names in os.walk(tmp_path) for name in names]
+    assert len(files) == 1 and files[0].startswith(hash)
+    # 内容相同的不再写入
+    assert store.put(text) == hash
+    assert [name for _, _, names in os.walk(tmp_path) for name in names] == files
+    assert store.get("0" * 64) is None
+
+
+def test_bodies_are_stored_at_ingest(db, session, feed):
+    db.add_articles_bulk(make_articles(feed.id, 1, content="<p>批量写入的正文</p>"))
+    assert CONTENT_STORE.get(content_hash("<p>批量写入的正文</p>")) == "<p>批量写入的正文</p>"
+
+    session.add(Article(id="store-orm", mp_id=feed.id, title="t", url="https://x/store-orm", publish_time=1, status=1,
+                        content="<p>ORM写入的正文</p>"))
+    session.commit()
+    assert CONTENT_STORE.get(content_hash("<p>ORM写入的正文</p>")) == "<p>ORM写入的正文</p>"
+
+
+def test_content_endpoint_falls_back_to_database(client, db, feed):
+    text = "<p>只在数据库中的正文</p>"
+    db.add_articles_bulk(make_articles(feed.id, 1, content=text))
+    for codec in CONTENT_STORE.CODECS:
+        if os.path.exists(CONTENT_STORE.path(content_hash(text), codec)):
+            os.remove(CONTENT_STORE.path(content_hash(text), codec))
+    assert CONTENT_STORE.get(content_hash(text)) is None
+
+    response = client.get(f"/rss/content/{article_id(feed.id, 0)}")
+    assert response.status_code == 200
+    assert "只在数据库中的正文" in response.text
+    # 读取后写回缓存
+    assert CONTENT_STORE.get(content_hash(text)) == text
+    assert client.get("/rss/content/not-exists").status_code == 404
@@ -0,0 +1,33 @@
+from conftest import make_articles
+from core.count_cache import COUNTS, CountCache
+from core.models import Article
+
+
+def test_make_key_normalizes_filters():
+    assert CountCache.make_key("articles", {"b": " x ", "a": 1, "c": None, "d": ""}) == ("articles", (("a", "1"), ("b", "x")))
+
+
+def test_set_skips_stale_generation():
+    cache = CountCache()
+    key = cache.make_key("t")
+    cache.set(key, 5, 0)
+    assert cache.get(key) == 5
+    cache.invalidate("t")
+    assert cache.get(key) is None
+    # 计数开始后表有写入, 旧结果不缓存
+    cache.set(key, 5, 0)
+    assert cache.get(key) is None
+
+
+def test_totals_follow_writes(api_client, db, session, feed):
+    def total():
+        return api_client.get(f"/api/v1/wx/articles?mp_id={feed.id}").json()["data"]["total"]
+    db.add_articles_bulk(make_articles(feed.id, 2))
+    assert total() == 2
+    assert COUNTS.get(COUNTS.make_key("articles", {"mp_id": feed.id})) == 2
+
+    db.add_articles_bulk(make_articles(feed.id, 1, start=2))
+    assert total() == 3
+    session.delete(session.query(Article).filter(Article.mp_id == feed.id).first())
+    session.commit()
+    assert total() == 2
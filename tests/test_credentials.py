@@ -0,0 +1,77 @@
+import os
+from unittest import mock
+
+import pytest
+
+from core.config import Config
+from driver import token
+from driver.token import WxCredentials
+
+
+@pytest.fixture
+def lic(tmp_path, monkeypatch):
+    """独立的wx.lic, 不读写data/wx.lic"""
+    path = tmp_path / "wx.lic"
+    path.write_text("token: t1\ncookie: c1\n", encoding="utf-8")
+    wx_cfg = Config(str(path))
+    monkeypatch.setattr(token, "wx_cfg", wx_cfg)
+    return path, wx_cfg
+
+
+def rewrite(path, text):
+    stat = os.stat(path)
+    path.write_text(text, encoding="utf-8")
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+
+def test_cached_until_files_change(lic, config):
+    path, wx_cfg = lic
+    config("user_agent", "ua")
+    credentials = WxCredentials(check_interval=0)
+    changes = []
+    credentials.subscribe(lambda old, new: changes.append((old.token, new.token)))
+    assert credentials.get() == ("t1", "c1", {}, "ua")
+
+    with mock.patch.object(wx_cfg, "get_config", wraps=wx_cfg.get_config) as parsed:
+        for _ in range(100):
+            assert credentials.get().token == "t1"
+        assert parsed.call_count == 0
+        rewrite(path, "token: t2\ncookie: c2\n")
+        assert credentials.get().cookie == "c2"
+        assert parsed.call_count == 1
+    assert changes == [("t1", "t2")]
+
+
+def test_checks_are_throttled(lic):
+    path, wx_cfg = lic
+    credentials = WxCredentials(check_interval=3600)
+    assert credentials.get().token == "t1"
+    rewrite(path, "token: t2\n")
+    assert credentials.get().token == "t1"
+    assert credentials.get(force=True).token == "t2"
+
+
+def test_set_token_writes_once_and_refreshes(lic, monkeypatch):
+    path, wx_cfg = lic
+    credentials = WxCredentials(check_interval=3600)
+    monkeypatch.setattr(token, "CREDENTIALS", credentials)
+    assert credentials.get().token == "t1"
+    with mock.patch.object(wx_cfg, "save_config", wraps=wx_cfg.save_config) as saved, \
+            mock.patch("jobs.notice.sys_notice"):
+        token.set_token({"token": "new", "cookies_str": "k=v", "expiry": {"expiry_time": "2030-01-01"}})
+    assert saved.call_count == 1
+    assert credentials.get()[:2] == ("new", "k=v")
+    assert Config(str(path)).get("token") == "new"
+    # 没有token时不写入
+    token.set_token({"token": ""})
+    assert credentials.get().token == "new"
+
+
+def test_gatherers_use_cached_credentials(lic, monkeypatch):
+    from core.wx import base
+    credentials = WxCredentials(check_interval=3600)
+    monkeypatch.setattr(base, "CREDENTIALS", credentials)
+    with mock.patch.object(lic[1], "get_config", wraps=lic[1].get_config) as parsed:
+        gatherers = [base.WxGather() for _ in range(50)]
+    assert parsed.call_count == 0
+    assert {(gather.token, gather.cookies) for gather in gatherers} == {("t1", "c1")}
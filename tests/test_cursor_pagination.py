@@ -0,0 +1,70 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from conftest import article_id, make_articles
+from core.models.article import Article
+from core.models.base import Base
+from core.pagination import apply_cursor, cursor_page, decode_cursor, encode_cursor
+
+
+@pytest.fixture
+def memory_session():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(engine)()
+    # 发布时间有重复, 按(publish_time, id)排序
+    for i in range(7):
+        session.add(Article(id=f"a{i}", mp_id="m", title=str(i), url=f"u{i}", publish_time=100 + i // 2, status=1))
+    session.commit()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def page(session, cursor, limit=3):
+    query, direction = apply_cursor(session.query(Article), cursor)
+    rows, next_cursor, prev_cursor = cursor_page(query.limit(limit + 1).all(), limit, direction, has_before=bool(cursor))
+    return [row.id for row in rows], next_cursor, prev_cursor
+
+
+def test_cursor_round_trip_and_invalid():
+    assert decode_cursor(encode_cursor(5, "1-2", "prev")) == (5, "1-2", "prev")
+    for bad in ("!!bad", encode_cursor(5, "x", "sideways"), "e30"):
+        with pytest.raises(ValueError):
+            decode_cursor(bad)
+
+
+def test_walk_next_and_prev(memory_session):
+    expected = [a.id for a in memory_session.query(Article).order_by(Article.publish_time.desc(), Article.id.desc())]
+    pages, cursor, prevs = [], None, []
+    while True:
+        ids, cursor, prev = page(memory_session, cursor)
+        pages.append(ids)
+        prevs.append(prev)
+        if not cursor:
+            break
+    assert [id for ids in pages for id in ids] == expected
+    assert [len(ids) for ids in pages] == [3, 3, 1]
+    assert prevs[0] is None
+    # 从第二页向前翻回到第一页
+    ids, next_cursor, prev = page(memory_session, prevs[1])
+    assert ids == pages[0]
+    assert prev is None and next_cursor
+
+
+def test_feed_follows_next_links(client, db, feed):
+    db.add_articles_bulk(make_articles(feed.id, 5))
+    seen, url = [], f"/feed/{feed.id}.json?limit=2"
+    while url:
+        data = client.get(url).json()
+        seen.extend(item["id"] for item in data["items"])
+        url = data.get("next")
+    assert seen == [article_id(feed.id, i) for i in reversed(range(5))]
+
+
+def test_malformed_cursor_is_rejected(client, api_client, feed):
+    assert client.get(f"/feed/{feed.id}.xml?cursor=!!bad").status_code == 406
+    response = api_client.get("/api/v1/wx/articles?cursor=!!bad")
+    assert response.status_code == 406
+    assert response.json()["detail"]["code"] == 40001
@@ -0,0 +1,35 @@
+from sqlalchemy import create_engine, event
+
+from core.db import DbHealth
+
+
+def test_probe_counts_success_and_failure(tmp_path):
+    health = DbHealth(create_engine(f"sqlite:///{tmp_path}/ok.db"), name="ok", interval=0)
+    assert health.probe() is True
+    assert health.stats()["probes"] == 1
+    assert health.stats()["failures"] == 0
+
+    broken = DbHealth(create_engine(f"sqlite:///{tmp_path}/missing/dir/x.db"), name="broken", interval=0)
+    assert broken.probe() is False
+    stats = broken.stats()
+    assert stats["healthy"] is False
+    assert stats["failures"] == 1
+    assert stats["last_error"]
+
+
+def test_interval_zero_does_not_start_thread(tmp_path):
+    health = DbHealth(create_engine(f"sqlite:///{tmp_path}/ok.db"), name="ok", interval=0)
+    health.start()
+    assert health._thread is None
+
+
+def test_get_session_does_not_probe(db):
+    statements = []
+    def count(conn, cursor, statement, *args):
+        statements.append(statement)
+    event.listen(db.get_engine(), "before_cursor_execute", count)
+    try:
+        db.get_session()
+    finally:
+        event.remove(db.get_engine(), "before_cursor_execute", count)
+    assert statements == []
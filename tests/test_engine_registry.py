@@ -0,0 +1,22 @@
+from core.db import DB, ENGINES, Db, EngineRegistry
+
+
+def test_db_instances_share_one_engine(db):
+    other = Db(tag="测试")
+    assert other.get_engine() is DB.get_engine()
+    stats = ENGINES.stats()
+    assert stats["tags"]["测试"]["instances"] >= 1
+    assert len(stats["pools"]) == 1
+    # 重复init同一连接串不会创建新的连接池
+    other.init(DB.connection_str)
+    assert other.get_engine() is DB.get_engine()
+
+
+def test_registry_masks_password_and_disposes(tmp_path):
+    assert EngineRegistry._mask("mysql+pymysql://u:secret@h/db") == "mysql+pymysql://u:***@h/db"
+    registry = EngineRegistry()
+    url = f"sqlite:///{tmp_path}/a.db"
+    engine = registry.get_engine(url)
+    assert registry.get_engine(url) is engine
+    registry.dispose_all()
+    assert registry.stats()["pools"] == {}
@@ -0,0 +1,56 @@
+import sqlite3
+import time
+
+from conftest import make_articles
+from core.rss_cache import FEED_CACHE, FeedCache
+
+
+def test_invalidate_only_affected_entries():
+    cache = FeedCache()
+    cache.put(("a",), "A", "text/xml", feeds={"m1"})
+    cache.put(("b",), "B", "text/xml", feeds={"m2"})
+    cache.put(("all",), "ALL", "text/xml", feeds=None)
+    cache.invalidate_feeds({"m1"})
+    assert cache.get(("a",)) is None
+    assert cache.get(("all",)) is None
+    assert cache.get(("b",))[0] == "B"
+
+
+def test_put_skips_results_generated_before_a_write():
+    cache = FeedCache()
+    version = cache.version
+    cache.invalidate_feeds({"m1"})
+    cache.put(("a",), "A", "text/xml", feeds={"m1"}, version=version)
+    assert cache.get(("a",)) is None
+
+
+def test_feed_hits_and_invalidation(client, db, feed):
+    db.add_articles_bulk(make_articles(feed.id, 1))
+    url = f"/feed/{feed.id}.json"
+    first = client.get(url)
+    hits = FEED_CACHE.stats()["hits"]
+    second = client.get(url)
+    assert FEED_CACHE.stats()["hits"] == hits + 1
+    assert second.text == first.text
+
+    db.add_articles_bulk(make_articles(feed.id, 1, start=1, title="新文章"))
+    assert "新文章" in client.get(url).text
+
+
+def test_writes_from_other_processes_are_seen(client, db, feed):
+    db.add_articles_bulk(make_articles(feed.id, 1))
+    url = f"/feed/{feed.id}.json"
+    first = client.get(url)
+    assert client.get(url).headers["etag"] == first.headers["etag"]
+
+    # 不经过本进程SQLAlchemy会话的写入
+    conn = sqlite3.connect(db.get_engine().url.database)
+    conn.execute("INSERT INTO articles (id, mp_id, title, url, publish_time, status, created_at, updated_at) "
+                 "VALUES (?, ?, ?, ?, ?, 1, datetime('now', '+1 minute'), datetime('now', '+1 minute'))",
+                 (f"ext-{feed.id}", feed.id, "其它进程写入", f"https://x/ext-{feed.id}", int(time.time())))
+    conn.commit()
+    conn.close()
+
+    third = client.get(url)
+    assert "其它进程写入" in third.text
+    assert third.headers["etag"] != first.headers["etag"]
@@ -0,0 +1,45 @@
+from sqlalchemy import event
+
+from conftest import make_articles
+from core.feed_meta import FEED_META, FeedMetaCache
+from core.models import Feed
+
+
+def count_queries(db):
+    statements = []
+    def count(conn, cursor, statement, *args):
+        statements.append(statement)
+    event.listen(db.get_engine(), "before_cursor_execute", count)
+    return statements, lambda: event.remove(db.get_engine(), "before_cursor_execute", count)
+
+
+def test_lookups_are_batched_and_cached(db, session, feed):
+    cache = FeedMetaCache()
+    feed_id = feed.id
+    statements, stop = count_queries(db)
+    try:
+        metas = cache.get_many(session, [feed_id, "MP_WXS_missing", feed_id])
+        assert len(statements) == 1
+        assert metas[feed_id].mp_name == "测试公众号"
+        assert "MP_WXS_missing" not in metas
+        # 不存在的公众号也缓存
+        cache.get_many(session, [feed_id, "MP_WXS_missing"])
+        assert len(statements) == 1
+    finally:
+        stop()
+
+
+def test_writes_invalidate(api_client, db, session, feed):
+    db.add_articles_bulk(make_articles(feed.id, 1))
+    def names():
+        data = api_client.get(f"/api/v1/wx/articles?mp_id={feed.id}").json()["data"]
+        return {article["mp_name"] for article in data["list"]}
+    assert names() == {"测试公众号"}
+    assert feed.id in FEED_META._data
+
+    item = session.get(Feed, feed.id)
+    item.mp_name = "改名后的公众号"
+    session.commit()
+    assert feed.id not in FEED_META._data
+    assert names() == {"改名后的公众号"}
+    assert db.get_faker_id(feed.id) == "faker"
@@ -0,0 +1,53 @@
+import time
+
+from conftest import article_id, make_articles
+from core.models import Article, Feed
+from core.wx.base import WxGather
+
+
+def revalidate(client, url, response):
+    return client.get(url, headers={"If-None-Match": response.headers["etag"]})
+
+
+def test_conditional_requests(client, db, feed):
+    db.add_articles_bulk(make_articles(feed.id, 1))
+    url = f"/feed/{feed.id}.xml"
+    first = client.get(url)
+    assert first.status_code == 200
+    assert first.headers["etag"] and first.headers["last-modified"]
+
+    assert revalidate(client, url, first).status_code == 304
+    assert client.get(url, headers={"If-None-Match": f'"other", {first.headers["etag"]}'}).status_code == 304
+    assert client.get(url, headers={"If-Modified-Since": first.headers["last-modified"]}).status_code == 304
+    assert client.get(url, headers={"If-Modified-Since": "Thu, 01 Jan 1970 00:00:00 GMT"}).status_code == 200
+    # 参数不同的请求有各自的ETag
+    assert client.get(f"{url}?limit=1").headers["etag"] != first.headers["etag"]
+
+
+def test_etag_tracks_content_not_gather_touches(client, db, session, feed):
+    db.add_articles_bulk(make_articles(feed.id, 1, content=""))
+    url = f"/feed/{feed.id}.json"
+    first = client.get(url)
+
+    # 采集时只更新公众号的同步时间
+    WxGather().update_mps(feed.id, Feed(sync_time=int(time.time()), update_time=int(time.time())))
+    assert revalidate(client, url, first).status_code == 304
+
+    # 标题没有变化不算修改
+    article = session.get(Article, article_id(feed.id, 0))
+    article.title = article.title
+    session.commit()
+    assert revalidate(client, url, first).status_code == 304
+
+    # 补全正文
+    article = session.get(Article, article_id(feed.id, 0))
+    article.content = "<p>新填充的正文</p>"
+    session.commit()
+    filled = revalidate(client, url, first)
+    assert filled.status_code == 200
+    assert "新填充的正文" in filled.text
+
+    item = session.get(Feed, feed.id)
+    item.mp_intro = "新的简介"
+    session.commit()
+    assert revalidate(client, url, filled).status_code == 200
@@ -0,0 +1,46 @@
+import os
+import time
+from unittest import mock
+
+from core.common.compress import content_hash
+from core.content_format import FORMAT_CACHE, FormatCache, format_content
+
+
+def test_format_content_is_cached():
+    html = "<h1>标题</h1><p>格式缓存的正文</p>"
+    with mock.patch("core.content_format._format_content", wraps=lambda c, f: f"{f}:{c}") as convert:
+        first = format_content(html, "markdown")
+        assert format_content(html, "markdown") == first
+        assert convert.call_count == 1
+        # 缓存按正文哈希和格式区分
+        format_content(html, "text")
+        assert convert.call_count == 2
+        # html原样返回, 不经过缓存
+        format_content(html, "html")
+        format_content(html, "html")
+        assert convert.call_count == 4
+    assert FORMAT_CACHE.get(content_hash(html), "markdown") == first
+
+
+def test_real_conversion():
+    assert format_content("<p>格式缓存</p>", "text") == "格式缓存"
+    assert format_content("<h1>T</h1>", "markdown").strip() == "# T"
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = FormatCache()
+    cache.root = str(tmp_path)
+    cache.max_bytes = 1500
+    text = os.urandom(600).hex()
+    a, b, c = "a" * 64, "b" * 64, "c" * 64
+    cache.put(a, "text", text)
+    time.sleep(0.01)
+    cache.put(b, "text", text)
+    time.sleep(0.01)
+    # 命中时更新使用时间, 最久未使用的变为b
+    assert cache.get(a, "text") == text
+    time.sleep(0.01)
+    cache.put(c, "text", text)
+    assert cache.get(b, "text") is None
+    assert cache.get(a, "text") == text
+    assert cache.get(c, "text") == text
@@ -0,0 +1,75 @@
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+
+from conftest import article_id, make_articles
+from apis.base import format_search_kw
+from core.fts import FTS, tokenize
+from core.models import Article
+from core.models.base import Base
+
+
+def search(session, mp_id, keyword):
+    return sorted(a.id for a in session.query(Article).filter(Article.mp_id == mp_id, format_search_kw(keyword)))
+
+
+def test_tokenize_splits_cjk_into_bigrams():
+    assert tokenize("深度学习 GPT4") == ["深度", "度学", "学习", "gpt4"]
+
+
+def test_match_follows_orm_changes(db, session, feed):
+    db.add_articles_bulk([
+        dict(make_articles(feed.id, 1, start=0)[0], title="人工智能周报", content="<p>深度学习 模型训练</p>"),
+        dict(make_articles(feed.id, 1, start=1)[0], title="Hello World", content="<b>大语言模型</b>"),
+    ])
+    first, second = article_id(feed.id, 0), article_id(feed.id, 1)
+    assert search(session, feed.id, "智能") == [first]
+    assert search(session, feed.id, "学习") == [first]
+    assert search(session, feed.id, "hello") == [second]
+    assert search(session, feed.id, "学习|语言模型") == [first, second]
+    # 单个汉字走模糊匹配
+    assert search(session, feed.id, "周") == [first]
+
+    article = session.get(Article, second)
+    article.content = "机器翻译"
+    session.commit()
+    assert search(session, feed.id, "语言模型") == []
+    assert search(session, feed.id, "翻译") == [second]
+
+    session.delete(session.get(Article, second))
+    session.commit()
+    assert search(session, feed.id, "翻译") == []
+
+
+def test_order_by_rank(db, session, feed):
+    db.add_articles_bulk([
+        dict(make_articles(feed.id, 1, start=0)[0], title="水果行情", content="香蕉 橘子 苹果 梨 葡萄 西瓜", publish_time=300),
+        dict(make_articles(feed.id, 1, start=1)[0], title="苹果", content="苹果 苹果", description="苹果", publish_time=100),
+        dict(make_articles(feed.id, 1, start=2)[0], title="其它", content="苹果 苹果", description="苹果", publish_time=200),
+    ])
+    # 语料太少时bm25的IDF接近0, 补充一些不相关的文章
+    db.add_articles_bulk(make_articles(feed.id, 20, start=10, title="填充", content="别的内容"))
+
+    query = FTS.order_by_rank(select(Article.id).where(Article.mp_id == feed.id, format_search_kw("苹果")), "苹果")
+    assert session.execute(query).scalars().all() == [article_id(feed.id, i) for i in (1, 2, 0)]
+
+
+def test_feed_search_is_ranked(client, db, feed):
+    db.add_articles_bulk([
+        dict(make_articles(feed.id, 1, start=0)[0], title="普通", content="量子", publish_time=300),
+        dict(make_articles(feed.id, 1, start=1)[0], title="量子计算", content="量子 量子计算 量子", description="量子", publish_time=100),
+    ])
+    db.add_articles_bulk(make_articles(feed.id, 20, start=10, title="填充", content="别的内容"))
+    items = client.get(f"/feed/search/量子/{feed.id}.json").json()["items"]
+    assert [item["id"] for item in items] == [article_id(feed.id, 1), article_id(feed.id, 0)]
+
+
+def test_orm_writes_on_single_connection_engine(db):
+    # 内存库所有会话共用一个连接, 写入后检查索引表不能另开连接(归还时的回滚会撤销写入)
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(engine)()
+    session.add(Article(id="a0", mp_id="m", title="标题", url="u0", publish_time=100, status=1))
+    session.commit()
+    assert session.query(Article).count() == 1
+    session.close()
+    engine.dispose()
@@ -0,0 +1,30 @@
+import os
+
+from sqlalchemy import create_engine, inspect, text
+
+from conftest import ROOT
+from data_sync import DatabaseSynchronizer
+
+
+def test_sync_indexes_backfills_url_hash_and_creates_indexes(tmp_path):
+    url = f"sqlite:///{tmp_path}/old.db"
+    engine = create_engine(url)
+    with engine.begin() as conn:
+        # 升级前的articles表: 有url_hash字段但没有索引, 且存在重复链接
+        conn.execute(text("CREATE TABLE articles (id VARCHAR(255) PRIMARY KEY, mp_id VARCHAR(255), title VARCHAR(1000), "
+                          "pic_url VARCHAR(500), url VARCHAR(500), description TEXT, status INTEGER, publish_time INTEGER, "
+                          "created_at DATETIME, updated_at DATETIME, is_export INTEGER, url_hash VARCHAR(64), content_hash VARCHAR(64))"))
+        conn.execute(text("INSERT INTO articles (id, mp_id, url, publish_time, status) VALUES "
+                          "('a', 'm', 'https://x/1', 1, 1), ('b', 'm', 'https://x/1', 2, 1), ('c', 'm', 'https://x/2', 3, 1)"))
+
+    assert DatabaseSynchronizer(url, models_dir=os.path.join(ROOT, "core", "models")).sync_indexes()
+
+    indexes = {ix["name"]: ix for ix in inspect(engine).get_indexes("articles")}
+    assert {"ix_articles_mp_id_publish_time", "ix_articles_status_publish_time", "ix_articles_updated_at"} <= set(indexes)
+    assert indexes["ux_articles_url_hash"]["unique"]
+    with engine.connect() as conn:
+        hashes = dict(conn.execute(text("SELECT id, url_hash FROM articles")).all())
+    # 重复链接只保留第一篇
+    assert hashes["a"] and hashes["c"]
+    assert hashes["b"] is None
+    engine.dispose()
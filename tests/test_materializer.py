@@ -0,0 +1,45 @@
+from unittest import mock
+
+from conftest import make_articles
+from core.rss import RSS
+from core.rss_render import MATERIALIZER, hub_links
+from core.wx.base import WxGather
+
+
+def test_no_base_url_skips_materialize(client, db, feed):
+    db.add_articles_bulk(make_articles(feed.id, 1))
+    with mock.patch.object(MATERIALIZER, "run") as run:
+        MATERIALIZER.schedule({feed.id})
+    assert not run.called
+    assert not MATERIALIZER._pending
+    assert hub_links(feed.id) == (None, None)
+    # 请求的Host不会成为预生成和推送使用的域名
+    response = client.get(f"/feed/{feed.id}.rss", headers={"Host": "evil.example"})
+    assert response.status_code == 200
+    assert "link" not in response.headers
+    assert MATERIALIZER.domain is None
+
+
+def test_materialized_feed_is_served(client, config, db, feed):
+    db.add_articles_bulk(make_articles(feed.id, 1))
+    config("rss.base_url", "http://feeds.example/")
+    with mock.patch.object(MATERIALIZER, "_queue") as queue, mock.patch.object(MATERIALIZER, "_notify") as notify:
+        MATERIALIZER.schedule({feed.id})
+        queue.add_task.assert_called_once_with(MATERIALIZER.run)
+        assert MATERIALIZER.run() > 0
+    notify.assert_called_once_with({feed.id})
+
+    stored = RSS(name=f"None_{feed.id}_{MATERIALIZER.limit}_0", ext="rss").get_cache()
+    assert "http://feeds.example/" in stored
+    response = client.get(f"/feed/{feed.id}.rss", headers={"Host": "evil.example"})
+    assert response.text == stored
+    assert "evil.example" not in response.text
+
+
+def test_gather_over_keeps_cache_files():
+    rss = RSS(name="None_all_kept")
+    rss.write_cache("<rss/>", etag='"v"')
+    gather = WxGather()
+    gather.articles = []
+    gather.Over()
+    assert rss.get_cache() == "<rss/>"
@@ -0,0 +1,87 @@
+import json
+import uuid
+
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import sessionmaker
+
+from conftest import make_articles
+from core.memberships import MEMBERSHIPS, FeedMemberships, parse_mp_ids, task_mp_ids
+from core.models.base import Base
+from core.models.message_task import MessageTask
+from core.models.tags import TagFeed, Tags
+from core.rss_render import feed_targets
+
+
+def mps_id(*ids):
+    return json.dumps([{"id": id, "name": id} for id in ids])
+
+
+def test_parse_mp_ids():
+    assert parse_mp_ids('[{"id": "a"}, {"id": "b"}, {"id": "a"}, {"id": ""}]') == ["a", "b"]
+    assert parse_mp_ids('["a", 1]') == ["a", "1"]
+    assert parse_mp_ids("not json") == []
+    assert parse_mp_ids(None) == []
+
+
+def test_migrate_existing_json(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/m.db")
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(Tags), [{"id": "t0", "name": "old", "mps_id": mps_id("a", "b")}])
+    memberships = FeedMemberships()
+    memberships._engine = lambda: engine
+    assert memberships.ready()
+    assert memberships.tag_feeds("t0") == ["a", "b"]
+    assert memberships.feed_tags({"b"}) == {"t0"}
+    # 关联表已有数据时不再迁移
+    assert memberships.migrate(engine) == 0
+    engine.dispose()
+
+
+def test_orm_writes_sync_association_tables(client, db, session, feed):
+    tag_id = f"tag-{uuid.uuid4().hex[:8]}"
+    other = f"MP_WXS_{uuid.uuid4().hex[:8]}"
+    session.add(Tags(id=tag_id, name="标签", cover="/c", intro="", status=1, mps_id=mps_id(feed.id, other)))
+    session.commit()
+    assert sorted(MEMBERSHIPS.tag_feeds(tag_id)) == sorted([feed.id, other])
+    assert tag_id in MEMBERSHIPS.feed_tags({other})
+    assert (None, tag_id) in feed_targets(session, {feed.id})
+
+    db.add_articles_bulk(make_articles(feed.id, 1, title="标签里的文章"))
+    assert "标签里的文章" in client.get(f"/feed/tag/{tag_id}.json").text
+
+    tag = session.get(Tags, tag_id)
+    tag.mps_id = mps_id(other)
+    session.commit()
+    assert MEMBERSHIPS.tag_feeds(tag_id) == [other]
+    assert "标签里的文章" not in client.get(f"/feed/tag/{tag_id}.json").text
+
+    session.delete(session.get(Tags, tag_id))
+    session.commit()
+    assert MEMBERSHIPS.tag_feeds(tag_id) == []
+    assert session.execute(select(TagFeed).where(TagFeed.tag_id == tag_id)).first() is None
+
+
+def test_task_members(db, session, feed):
+    from jobs.mps import get_feeds
+    task = MessageTask(id=f"task-{uuid.uuid4().hex[:8]}", message_type=0, name="任务", message_template="",
+                       web_hook_url="", mps_id=mps_id(feed.id), status=0)
+    session.add(task)
+    session.commit()
+    assert task_mp_ids(task) == [feed.id]
+    assert [mp.id for mp in get_feeds(task)] == [feed.id]
+    session.delete(task)
+    session.commit()
+
+
+def test_orm_writes_on_single_connection_engine(db):
+    # 内存库所有会话共用一个连接, 同步关联表时不能另开连接
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(engine)()
+    session.add(Tags(id="t0", name="标签", cover="/c", intro="", status=1, mps_id=mps_id("a")))
+    session.commit()
+    assert session.query(Tags).count() == 1
+    assert session.execute(select(TagFeed.mp_id).where(TagFeed.tag_id == "t0")).scalars().all() == ["a"]
+    session.close()
+    engine.dispose()
@@ -0,0 +1,51 @@
+import json
+import os
+import re
+from datetime import datetime, timedelta, timezone
+from xml.dom import minidom
+
+import pytest
+
+from core.rss import RSS
+
+ITEMS = [
+    {"id": "1", "title": "a&b <c> \"q\"", "link": "http://x/?a=1&b=2", "description": "d\nline",
+     "content": "<p>hi ]]> there</p>", "image": "http://i/x.png", "mp_name": "m&n",
+     "updated": datetime(2024, 1, 2, 3, 4, 5, tzinfo=timezone(timedelta(hours=8))), "feed": {"id": "f"}},
+    {"id": "2", "title": "", "link": "l", "description": "", "content": "", "image": "", "mp_name": "",
+     "updated": datetime(2024, 1, 2, tzinfo=timezone(timedelta(hours=8))), "feed": None},
+]
+
+
+def normalize(text):
+    # 生成时间每次不同
+    return re.sub(r"(lastBuildDate>|<updated>)[^<]*<", r"\1<", text)
+
+
+@pytest.mark.parametrize("ext", ["rss", "atom", "json"])
+def test_stream_matches_generate(tmp_path, ext):
+    rss = RSS(name="stream", cache_dir=str(tmp_path), ext=ext)
+    kwargs = dict(ext=ext, title="T&", link="http://l/", next_link="http://n/?a=1&b=2")
+    streamed = "".join(rss.stream(ITEMS, tee=False, **kwargs))
+    assert normalize(streamed) == normalize(rss.generate(ITEMS, **kwargs))
+    if ext == "json":
+        assert [item["id"] for item in json.loads(streamed)["items"]] == ["1", "2"]
+    else:
+        minidom.parseString(streamed.encode("utf-8"))
+
+
+def test_tee_replaces_cache_only_when_complete(tmp_path):
+    rss = RSS(name="tee", cache_dir=str(tmp_path), ext="rss")
+    done = []
+    content = "".join(rss.stream(ITEMS, ext="rss", on_complete=done.append, etag='"v1"'))
+    assert done == [content]
+    assert rss.get_cache() == content
+    assert rss.get_cache(etag='"v1"') == content
+    assert rss.get_cache(etag='"v2"') is None
+
+    # 中途断开时丢弃临时文件, 保留原缓存
+    chunks = rss.stream(ITEMS[:1], ext="rss")
+    next(chunks)
+    chunks.close()
+    assert rss.get_cache() == content
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
@@ -0,0 +1,26 @@
+import json
+
+from tools import template_bench
+
+
+def test_outputs_match_golden():
+    # 1000篇的用例较慢, 只检查较小的规模
+    assert template_bench.check_golden(template_bench.CASES, [10, 100])
+
+
+def test_changed_output_is_reported():
+    template, make_context = template_bench.CASES["message"]
+    cases = {"message": (template + "!", make_context)}
+    assert not template_bench.check_golden(cases, [10])
+
+
+def test_compare_flags_regressions(tmp_path):
+    results = {"message": {"10": {"render": {"ops": 70.0}}}}
+    assert template_bench.compare(results, {"message": {"10": {"render": {"ops": 80.0}}}}, 0.2)
+    assert not template_bench.compare(results, {"message": {"10": {"render": {"ops": 100.0}}}}, 0.2)
+
+    baseline = tmp_path / "base.json"
+    assert template_bench.main(["-cases", "message", "-sizes", "10", "-rounds", "1", "-min_time", "0.001",
+                                "-save", str(baseline)]) == 0
+    assert json.loads(baseline.read_text())["message"]["10"]["render"]["ops"] > 0
+    assert template_bench.main(["-cases", "nope"]) == 2
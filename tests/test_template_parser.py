@@ -0,0 +1,69 @@
+import json
+import uuid
+from types import SimpleNamespace
+from unittest import mock
+
+import pytest
+
+from core.lax.template_parser import TemplateParser, compile_tokens
+from jobs.webhook import DEFAULT_MESSAGE_TEMPLATE, DEFAULT_WEBHOOK_TEMPLATE
+
+
+def render(template, context):
+    output = TemplateParser(template).render(context)
+    # 流式渲染的结果与一次性渲染相同
+    assert "".join(TemplateParser(template).render_iter(context)) == output
+    return output
+
+
+def test_loops_and_conditions():
+    template = ("{% for x in xs %}{{ loop.index }}/{{ loop.length }}:{{ x }}"
+                "{% if loop.first %}F{% endif %}{% if not loop.last %},{% endif %}{% endfor %}")
+    assert render(template, {"xs": ["a", "b", "c"]}) == "1/3:aF,\n2/3:b,\n3/3:c"
+    assert render("{% for x in xs %}{{ x }}{% endfor %}", {"xs": []}) == ""
+    assert render("{% if ok %}yes{% else %}no{% endif %}", {"ok": 1}) == "yes"
+    assert render("{% if ok %}yes{% else %}no{% endif %}", {"ok": 0}) == "no"
+    assert render("{% if user.admin %}管理员{% endif %}", {"user": {"admin": True}}) == "管理员"
+
+
+def test_variables():
+    feed = SimpleNamespace(mp_name="公众号", owner=None)
+    assert render("{{ feed.mp_name }}|{{ feed.owner.name }}|{{ missing }}|{{ a.b }}", {"feed": feed}) == "公众号|||"
+    assert render("a\n\n\n\nb   \n", {}) == "a\n\nb"
+
+
+def test_expressions_are_sandboxed():
+    assert render("{{= len(xs) * 2 }}", {"xs": [1, 2]}) == "4"
+    assert render("{{= open('config.yaml').read() }}", {}) == "[Error: Potentially dangerous expression detected]"
+    assert render("{{= __import__('os') }}", {}) == "[Error: Potentially dangerous expression detected]"
+    assert render("{{= 1 + }}", {}).startswith("[Error: invalid syntax")
+    assert render("{{= f(3) }}", {}) == "[Error: name 'f' is not defined]"
+    parser = TemplateParser("{{= double(3) }}")
+    parser.register_function("double", lambda x: x * 2)
+    assert parser.render({}) == "6"
+    with pytest.raises(ValueError):
+        TemplateParser("x").render({"bad key": 1})
+
+
+def test_default_templates():
+    feed = SimpleNamespace(id="MP_WXS_1", mp_name="公众号")
+    task = SimpleNamespace(id="task", name="任务")
+    articles = [{"id": f"a{i}", "mp_id": "MP_WXS_1", "title": f"文章{i}", "pic_url": "", "url": f"https://mp.example/{i}",
+                 "description": "", "publish_time": "2024-01-01"} for i in range(3)]
+    context = {"feed": feed, "articles": articles, "task": task, "now": "2024-01-01 00:00:00"}
+    payload = json.loads(render(DEFAULT_WEBHOOK_TEMPLATE, context))
+    assert [article["title"] for article in payload["articles"]] == ["文章0", "文章1", "文章2"]
+    assert payload["feed"] == {"id": "MP_WXS_1", "name": "公众号"}
+    assert json.loads(render(DEFAULT_WEBHOOK_TEMPLATE, {**context, "articles": []}))["articles"] == []
+
+    message = render(DEFAULT_MESSAGE_TEMPLATE, context)
+    assert "### 公众号 订阅消息：" in message and "[**文章2**](https://mp.example/2)" in message
+    assert "暂无文章" in render(DEFAULT_MESSAGE_TEMPLATE, {**context, "articles": []})
+
+
+def test_compiled_once_per_template():
+    template = f"{{{{ x }}}}-{uuid.uuid4().hex}"
+    with mock.patch("core.lax.template_parser.compile_tokens", wraps=compile_tokens) as compiled:
+        assert TemplateParser(template).render({"x": 1}).startswith("1-")
+        assert TemplateParser(template).render({"x": 2}).startswith("2-")
+    assert compiled.call_count == 1
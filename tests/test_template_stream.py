@@ -0,0 +1,68 @@
+import json
+import random
+from types import SimpleNamespace
+from unittest import mock
+
+from sqlalchemy import select
+
+from conftest import make_articles
+from core.lax.template_parser import TemplateParser, clean_chunks, clean_output
+from core.models import Article
+from jobs import webhook
+from test_feed_meta import count_queries
+
+TEXT = "  \n\n标题\n\n\n- 第一项\n\n- 第二项   \n\n   \n正文  \n\n\n\n结尾  \n  "
+
+
+def test_clean_chunks_matches_clean_output():
+    expected = clean_output(TEXT)
+    rand = random.Random(0)
+    for _ in range(200):
+        cuts = sorted(rand.sample(range(1, len(TEXT)), rand.randint(1, 12)))
+        chunks = [TEXT[i:j] for i, j in zip([0] + cuts, cuts + [len(TEXT)])]
+        assert "".join(clean_chunks(chunks)) == expected
+    assert "".join(clean_chunks(TEXT)) == expected
+    assert list(clean_chunks(["", "  \n", ""])) == []
+
+
+def test_render_iter_streams_loop_items():
+    parser = TemplateParser("{% for x in xs %}- {{ x }}\n\n{% endfor %}")
+    context = {"xs": [f"第{i}项" for i in range(50)]}
+    chunks = list(parser.render_iter(context))
+    assert "".join(chunks) == parser.render(context)
+    # 逐项输出, 不是先拼出完整字符串
+    assert len(chunks) > 1 and max(len(chunk) for chunk in chunks) < len(parser.render(context)) / 10
+
+
+def test_call_webhook_sends_chunked_payload():
+    feed = SimpleNamespace(id="MP_WXS_1", mp_name="公众号")
+    task = SimpleNamespace(id="task", name="任务", message_template="", web_hook_url="http://hook.example/")
+    articles = [{"id": f"a{i}", "title": f"文章{i}", "content": "x"} for i in range(3)]
+    sent = {}
+
+    def post(url, data, headers):
+        # requests按分块传输发送生成器
+        assert not isinstance(data, (bytes, str))
+        sent["body"] = b"".join(data).decode("utf-8")
+        return mock.Mock()
+
+    with mock.patch("requests.post", post):
+        assert webhook.call_webhook(webhook.MessageWebHook(task=task, feed=feed, articles=articles)) == "Webhook调用成功"
+    payload = json.loads(sent["body"])
+    assert payload["task"] == {"id": "task", "name": "任务"}
+    assert len(payload["articles"]) == 3
+
+
+def test_load_contents_uses_one_query(db, session, feed):
+    db.add_articles_bulk(make_articles(feed.id, 5))
+    articles = session.execute(select(Article).where(Article.mp_id == feed.id).order_by(Article.publish_time)).scalars().all()
+    statements, stop = count_queries(db)
+    try:
+        contents = webhook.load_contents(articles + [{"id": "dict"}])
+    finally:
+        stop()
+    assert len(statements) == 1
+    assert [contents[article.id] for article in articles] == [f"<p>正文{i}</p>" for i in range(5)]
+    # 已加载的正文不再查询
+    articles[0].body
+    assert articles[0].id not in webhook.load_contents(articles[:1])
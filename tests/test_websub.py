@@ -0,0 +1,147 @@
+import hashlib
+import hmac
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from unittest import mock
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+from conftest import make_articles
+from core.models.websub import WebSubSubscription
+from core.rss_render import MATERIALIZER
+from core.websub import HUB, callback_error, parse_topic, subscription_id
+
+BASE_URL = "http://feeds.example/"
+
+
+class Inline:
+    """代替线程池, 提交的任务立即执行"""
+    def submit(self, fn, *args):
+        fn(*args)
+
+
+class Subscriber(BaseHTTPRequestHandler):
+    received = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        query = parse_qs(urlsplit(self.path).query)
+        self.received.append(("GET", self.path, query))
+        self.send_response(200)
+        self.end_headers()
+        challenge = query.get("hub.challenge", [""])[0]
+        # /wrong 不回显hub.challenge
+        self.wfile.write(b"nope" if self.path.startswith("/wrong") else challenge.encode())
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        self.received.append(("POST", self.path, {"body": body, "headers": dict(self.headers)}))
+        self.send_response(204)
+        self.end_headers()
+
+
+@pytest.fixture
+def subscriber():
+    Subscriber.received = []
+    server = HTTPServer(("127.0.0.1", 0), Subscriber)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+
+
+@pytest.fixture
+def hub(config):
+    config("rss.base_url", BASE_URL)
+    with mock.patch.object(HUB, "_pool", Inline()), mock.patch.object(HUB, "allow_private", True):
+        yield HUB
+
+
+def subscribe(client, topic, callback, mode="subscribe", **fields):
+    return client.post("/websub/hub", data={"hub.mode": mode, "hub.topic": topic, "hub.callback": callback, **fields})
+
+
+def test_parse_topic():
+    domains = ["https://h.com/rss/"]
+    assert parse_topic("https://h.com/rss/feed/all.rss", domains) == ("all", None, "rss")
+    assert parse_topic("https://H.COM/rss/feed/tag/t1.atom", domains) == (None, "t1", "atom")
+    assert parse_topic("https://h.com/feed/all.rss", domains) is None
+    assert parse_topic("http://h.com/rss/feed/all.rss", domains) is None
+    assert parse_topic("https://h.com/rss/feed/all.exe", domains) is None
+
+
+@pytest.mark.parametrize("callback", ["ftp://example.com/x", "http://127.0.0.1/x", "http://[::1]/x", "http://10.0.0.1/x",
+                                      "http://169.254.169.254/latest", "http://[::ffff:127.0.0.1]/x", "http://localhost/x"])
+def test_private_callbacks_are_rejected(callback):
+    assert callback_error(callback)
+
+
+def test_callback_checks():
+    assert callback_error("http://93.184.215.14/cb") is None
+    assert callback_error("http://127.0.0.1/cb", allow_private=True) is None
+    assert callback_error("ftp://127.0.0.1/cb", allow_private=True)
+
+
+def test_requests_need_base_url_and_public_callback(client, config, feed):
+    topic = f"{BASE_URL}feed/{feed.id}.rss"
+    assert subscribe(client, topic, "http://93.184.215.14/cb").status_code == 400
+    config("rss.base_url", BASE_URL)
+    response = subscribe(client, topic, "http://127.0.0.1:9/cb")
+    assert response.status_code == 400
+    assert "内网" in response.text
+    assert subscribe(client, "http://other.example/feed/all.rss", "http://93.184.215.14/cb").status_code == 400
+
+
+def test_verification_publish_and_unsubscribe(client, db, session, feed, hub, subscriber):
+    topic = f"{BASE_URL}feed/{feed.id}.atom"
+    callback = f"{subscriber}/cb"
+    assert subscribe(client, topic, callback, **{"hub.secret": "s3cret", "hub.lease_seconds": "3600"}).status_code == 202
+    mode, path, query = Subscriber.received[-1]
+    assert (mode, query["hub.mode"], query["hub.topic"], query["hub.lease_seconds"]) == ("GET", ["subscribe"], [topic], ["3600"])
+    sub = session.get(WebSubSubscription, subscription_id(callback, topic))
+    assert (sub.feed_id, sub.tag_id, sub.ext, sub.lease_seconds) == (feed.id, None, "atom", 3600)
+
+    # 不回显challenge的不保存
+    wrong = f"{subscriber}/wrong"
+    assert subscribe(client, topic, wrong).status_code == 202
+    assert session.get(WebSubSubscription, subscription_id(wrong, topic)) is None
+
+    # 只验证推送, 不启动后台预生成
+    with mock.patch.object(MATERIALIZER, "schedule"):
+        db.add_articles_bulk(make_articles(feed.id, 1, title="推送的文章"))
+    assert HUB._publish({feed.id}) == 1
+    mode, path, pushed = Subscriber.received[-1]
+    assert mode == "POST" and "推送的文章" in pushed["body"].decode("utf-8")
+    signature = "sha256=" + hmac.new(b"s3cret", pushed["body"], hashlib.sha256).hexdigest()
+    assert pushed["headers"]["X-Hub-Signature"] == signature
+    assert f'<{topic}>; rel="self"' in pushed["headers"]["Link"]
+    session.expire_all()
+    assert session.get(WebSubSubscription, subscription_id(callback, topic)).delivered_at is not None
+
+    assert subscribe(client, topic, callback, mode="unsubscribe").status_code == 202
+    assert Subscriber.received[-1][2]["hub.mode"] == ["unsubscribe"]
+    session.expire_all()
+    assert session.get(WebSubSubscription, subscription_id(callback, topic)) is None
+    assert HUB._pending == 0
+
+
+def test_limits_send_nothing(client, session, feed, hub, subscriber):
+    topic = f"{BASE_URL}feed/{feed.id}.rss"
+    # 没有订阅时取消订阅不需要确认
+    assert subscribe(client, topic, f"{subscriber}/cb", mode="unsubscribe").status_code == 202
+    # 订阅数已达上限
+    session.add(WebSubSubscription(id=f"existing-{feed.id}", topic=topic, callback="http://x/", feed_id=feed.id, ext="rss"))
+    session.commit()
+    try:
+        with mock.patch.object(HUB, "max_subscriptions", session.query(WebSubSubscription).count()):
+            assert subscribe(client, topic, f"{subscriber}/cb").status_code == 202
+    finally:
+        session.delete(session.get(WebSubSubscription, f"existing-{feed.id}"))
+        session.commit()
+    assert session.get(WebSubSubscription, subscription_id(f"{subscriber}/cb", topic)) is None
+    assert Subscriber.received == []
+    # 等待确认的请求过多
+    with mock.patch.object(HUB, "max_pending", 1), mock.patch.object(HUB, "_pending", 1):
+        assert subscribe(client, topic, f"{subscriber}/cb").status_code == 400
@@ -19,7 +19,7 @@ def process_single_article(art, add_title, remove_images, remove_links, export_m
     from core.content_format import format_content
     from core.common.file_tools import sanitize_filename
     
-    markdown_content = format_content(art.content, "markdown")
+    markdown_content = format_content(art.content, "markdown", content_hash=getattr(art, "content_hash", None))
     
     # 转换为文档对象（不保存文件）
     # 只有在需要导出docx时才进行转换
@@ -108,36 +108,40 @@ def process_articles(session, mp_id=None,doc_id=None, page_size=10, page_count=1
     处理文章数据的核心函数
     返回处理的文章数量
     """
+    from sqlalchemy.orm import selectinload
+    from core.pagination import apply_cursor, encode_cursor
     record_count = 0
     i = 0
-    is_break=False
+    cursor = None
     while True:
-        if is_break:
-            break
         if page_count != 0 and i >= page_count:
             break
-            
-        query = session.query(Article).filter(Article.content != None).where(Article.status == 1)
+
+        query = session.query(Article).options(selectinload(Article.body)).filter(Article.content != None).where(Article.status == 1)
         if mp_id:
             query = query.where(Article.mp_id.in_(mp_id.split(",")))
         if doc_id:
-            query = query.where(Article.id.in_(doc_id))
-            is_break=True   
-
-        query = query.order_by(Article.publish_time.desc(), Article.id.desc())
-        if is_break==False:
-            query=query.offset(i * page_size).limit(page_size)
+            query = query.where(Article.id.in_(doc_id)).order_by(Article.publish_time.desc(), Article.id.desc())
+        else:
+            # 按 (publish_time, id) 游标翻页，避免深分页 OFFSET 扫描
+            query, _ = apply_cursor(query, cursor)
+            query = query.limit(page_size)
         i = i + 1
         arts = query.all()
-        
+
         if arts is None or len(arts) == 0:
             break
-            
+
         for art in arts:
             if process_single_article(art, add_title, remove_images, remove_links, 
                                     export_md, export_docx, export_json, export_csv, 
                                     export_pdf, docx_path, writer):
                 record_count += 1
+        if doc_id or len(arts) < page_size:
+            break
+        cursor = encode_cursor(arts[-1].publish_time, arts[-1].id)
+        # 已处理的文章不再需要保留在会话中
+        session.expunge_all()
     
     return record_count
 
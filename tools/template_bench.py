@@ -0,0 +1,286 @@
+"""
+模板引擎基准测试与一致性检查
+
+用内置的消息/webhook模板和几种常见的自定义模板, 在10/100/1000篇合成文章上渲染,
+输出每秒渲染次数(ops/s)和单次渲染的内存峰值, 并与golden文件比对输出是否一致。
+
+用法:
+    python -m tools.template_bench                  # 检查一致性并跑基准
+    python -m tools.template_bench -check True      # 只检查一致性
+    python -m tools.template_bench -update True     # 模板引擎行为有意变更后重新生成golden文件
+    python -m tools.template_bench -save base.json  # 保存结果, 作为之后比较的基线
+    python -m tools.template_bench -compare base.json -threshold 0.2  # ops/s下降超过20%时返回非0
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import statistics
+import tracemalloc
+from core.lax.template_parser import TemplateParser, compile_tokens, _TOKEN_RE
+from core.models import Feed, Article, MessageTask
+from core.print import print_error, print_success, print_warning
+from jobs.webhook import DEFAULT_MESSAGE_TEMPLATE, DEFAULT_WEBHOOK_TEMPLATE
+
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "template_golden")
+SIZES = (10, 100, 1000)
+MODES = ("render", "render_iter", "compile")
+
+# 带正文的webhook(正文已按call_webhook做JSON转义)
+WEBHOOK_CONTENT_TEMPLATE = """{
+  "feed": "{{ feed.mp_name }}",
+  "articles": [{% for article in articles %}
+    {"title": "{{ article.title }}", "url": "{{ article.url }}", "content": "{{ article.content }}"}{% if not loop.last %},{% endif %}{% endfor %}
+  ]
+}"""
+
+# 与core/webhook/parse.py的默认模板相同, 文章为Article对象
+FEED_INFO_TEMPLATE = """订阅源信息:
+        名称:{{feed.mp_name}}
+        描述:{{feed.mp_intro}}
+        最新文章:{% if articles %}
+        {% for article in articles %}
+        - {{ article.title }} ({{ article.pub_date }})
+        {% endfor %}
+        {% else %}
+        暂无文章
+        {% endif %}
+        """
+
+# 表达式、循环变量、循环内的条件分支
+MARKDOWN_EXPR_TEMPLATE = """## {{ feed.mp_name }} 共{{= len(articles) }}篇
+{% for article in articles %}
+{{ loop.index }}. [{{= article['title'].upper() }}]({{ article.url }}){% if loop.first %} 🆕{% else %} · {{ article.publish_time }}{% endif %}
+{% endfor %}
+{{ now }}"""
+
+# RSS自定义模板(rss.generate_by_template的上下文)
+RSS_HTML_TEMPLATE = """<html><head><title>{{ title }}</title><link rel="self" href="{{ self_link }}"/></head><body>
+<h1>{{ title }}</h1><p>{{ description }}</p>
+<ul>{% for article in articles %}
+<li><a href="{{ article.link }}">{{ article.title }}</a><p>{{ article.description }}</p><small>{{ article.updated }}</small></li>{% endfor %}
+</ul>{% if next_link %}<a href="{{ next_link }}">下一页</a>{% endif %}
+</body></html>"""
+
+def _feed() -> Feed:
+    return Feed(id="MP_WXS_3941633310", mp_name="示例公众号", mp_cover="https://example.com/cover.jpg", mp_intro="这是一个用于基准测试的公众号")
+
+def _task() -> MessageTask:
+    return MessageTask(id="task-1", name="基准测试任务")
+
+def _time(i: int) -> str:
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(1700000000 + i * 3600))
+
+def _article_dict(i: int, content: bool = False) -> dict:
+    # 与jobs/webhook.web_hook处理后的文章字典一致
+    article = {column.name: None for column in Article.__table__.columns}
+    article.update(id=f"{3941633310 + i}-1", mp_id="MP_WXS_3941633310", title=f"第{i}篇文章 Article {i}",
+                   pic_url=f"https://example.com/pic/{i}.jpg", url=f"https://mp.weixin.qq.com/s/{i:08d}",
+                   description=f"第{i}篇文章的摘要，包含一些中文和 English text。", status=1, publish_time=_time(i))
+    if content:
+        paragraph = f"<p>第{i}篇文章的正文段落，\\\"引号\\\"与换行\\n都已转义。</p>"
+        article["content"] = paragraph * 20
+    return article
+
+def _article_object(i: int) -> Article:
+    return Article(id=f"{3941633310 + i}-1", mp_id="MP_WXS_3941633310", title=f"第{i}篇文章 Article {i}",
+                   url=f"https://mp.weixin.qq.com/s/{i:08d}", publish_time=1700000000 + i * 3600)
+
+def _rss_item(i: int) -> dict:
+    return {"id": f"{i}", "title": f"第{i}篇文章 Article {i}", "link": f"https://example.com/feed/{i}",
+            "description": f"第{i}篇文章的摘要", "updated": _time(i)}
+
+def _message_context(n: int, content: bool = False) -> dict:
+    return {"feed": _feed(), "articles": [_article_dict(i, content) for i in range(n)], "task": _task(), "now": _time(0)}
+
+def _rss_context(n: int) -> dict:
+    return {"articles": [_rss_item(i) for i in range(n)], "title": "示例公众号", "link": "https://example.com/",
+            "description": "RSS频道", "language": "zh-CN", "image_url": "", "next_link": "https://example.com/feed/x.rss?page=2",
+            "prev_link": "", "self_link": "https://example.com/feed/x.rss", "hub_link": "https://example.com/websub/hub"}
+
+# 名称: (模板, 生成上下文)
+CASES = {
+    "message": (DEFAULT_MESSAGE_TEMPLATE, _message_context),
+    "webhook": (DEFAULT_WEBHOOK_TEMPLATE, _message_context),
+    "webhook_content": (WEBHOOK_CONTENT_TEMPLATE, lambda n: _message_context(n, content=True)),
+    "feed_info": (FEED_INFO_TEMPLATE, lambda n: {"feed": _feed(), "articles": [_article_object(i) for i in range(n)]}),
+    "markdown_expr": (MARKDOWN_EXPR_TEMPLATE, _message_context),
+    "rss_html": (RSS_HTML_TEMPLATE, _rss_context),
+}
+
+def _runner(mode: str, template: str, context: dict):
+    if mode == "render":
+        return lambda: TemplateParser(template).render(context)
+    if mode == "render_iter":
+        return lambda: "".join(TemplateParser(template).render_iter(context))
+    # 冷启动: 不经过进程内缓存, 每次重新解析编译
+    return lambda: compile_tokens(_TOKEN_RE.split(template))
+
+def bench(func, rounds: int = 5, min_time: float = 0.05) -> dict:
+    """与pytest-benchmark相同的计时方式: 先校准每轮的调用次数, 使每轮不少于min_time, 再取多轮统计"""
+    func()
+    iterations = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(iterations):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time or iterations >= 1 << 20:
+            break
+        iterations *= 2 if elapsed <= 0 else max(2, min(10, int(min_time / elapsed) + 1))
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            func()
+        timings.append((time.perf_counter() - start) / iterations)
+    mean = statistics.mean(timings)
+    return {
+        "min": min(timings),
+        "max": max(timings),
+        "mean": mean,
+        "median": statistics.median(timings),
+        "stddev": statistics.stdev(timings) if len(timings) > 1 else 0.0,
+        "rounds": rounds,
+        "iterations": iterations,
+        "ops": 1 / mean if mean > 0 else float("inf"),
+    }
+
+def peak_memory(func) -> int:
+    """单次调用期间tracemalloc记录的内存峰值(字节)"""
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def _digest(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def _load_digests() -> dict:
+    path = os.path.join(GOLDEN_DIR, "digests.json")
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def check_golden(cases: dict, sizes, update: bool = False) -> bool:
+    """render和render_iter的输出都要与golden一致; 最小规模保存完整输出便于查看差异, 其余只保存sha256"""
+    digests = _load_digests()
+    smallest = min(SIZES)
+    ok = True
+    for name, (template, make_context) in cases.items():
+        for size in sizes:
+            context = make_context(size)
+            output = TemplateParser(template).render(context)
+            streamed = "".join(TemplateParser(template).render_iter(context))
+            text_path = os.path.join(GOLDEN_DIR, f"{name}.txt")
+            if update:
+                digests.setdefault(name, {})[str(size)] = _digest(output)
+                if size == smallest:
+                    os.makedirs(GOLDEN_DIR, exist_ok=True)
+                    with open(text_path, "w", encoding="utf-8", newline="") as f:
+                        f.write(output)
+                continue
+            expected = digests.get(name, {}).get(str(size))
+            if expected is None:
+                print_warning(f"{name}[{size}] 没有golden记录, 请使用 -update True 生成")
+                ok = False
+                continue
+            if _digest(output) != expected:
+                print_error(f"{name}[{size}] render输出与golden不一致" + (f", 对比 {text_path}" if size == smallest else ""))
+                ok = False
+            if streamed != output:
+                print_error(f"{name}[{size}] render_iter输出与render不一致")
+                ok = False
+    if update:
+        os.makedirs(GOLDEN_DIR, exist_ok=True)
+        with open(os.path.join(GOLDEN_DIR, "digests.json"), "w", encoding="utf-8") as f:
+            json.dump(digests, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print_success(f"已更新golden文件: {GOLDEN_DIR}")
+    elif ok:
+        print_success("模板输出与golden一致")
+    return ok
+
+def run(cases: dict, sizes, modes, rounds: int = 5, min_time: float = 0.05) -> dict:
+    results = {}
+    print(f"{'case':<16}{'size':>6}  {'mode':<12}{'ops/s':>12}{'mean(ms)':>12}{'stddev(ms)':>12}{'peak(KB)':>10}")
+    for name, (template, make_context) in cases.items():
+        for size in sizes:
+            context = make_context(size)
+            for mode in modes:
+                if mode == "compile" and size != min(sizes):
+                    # 编译与文章数量无关
+                    continue
+                func = _runner(mode, template, context)
+                stats = bench(func, rounds, min_time)
+                stats["peak"] = peak_memory(func)
+                results.setdefault(name, {}).setdefault(str(size), {})[mode] = stats
+                print(f"{name:<16}{size:>6}  {mode:<12}{stats['ops']:>12.1f}{stats['mean'] * 1000:>12.3f}"
+                      f"{stats['stddev'] * 1000:>12.3f}{stats['peak'] / 1024:>10.1f}")
+    return results
+
+def compare(results: dict, baseline: dict, threshold: float) -> bool:
+    """ops/s低于基线(1-threshold)倍时视为退化"""
+    ok = True
+    for name, sizes in results.items():
+        for size, modes in sizes.items():
+            for mode, stats in modes.items():
+                base = baseline.get(name, {}).get(size, {}).get(mode)
+                if not base:
+                    continue
+                ratio = stats["ops"] / base["ops"]
+                if ratio < 1 - threshold:
+                    print_error(f"{name}[{size}] {mode} 性能下降: {base['ops']:.1f} -> {stats['ops']:.1f} ops/s ({ratio:.0%})")
+                    ok = False
+    if ok:
+        print_success(f"与基线相比没有超过{threshold:.0%}的性能下降")
+    return ok
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="模板引擎基准测试")
+    parser.add_argument('-sizes', help='文章数量, 逗号分隔', default=",".join(str(size) for size in SIZES))
+    parser.add_argument('-cases', help='只运行指定的用例, 逗号分隔', default="")
+    parser.add_argument('-modes', help='render,render_iter,compile', default=",".join(MODES))
+    parser.add_argument('-rounds', help='每项的计时轮数', type=int, default=5)
+    parser.add_argument('-min_time', help='每轮最少耗时 单位秒', type=float, default=0.05)
+    parser.add_argument('-check', help='只检查输出一致性', default=False)
+    parser.add_argument('-update', help='重新生成golden文件', default=False)
+    parser.add_argument('-save', help='保存结果到JSON文件', default="")
+    parser.add_argument('-compare', help='与保存的基线JSON比较', default="")
+    parser.add_argument('-threshold', help='允许的ops/s下降比例', type=float, default=0.2)
+    args, _ = parser.parse_known_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+    names = [name for name in args.cases.split(",") if name]
+    unknown = [name for name in names if name not in CASES]
+    if unknown:
+        print_error(f"未知的用例: {','.join(unknown)}, 可选: {','.join(CASES)}")
+        return 2
+    cases = {name: CASES[name] for name in names} if names else CASES
+    modes = [mode for mode in args.modes.split(",") if mode in MODES]
+
+    if args.update == "True":
+        # golden总是覆盖全部默认规模
+        check_golden(cases, SIZES, update=True)
+        return 0
+    ok = check_golden(cases, [size for size in sizes if size in SIZES] or SIZES)
+    if args.check == "True":
+        return 0 if ok else 1
+
+    results = run(cases, sizes, modes, args.rounds, args.min_time)
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            ok = compare(results, json.load(f), args.threshold) and ok
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,6 @@
 from fastapi import FastAPI, Request, APIRouter, Depends
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
@@ -12,6 +13,7 @@ from apis.article import router as article_router
 from apis.mps import router as wx_router
 from apis.res import router as res_router
 from apis.rss import router as rss_router,feed_router
+from apis.websub import router as websub_router
 from apis.config_management import router as config_router
 from apis.message_task import router as task_router
 from apis.sys_info import router as sys_info_router
@@ -50,9 +52,15 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# 响应压缩，已带Content-Encoding的响应(预压缩的RSS)不会重复压缩
+app.add_middleware(GZipMiddleware, minimum_size=int(cfg.get("compress.min_size", 1024) or 1024))
 @app.middleware("http")
 async def add_custom_header(request: Request, call_next):
     response = await call_next(request)
+    vary = response.headers.get("Vary")
+    if vary and "," in vary:
+        # 接口已声明Vary时GZipMiddleware压缩流式响应仍会再追加一次Accept-Encoding, 这里去重
+        response.headers["Vary"] = ", ".join(dict.fromkeys(v.strip() for v in vary.split(",")))
     response.headers["X-Version"] = VERSION
     response.headers["X-Powered-By"] = "Rachel"
     response.headers["GITHUB"] = "https://github.com/rachelos/we-mp-rss"
@@ -76,11 +84,28 @@ resource_router.include_router(res_router)
 feeds_router = APIRouter()
 feeds_router.include_router(rss_router)
 feeds_router.include_router(feed_router)
+feeds_router.include_router(websub_router)
 # 注册API路由分组
 app.include_router(api_router)
 app.include_router(resource_router)
 app.include_router(feeds_router)
 
+@app.on_event("startup")
+def watch_config():
+    # 修改config.yaml后自动生效
+    cfg.watch(cfg.get("config_watch_interval", 5))
+
+@app.on_event("shutdown")
+def close_db_engines():
+    # 退出时关闭共享连接池
+    from core.db import ENGINES
+    ENGINES.dispose_all()
+
+@app.on_event("shutdown")
+async def close_async_db():
+    from core.async_db import ADB
+    await ADB.dispose()
+
 # 静态文件服务配置
 app.mount("/assets", StaticFiles(directory="static/assets"), name="assets")
 app.mount("/static", StaticFiles(directory="static"), name="static")